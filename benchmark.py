@@ -0,0 +1,279 @@
+"""
+Бенчмарк сканирования на локальном тестовом сайте.
+
+Поднимает сайт на aiohttp в отдельном процессе (страницы, ссылки, формы,
+отражающиеся и неотражающиеся параметры, задержка ответа, размер тела,
+блокировка в стиле WAF), прогоняет по нему настоящие full_scan / single_scan
+и печатает JSON: страниц/с, запросов/с, находки и пиковый RSS процесса сканера.
+
+    python benchmark.py --pages 200 --fanout 4 --forms 2 --latency 0.005 --repeat 3 -o bench.json
+"""
+import asyncio
+import contextlib
+import json
+import logging
+import multiprocessing
+import os
+import platform
+import statistics
+import sys
+import time
+import zlib
+from dataclasses import asdict, dataclass
+from typing import Optional
+
+import click
+from aiohttp import web
+
+from engine.executor import create_executor, get_executor, set_executor
+from engine.logsetup import setup_logging
+from engine.metrics import get_metrics
+from workflows.fullscan import full_scan
+from workflows.singlescan import single_scan
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+@dataclass(frozen=True)
+class SiteSpec:
+    """Параметры тестового сайта."""
+    pages: int = 50
+    fanout: int = 3           # ссылок на странице
+    forms: int = 1            # форм на странице
+    fields: int = 3           # полей в форме
+    reflect: int = 1          # сколько полей формы отражается без экранирования (остальные не отражаются)
+    shared_forms: bool = False  # одни и те же формы на всех страницах (иначе у каждой страницы свои)
+    latency: float = 0.0      # задержка ответа, секунды
+    body_size: int = 0        # дополнить тело страницы до этого размера, байт
+    waf_block: float = 0.0    # доля запросов с HTML в параметрах, блокируемых ответом 403 в стиле Cloudflare
+
+
+_WAF_PAGE = '<html><title>Attention Required! | Cloudflare</title><body>Sorry, you have been blocked</body></html>'
+_FILLER = '<p>Lorem ipsum dolor sit amet, consectetur adipiscing elit.</p>\n'
+
+
+def _blocked(spec: SiteSpec, values) -> bool:
+    # решение детерминировано по значению: повторный запуск блокирует те же запросы
+    for value in values:
+        if '<' in value and zlib.crc32(value.encode('utf-8')) % 1000 < spec.waf_block * 1000:
+            return True
+    return False
+
+
+def build_app(spec: SiteSpec, counters: dict) -> web.Application:
+    """Приложение тестового сайта; counters — счётчики запросов, страниц, блокировок и байт."""
+
+    def form_action(page: int, form: int) -> str:
+        return f"/form/{form}" if spec.shared_forms else f"/form/{page}/{form}"
+
+    def respond(text: str, status: int = 200, headers: dict = None) -> web.Response:
+        counters['bytes'] += len(text)
+        return web.Response(text=text, status=status, headers=headers, content_type='text/html')
+
+    @web.middleware
+    async def middleware(request: web.Request, handler):
+        counters['requests'] += 1
+        if spec.latency:
+            await asyncio.sleep(spec.latency)
+        values = list(request.query.values())
+        if request.method == 'POST':
+            values.extend(str(v) for v in (await request.post()).values())
+        if spec.waf_block and _blocked(spec, values):
+            counters['blocked'] += 1
+            return respond(_WAF_PAGE, status=403, headers={'cf-ray': '8a1b2c3d4e5f-AMS', 'Server': 'cloudflare'})
+        return await handler(request)
+
+    async def page(request: web.Request) -> web.Response:
+        counters['pages'] += 1
+        i = int(request.match_info.get('i', 0)) % spec.pages
+        parts = ['<html><head><title>Page</title></head><body>']
+        parts.extend(f'<a href="/p/{(i * spec.fanout + k) % spec.pages}">next</a>' for k in range(1, spec.fanout + 1))
+        for j in range(spec.forms):
+            method = 'post' if j % 2 else 'get'
+            inputs = ''.join(f'<input name="f{n}">' for n in range(spec.fields))
+            parts.append(f'<form action="{form_action(i, j)}" method="{method}">{inputs}</form>')
+        if spec.reflect:
+            parts.append(f"<p>{request.query.get('q', '')}</p>")
+        parts.append('</body></html>')
+        text = ''.join(parts)
+        if len(text) < spec.body_size:
+            text += _FILLER * ((spec.body_size - len(text)) // len(_FILLER) + 1)
+        return respond(text)
+
+    async def form(request: web.Request) -> web.Response:
+        data = dict(request.query)
+        if request.method == 'POST':
+            data.update((k, str(v)) for k, v in (await request.post()).items())
+        echoed = ''.join(f"<div>{data.get(f'f{n}', '')}</div>" for n in range(min(spec.reflect, spec.fields)))
+        return respond(f'<html><body>{echoed}<p>Thanks</p></body></html>')
+
+    app = web.Application(middlewares=[middleware])
+    app.router.add_get('/', page)
+    app.router.add_get('/p/{i}', page)
+    for path in ('/form/{j}', '/form/{i}/{j}'):
+        app.router.add_get(path, form)
+        app.router.add_post(path, form)
+    return app
+
+
+def _serve(spec: SiteSpec, conn) -> None:
+    """Процесс сайта: сообщает порт, затем отвечает на команды 'stats' и 'stop'."""
+    counters = {'requests': 0, 'pages': 0, 'blocked': 0, 'bytes': 0}
+
+    async def main():
+        runner = web.AppRunner(build_app(spec, counters), access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, '127.0.0.1', 0)
+        await site.start()
+        conn.send(runner.addresses[0][1])
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                command = await loop.run_in_executor(None, conn.recv)
+                conn.send(dict(counters))
+                if command == 'stop':
+                    break
+        finally:
+            await runner.cleanup()
+
+    asyncio.run(main())
+
+
+class MockSite:
+    """Тестовый сайт в отдельном процессе: его event loop не делит CPU со сканером."""
+
+    def __init__(self, spec: SiteSpec):
+        # spawn: процесс сайта не наследует состояние сканера
+        context = multiprocessing.get_context('spawn')
+        self._conn, child = context.Pipe()
+        self._process = context.Process(target=_serve, args=(spec, child), daemon=True)
+        self._process.start()
+        self.url = f"http://127.0.0.1:{self._conn.recv()}/"
+
+    def stats(self) -> dict:
+        self._conn.send('stats')
+        return self._conn.recv()
+
+    def close(self) -> None:
+        if self._process.is_alive():
+            self._conn.send('stop')
+            self._conn.recv()
+        self._process.join(5)
+
+    def __enter__(self) -> 'MockSite':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+
+def peak_rss_mb() -> Optional[float]:
+    """Пиковый RSS процесса сканера (без процессов пула анализа), МиБ."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux отдаёт КиБ, macOS — байты
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+async def run_once(site: MockSite, mode: str, options: dict) -> dict:
+    """Один прогон сканирования; счётчики сайта берутся как разница до/после."""
+    before = site.stats()
+    retries = sum(get_metrics().retries.values.values())
+    started = time.perf_counter()
+    # вывод находок сканером уходит в stderr, stdout остаётся под JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        if mode == 'full':
+            store = await full_scan(start_url=site.url, **options)
+        else:
+            store = await single_scan(target_url=site.url, **options)
+    seconds = time.perf_counter() - started
+    after = site.stats()
+    served = {key: after[key] - before[key] for key in after}
+    stats = store.stats()
+    return {
+        'seconds': round(seconds, 3),
+        'pages': served['pages'],
+        'requests': served['requests'],
+        'blocked': served['blocked'],
+        'bytes': served['bytes'],
+        'retries': int(sum(get_metrics().retries.values.values()) - retries),
+        'pages_per_second': round(served['pages'] / seconds, 2),
+        'requests_per_second': round(served['requests'] / seconds, 2),
+        'records': stats['rows'],
+        'findings': stats['hits'],
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def _median(runs: list, key: str):
+    values = [run[key] for run in runs if run[key] is not None]
+    return round(statistics.median(values), 3) if values else None
+
+
+@click.command()
+@click.option('--pages', type=click.IntRange(1), default=SiteSpec.pages, show_default=True)
+@click.option('--fanout', type=click.IntRange(0), default=SiteSpec.fanout, show_default=True, help='Links per page.')
+@click.option('--forms', type=click.IntRange(0), default=SiteSpec.forms, show_default=True, help='Forms per page.')
+@click.option('--fields', type=click.IntRange(1), default=SiteSpec.fields, show_default=True, help='Inputs per form.')
+@click.option('--reflect', type=click.IntRange(0), default=SiteSpec.reflect, show_default=True,
+              help='Form inputs echoed back unescaped; the rest are not reflected.')
+@click.option('--shared-forms', is_flag=True, help='Every page carries the same forms.')
+@click.option('--latency', type=click.FloatRange(0), default=SiteSpec.latency, show_default=True,
+              help='Server response delay, seconds.')
+@click.option('--body-size', type=click.IntRange(0), default=SiteSpec.body_size, show_default=True,
+              help='Pad pages to this many bytes.')
+@click.option('--waf-block', type=click.FloatRange(0, 1), default=SiteSpec.waf_block, show_default=True,
+              help='Fraction of HTML-bearing requests answered with a Cloudflare-style 403.')
+@click.option('--mode', type=click.Choice(['full', 'single']), default='full', show_default=True)
+@click.option('--depth', 'max_depth', type=click.IntRange(1), default=10, show_default=True)
+@click.option('--concurrency', type=click.IntRange(1), default=5, show_default=True)
+@click.option('--per-host', type=click.IntRange(1), default=8, show_default=True)
+@click.option('--sample-limit', type=click.IntRange(0), default=0, show_default=True,
+              help='Pages per URL pattern (0 = no limit).')
+@click.option('--detect-waf', is_flag=True)
+@click.option('--cpu-workers', type=click.IntRange(0), default=1, show_default=True,
+              help='Processes for HTML parsing and analysis (0 = one per core, 1 = no pool).')
+@click.option('--repeat', type=click.IntRange(1), default=1, show_default=True)
+@click.option('-o', '--output', type=click.Path(dir_okay=False), default=None, help='Write the JSON report here.')
+def main(mode, max_depth, concurrency, per_host, sample_limit, detect_waf, cpu_workers, repeat, output, **site):
+    """Benchmark a scan against a generated local site and print a JSON report."""
+    # логи — в stderr: stdout остаётся только под JSON-отчёт
+    setup_logging(logging.WARNING, stream=sys.stderr)
+    spec = SiteSpec(**site)
+    set_executor(create_executor(cpu_workers))
+    options = dict(detect_waf=detect_waf, concurrency=concurrency, per_host=per_host,
+                   max_depth=max_depth, sample_limit=sample_limit) if mode == 'full' else dict(detect_waf=detect_waf)
+
+    async def runs(mock: MockSite) -> list:
+        return [await run_once(mock, mode, options) for _ in range(repeat)]
+
+    try:
+        with MockSite(spec) as mock:
+            results = asyncio.run(runs(mock))
+    finally:
+        get_executor().close()
+
+    report = {
+        'site': asdict(spec),
+        'mode': mode,
+        'options': dict(options, cpu_workers=cpu_workers),
+        'environment': {'python': platform.python_version(), 'platform': sys.platform, 'cpus': os.cpu_count()},
+        'runs': results,
+        'median': {key: _median(results, key) for key in
+                   ('seconds', 'pages_per_second', 'requests_per_second', 'findings')},
+        'peak_rss_mb': peak_rss_mb(),
+        'stages': get_metrics().summary()['stages'],
+    }
+    text = json.dumps(report, indent=2)
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+    click.echo(text)
+
+
+if __name__ == '__main__':
+    main()
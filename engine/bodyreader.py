@@ -0,0 +1,97 @@
+import codecs
+import logging
+from typing import Iterable, List, Optional
+
+from aiohttp import ClientResponse
+
+from engine.config import MAX_BODY_BYTES
+
+logger = logging.getLogger(__name__)
+
+# Типы содержимого, которые читаются: HTML и прочий текст, скрипты (DOM-анализ), XML/JSON.
+# Картинки, архивы, видео и т.п. не загружаются — в них нечего искать.
+_TEXT_TYPES = ('text/', 'application/xhtml', 'application/xml', 'application/javascript',
+               'application/x-javascript', 'application/ecmascript', 'application/json')
+_TEXT_SUFFIXES = ('+xml', '+json')
+
+# Если после совпадения осталось не больше стольких байт, тело дочитывается:
+# соединение возвращается в пул, а не закрывается
+_DRAIN_LIMIT = 64 * 1024
+
+
+def is_text_content(content_type: Optional[str]) -> bool:
+    """True для текстовых типов; без Content-Type ответ тоже считается текстом."""
+    if not content_type:
+        return True
+    content_type = content_type.split(';', 1)[0].strip().lower()
+    return content_type.startswith(_TEXT_TYPES) or content_type.endswith(_TEXT_SUFFIXES)
+
+
+class MarkerScanner:
+    """
+    Поиск маркеров в тексте, поступающем частями.
+
+    Между частями сохраняется хвост длиной (самый длинный маркер - 1),
+    поэтому маркер, разрезанный границей частей, тоже находится.
+    """
+
+    def __init__(self, markers: Iterable[str]):
+        self.pending = {m for m in markers if m}
+        self.found: List[str] = []
+        self._keep = max(map(len, self.pending), default=1) - 1
+        self._tail = ''
+
+    def feed(self, chunk: str) -> bool:
+        """Обрабатывает очередную часть; True, когда найдены все маркеры."""
+        if self.pending:
+            window = self._tail + chunk
+            for marker in [m for m in self.pending if m in window]:
+                self.pending.discard(marker)
+                self.found.append(marker)
+            self._tail = window[-self._keep:] if self._keep else ''
+        return not self.pending
+
+
+def _short_remainder(resp: ClientResponse, size: int) -> bool:
+    # длина остатка известна только для несжатого тела с Content-Length
+    if resp.content_length is None or resp.headers.get('Content-Encoding'):
+        return False
+    return resp.content_length - size <= _DRAIN_LIMIT
+
+
+async def read_body(resp: ClientResponse, markers: Iterable[str] = (), limit: int = MAX_BODY_BYTES) -> dict:
+    """
+    Читает тело ответа потоково и возвращает {'text', 'truncated', 'skipped', 'size'} (size — прочитано байт).
+
+    - Нетекстовые ответы (см. is_text_content) не читаются: text пуст, skipped=True.
+    - Читается не больше limit байт (truncated=True, если тело длиннее).
+    - С markers чтение прекращается, как только в тексте найдены все маркеры:
+      найденные маркеры в text уже есть, остаток страницы не нужен.
+    """
+    if not is_text_content(resp.headers.get('Content-Type')):
+        return {'text': '', 'truncated': False, 'skipped': True, 'size': 0}
+
+    try:
+        decoder = codecs.getincrementaldecoder(resp.charset or 'utf-8')(errors='ignore')
+    except LookupError:
+        decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+    scanner = MarkerScanner(markers) if markers else None
+    parts: List[str] = []
+    size = 0
+    truncated = False
+    async for chunk in resp.content.iter_any():
+        if size + len(chunk) > limit:
+            chunk = chunk[:limit - size]
+            truncated = True
+        size += len(chunk)
+        text = decoder.decode(chunk)
+        parts.append(text)
+        if truncated:
+            logger.debug(f"{resp.url}: тело ответа обрезано до {limit} байт")
+            break
+        if scanner is not None and scanner.feed(text):
+            if _short_remainder(resp, size):
+                await resp.content.read()
+            break
+    parts.append(decoder.decode(b'', final=True))
+    return {'text': ''.join(parts), 'truncated': truncated, 'skipped': False, 'size': size}
@@ -0,0 +1,237 @@
+import hashlib
+import logging
+import marshal
+import os
+import random
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from engine.config import PAYLOAD_SEED
+from engine.encoder import encode_payload
+from engine.obfuscator import obfuscate
+
+logger = logging.getLogger(__name__)
+
+_DATA_DIR = os.path.join(os.path.dirname(__file__), '..', 'data')
+PAYLOADS_FILE = os.path.join(_DATA_DIR, 'payloads.yaml')
+CACHE_FILE = os.path.join(_DATA_DIR, 'payloads.catalogue')
+
+# Меняется при изменении структуры каталога: старый кэш становится недействительным
+_FORMAT_VERSION = 3
+
+# Полный набор категорий в порядке проверки
+FULL_CATEGORIES = ['basic', 'url', 'attribute', 'img', 'body']
+
+# Категории, подходящие контексту отражения (см. engine.probe)
+CONTEXT_CATEGORIES: Dict[str, List[str]] = {
+    'html': ['basic', 'img', 'body'],
+    'attribute': ['attribute', 'basic'],
+    'script': ['basic', 'body'],
+    # URL-атрибут остаётся атрибутом: кроме javascript: работает выход из значения
+    'url': ['url', 'attribute', 'basic'],
+}
+
+
+class PayloadCatalogue:
+    """
+    Скомпилированный каталог payloads.
+
+    Все строки (исходные payloads и их варианты) хранятся один раз в payloads,
+    остальное — индексы на них:
+      - categories: категория -> исходные payloads в порядке YAML;
+      - contexts: контекст отражения -> payloads подходящих категорий без повторов,
+        в порядке FULL_CATEGORIES;
+      - obfuscated / encoded: payload -> его варианты (без самого payload и повторов).
+    Варианты random_case получены с фиксированным зерном, поэтому воспроизводимы.
+    """
+
+    def __init__(self, payloads: Sequence[str], categories: Dict[str, Tuple[int, ...]],
+                 contexts: Dict[str, Tuple[int, ...]], obfuscated: Dict[int, Tuple[int, ...]],
+                 encoded: Dict[int, Tuple[int, ...]], source_hash: str = ''):
+        self.payloads = tuple(payloads)
+        self.categories = categories
+        self.contexts = contexts
+        self.obfuscated = obfuscated
+        self.encoded = encoded
+        self.source_hash = source_hash
+        self._ids = {p: i for i, p in enumerate(self.payloads)}
+        self._selections: Dict[Tuple, List[str]] = {}
+        # место payload в полном наборе: по нему сливаются индексы нескольких контекстов
+        self._rank = {i: n for n, i in enumerate(
+            _unique(i for cat in FULL_CATEGORIES for i in categories.get(cat, ())))}
+
+    def _strings(self, ids: Iterable[int]) -> List[str]:
+        return [self.payloads[i] for i in ids]
+
+    def category(self, name: str) -> List[str]:
+        return self._strings(self.categories.get(name, ()))
+
+    def for_context(self, context: str) -> List[str]:
+        return self._strings(self.contexts.get(context, ()))
+
+    def select(self, categories: Iterable[str], obfuscate_flag: bool = False) -> List[str]:
+        """
+        payloads указанных категорий без повторов (в порядке категорий),
+        при obfuscate_flag — с обфусцированными вариантами в конце.
+        Результат для одного набора категорий вычисляется один раз.
+        """
+        key = (tuple(categories), obfuscate_flag)
+        cached = self._selections.get(key)
+        if cached is None:
+            ids = _unique(i for cat in key[0] for i in self.categories.get(cat, ()))
+            cached = self._selections[key] = self._with_obfuscated(ids, obfuscate_flag)
+        return list(cached)
+
+    def select_contexts(self, contexts: Iterable[str], obfuscate_flag: bool = False) -> List[str]:
+        """
+        payloads для набора контекстов отражения из индекса contexts: списки
+        контекстов сливаются в порядке FULL_CATEGORIES, как при выборе по категориям.
+        Результат для одного набора контекстов вычисляется один раз.
+        """
+        key = ('contexts', tuple(sorted(contexts)), obfuscate_flag)
+        cached = self._selections.get(key)
+        if cached is None:
+            ids = _unique(i for ctx in key[1] for i in self.contexts.get(ctx, ()))
+            if len(key[1]) > 1:
+                ids.sort(key=self._rank.__getitem__)
+            cached = self._selections[key] = self._with_obfuscated(ids, obfuscate_flag)
+        return list(cached)
+
+    def _with_obfuscated(self, ids: List[int], obfuscate_flag: bool) -> List[str]:
+        if obfuscate_flag:
+            ids = _unique(ids + [v for i in ids for v in self.obfuscated.get(i, ())])
+        return self._strings(ids)
+
+    def variants(self, payload: str, obfuscate_flag: bool = False, encode_flag: bool = False) -> List[str]:
+        """
+        Кандидаты для проверки: сам payload, затем обфусцированные
+        и закодированные варианты без повторов.
+        payload вне каталога (например, из пользовательского списка) обрабатывается на лету.
+        """
+        idx = self._ids.get(payload)
+        if idx is None:
+            return _variants_of(payload, obfuscate_flag, encode_flag)
+        ids = [idx]
+        if obfuscate_flag:
+            ids.extend(self.obfuscated.get(idx, ()))
+        if encode_flag:
+            ids.extend(self.encoded.get(idx, ()))
+        return self._strings(_unique(ids))
+
+
+def _unique(ids: Iterable[int]) -> List[int]:
+    seen = set()
+    return [i for i in ids if not (i in seen or seen.add(i))]
+
+
+def _seeded_rng(payload: str, seed: int) -> random.Random:
+    # своё зерно на каждый payload: вариант не зависит от порядка в YAML
+    return random.Random(f"{seed}:{payload}")
+
+
+def _variants_of(payload: str, obfuscate_flag: bool, encode_flag: bool, seed: int = PAYLOAD_SEED) -> List[str]:
+    candidates = [payload]
+    if obfuscate_flag:
+        candidates += obfuscate(payload, _seeded_rng(payload, seed))
+    if encode_flag:
+        candidates += encode_payload(payload)
+    seen = set()
+    return [c for c in candidates if not (c in seen or seen.add(c))]
+
+
+def compile_catalogue(data: Dict[str, List[str]], seed: int = PAYLOAD_SEED, source_hash: str = '') -> PayloadCatalogue:
+    """Строит каталог из словаря категория -> список payloads (содержимое payloads.yaml)."""
+    payloads: List[str] = []
+    ids: Dict[str, int] = {}
+
+    def intern(value: str) -> int:
+        idx = ids.get(value)
+        if idx is None:
+            idx = ids[value] = len(payloads)
+            payloads.append(value)
+        return idx
+
+    categories = {
+        cat: tuple(_unique(intern(str(p)) for p in (items or [])))
+        for cat, items in data.items()
+    }
+    originals = _unique(i for cat_ids in categories.values() for i in cat_ids)
+    obfuscated: Dict[int, Tuple[int, ...]] = {}
+    encoded: Dict[int, Tuple[int, ...]] = {}
+    for idx in originals:
+        original = payloads[idx]
+        obf = [intern(v) for v in obfuscate(original, _seeded_rng(original, seed))]
+        enc = [intern(v) for v in encode_payload(original)]
+        obfuscated[idx] = tuple(i for i in _unique(obf) if i != idx)
+        encoded[idx] = tuple(i for i in _unique(enc) if i != idx)
+    # категории контекста берутся в порядке FULL_CATEGORIES, как в generate_payloads
+    contexts = {
+        ctx: tuple(_unique(i for cat in FULL_CATEGORIES if cat in cats for i in categories.get(cat, ())))
+        for ctx, cats in CONTEXT_CATEGORIES.items()
+    }
+    return PayloadCatalogue(payloads, categories, contexts, obfuscated, encoded, source_hash)
+
+
+def _source_hash(raw: bytes, seed: int) -> str:
+    # формат marshal зависит от версии интерпретатора — она тоже часть ключа
+    key = f"|{seed}|{_FORMAT_VERSION}|{marshal.version}".encode()
+    return hashlib.blake2b(raw + key, digest_size=16).hexdigest()
+
+
+def load_catalogue(path: str = PAYLOADS_FILE, cache_path: Optional[str] = CACHE_FILE,
+                   seed: int = PAYLOAD_SEED) -> PayloadCatalogue:
+    """
+    Загружает каталог из бинарного кэша (marshal) или компилирует его из YAML.
+
+    Кэш действителен, пока не изменились содержимое YAML, зерно и формат каталога.
+    Ошибки чтения/записи кэша не фатальны: каталог просто компилируется заново.
+    """
+    try:
+        with open(path, 'rb') as f:
+            raw = f.read()
+    except OSError as e:
+        logger.error(f"Не удалось прочитать payloads из {path}: {e}")
+        return compile_catalogue({}, seed)
+    digest = _source_hash(raw, seed)
+
+    if cache_path:
+        try:
+            with open(cache_path, 'rb') as f:
+                cached_hash, state = marshal.load(f)
+            if cached_hash == digest:
+                return PayloadCatalogue(*state, source_hash=digest)
+        except (OSError, EOFError, ValueError, TypeError):
+            pass
+
+    import yaml
+    try:
+        data = yaml.safe_load(raw) or {}
+    except yaml.YAMLError as e:
+        logger.error(f"Некорректный {path}: {e}")
+        data = {}
+    catalogue = compile_catalogue(data, seed, digest)
+
+    if cache_path:
+        state = (catalogue.payloads, catalogue.categories, catalogue.contexts,
+                 catalogue.obfuscated, catalogue.encoded)
+        # запись через временный файл: параллельный запуск не прочитает половину кэша
+        tmp = f"{cache_path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, 'wb') as f:
+                marshal.dump((digest, state), f)
+            os.replace(tmp, cache_path)
+        except OSError as e:
+            logger.debug(f"Кэш каталога payloads не записан: {e}")
+            if os.path.exists(tmp):
+                os.remove(tmp)
+    return catalogue
+
+
+_CATALOGUE: Optional[PayloadCatalogue] = None
+
+
+def get_catalogue() -> PayloadCatalogue:
+    """Общий каталог процесса (загружается при первом обращении)."""
+    global _CATALOGUE
+    if _CATALOGUE is None:
+        _CATALOGUE = load_catalogue()
+    return _CATALOGUE
@@ -1,2 +1,22 @@
 OBFUSCATE = False
-BLIND_PAYLOAD_TEMPLATE = '<script src="{payload_url}"></script>'
\ No newline at end of file
+BLIND_PAYLOAD_TEMPLATE = '<script src="{payload_url}"></script>'
+
+# Бэкенд разбора HTML: 'auto' (lxml, если установлен), 'lxml' или 'html.parser'
+PARSER_BACKEND = 'auto'
+
+# Зерно для random_case в каталоге payloads: одинаковые варианты от запуска к запуску
+PAYLOAD_SEED = 1337
+
+# Таймауты запросов, секунды (aiohttp.ClientTimeout): установка соединения и чтение ответа
+REQUEST_TIMEOUT = {'total': 60, 'connect': 10, 'sock_read': 30}
+
+# Пул соединений сканирования (engine.session): лимиты соединений, TTL кэша DNS и keep-alive, секунды
+CONNECTION_POOL = {'limit': 100, 'limit_per_host': 8, 'ttl_dns_cache': 300, 'keepalive_timeout': 30}
+
+# Максимальный размер читаемого тела ответа, байт (engine.bodyreader): остаток больших страниц не загружается
+MAX_BODY_BYTES = 2 * 1024 * 1024
+
+# Процессы для разбора HTML и анализа (engine.executor): 0 — по числу ядер, 1 — без пула
+CPU_WORKERS = 0
+# Документы меньше этого размера (символов) обрабатываются на месте: передача в пул дороже разбора
+OFFLOAD_MIN_BYTES = 64 * 1024
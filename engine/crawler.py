@@ -1,62 +1,163 @@
 import asyncio
 import logging
-from typing import List, Tuple, Set
-from urllib.parse import urljoin, urldefrag
+from typing import AsyncIterator, Dict, List, Optional, Tuple, Set
+from urllib.parse import urljoin, urldefrag, urlparse
 
-from aiohttp import ClientSession, ClientError
-from bs4 import BeautifulSoup
+from aiohttp import ClientSession
+from engine.executor import run_cpu
+from engine.metrics import get_metrics
+from engine.page import PageModel, parse_page
+from engine.ratecontrol import perform_request
+from engine.session import scan_session
+from engine.state import ScanState
+from engine.urlnorm import PatternSampler, canonicalize_url
 
 logger = logging.getLogger(__name__)
 
-async def fetch(session: ClientSession, semaphore: asyncio.Semaphore, url: str) -> Tuple[str, str]:
+async def fetch(session: ClientSession, semaphore: asyncio.Semaphore, url: str,
+                strict: bool = False) -> Tuple[str, str]:
     """
-    Загружает страницу по URL с учётом семафора и возвращает (url, html) или ('', '') при ошибке.
+    Загружает страницу по URL с учётом семафора и возвращает (url, html) или (url, '') при ошибке.
+    С strict ошибка загрузки не глушится, а поднимается как ConnectionError
+    (вызывающий сам решает, повторять ли задачу).
     """
     async with semaphore:
-        try:
-            async with session.get(url) as resp:
-                text = await resp.text(errors='ignore')
-                return url, text
-        except ClientError as e:
-            logger.error(f"Ошибка при загрузке {url}: {e}")
-            return url, ''
+        # темп хоста, таймауты и повторы — в perform_request
+        response = await perform_request(session, 'GET', url)
+    if response is None:
+        if strict:
+            raise ConnectionError(f"{url}: нет ответа")
+        logger.error(f"Ошибка при загрузке {url}: нет ответа")
+        return url, ''
+    return url, response['text']
+
 
-async def crawl(start_url: str, max_depth: int = 2, concurrency: int = 5) -> List[Tuple[str, str]]:
+async def load_page(session: ClientSession, semaphore: asyncio.Semaphore, url: str,
+                    strict: bool = False) -> Tuple[str, PageModel]:
     """
-    Краулинг сайта в ширину до max_depth уровней.
+    Загружает и разбирает страницу. Большие страницы разбираются в пуле процессов
+    (см. engine.executor), пока event loop продолжает загрузки. strict — см. fetch.
+    """
+    url, html = await fetch(session, semaphore, url, strict)
+    with get_metrics().stage('parse'):
+        page = await run_cpu(parse_page, html, url, size=len(html))
+    return url, page
+
+async def iter_crawl(
+    start_url: str,
+    max_depth: int = 2,
+    concurrency: int = 5,
+    session: Optional[ClientSession] = None,
+    state: Optional[ScanState] = None,
+    sample_limit: Optional[int] = 3
+) -> AsyncIterator[Tuple[str, PageModel]]:
+    """
+    Краулинг сайта в ширину до max_depth уровней в виде асинхронного генератора.
+
+    Страницы отдаются по мере загрузки как (url, PageModel): HTML разбирается
+    один раз, а сам текст страницы дальше не передаётся. Одновременно загружается
+    не более concurrency страниц; пока потребитель не забрал очередную страницу,
+    новые загрузки не начинаются (backpressure).
+    Если session не передана, создаётся собственная.
+
+    С state найденные URL сохраняются во фронтир на диске; при возобновлении
+    обход продолжается с непросканированных страниц (отметку о завершении
+    страницы ставит потребитель через state.mark_page_done).
 
-    Возвращает список кортежей (url, html).
+    Повторы ссылок отсеиваются по канонической форме URL (см. engine.urlnorm),
+    загружается же сама ссылка; для каждого шаблона URL (/product/{int} и т.п.) загружается не больше
+    sample_limit страниц; None или 0 — без ограничения.
     """
-    seen: Set[str] = set([start_url])
-    results: List[Tuple[str, str]] = []
-    from urllib.parse import urlparse
-    # определяем корневой домен (схема + хост)
-    parsed = urlparse(start_url)
+    if session is None:
+        async with scan_session(concurrency) as own_session:
+            async for page in iter_crawl(start_url, max_depth, concurrency, own_session, state, sample_limit):
+                yield page
+        return
+
+    seen: Set[str] = {start_url, canonicalize_url(start_url)}
+    sampler = PatternSampler(sample_limit)
+    sampler.admit(start_url)
+    resumed: Optional[dict] = None
+    if state is not None:
+        if state.has_pages():
+            seen = {canonicalize_url(known) for known in state.seen_pages()}
+            resumed = state.pending_pages()
+            # восстанавливаем счётчики шаблонов по уже известным URL
+            for known in seen:
+                sampler.admit(known)
+        else:
+            state.add_pages([start_url], 0)
+    # определяем корневой домен (схема + хост) в канонической форме
+    parsed = urlparse(canonicalize_url(start_url))
     base_domain = f"{parsed.scheme}://{parsed.netloc}"
     semaphore = asyncio.Semaphore(concurrency)
 
-    async with ClientSession() as session:
-        # начинаем с первого уровня
-        to_crawl = [start_url]
-        # проходим строго на max_depth уровней
-        for depth in range(max_depth):
-            if not to_crawl:
-                break
-            tasks = [asyncio.create_task(fetch(session, semaphore, url)) for url in to_crawl]
-            to_crawl_next: List[str] = []
-            for task in asyncio.as_completed(tasks):
-                url, html = await task
-                results.append((url, html))
-                # добавляем ссылки для следующего уровня
-                # если текущий уровень меньше последнего, расширяем
-                if depth < max_depth - 1 and html:
-                    soup = BeautifulSoup(html, 'html.parser')
-                    for link in soup.find_all('a', href=True):
-                        href = link['href']
-                        next_url = urljoin(url, href)
-                        next_url = urldefrag(next_url)[0]
-                        if next_url.startswith(base_domain) and next_url not in seen:
-                            seen.add(next_url)
-                            to_crawl_next.append(next_url)
-            to_crawl = to_crawl_next
-    return results
\ No newline at end of file
+    # начинаем с первого уровня
+    to_crawl = [start_url] if resumed is None else []
+    # проходим строго на max_depth уровней
+    for depth in range(max_depth):
+        # при возобновлении добавляем недообработанные страницы этого уровня
+        if resumed:
+            to_crawl += resumed.pop(depth, [])
+        if not to_crawl and not resumed:
+            break
+        to_crawl_next: List[str] = []
+        pending: Set[asyncio.Task] = set()
+        # задача загрузки -> её URL (для сообщения об ошибке разбора)
+        task_urls: Dict[asyncio.Task, str] = {}
+        queue = iter(to_crawl)
+        try:
+            while True:
+                # держим в полёте не больше concurrency загрузок
+                for url in queue:
+                    task = asyncio.create_task(load_page(session, semaphore, url))
+                    task_urls[task] = url
+                    pending.add(task)
+                    if len(pending) >= concurrency:
+                        break
+                if not pending:
+                    break
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    try:
+                        url, page = task.result()
+                    except Exception as e:
+                        # сбой разбора одной страницы не должен обрывать весь обход
+                        logger.error(f"Ошибка при разборе {task_urls.pop(task)}: {e!r}")
+                        continue
+                    del task_urls[task]
+                    # добавляем ссылки для следующего уровня
+                    # если текущий уровень меньше последнего, расширяем
+                    if depth < max_depth - 1:
+                        found = []
+                        for href in page.links:
+                            # загружается сама ссылка, а каноническая форма — только ключ
+                            # для повторов и шаблонов: иначе /docs/ превратится в /docs
+                            # и относительные ссылки разрешатся не от той страницы
+                            next_url = urldefrag(urljoin(url, href))[0]
+                            key = canonicalize_url(next_url)
+                            if key.startswith(base_domain) and key not in seen:
+                                seen.add(key)
+                                # от каждого шаблона URL — только несколько представителей
+                                if sampler.admit(key):
+                                    found.append(next_url)
+                        to_crawl_next += found
+                        if state is not None and found:
+                            state.add_pages(found, depth + 1)
+                    yield url, page
+        finally:
+            # потребитель прервал обход — отменяем незавершённые загрузки
+            for task in pending:
+                task.cancel()
+        to_crawl = to_crawl_next
+    if sampler.dropped:
+        logger.info(f"Шаблоны URL: {sampler.stats()}")
+
+
+async def crawl(start_url: str, max_depth: int = 2, concurrency: int = 5) -> List[Tuple[str, PageModel]]:
+    """
+    Краулинг сайта в ширину до max_depth уровней.
+
+    Возвращает список кортежей (url, PageModel).
+    """
+    return [page async for page in iter_crawl(start_url, max_depth, concurrency)]
@@ -1,81 +1,660 @@
+import asyncio
+import hashlib
 import re
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Set, Tuple, Union
+from urllib.parse import urldefrag, urljoin
+
 import click
 
+from engine.executor import run_cpu
+from engine.metrics import get_metrics
+from engine.page import PageModel
+
 # ANSI escape sequences for coloring
 COLOR_SOURCE = '\033[93m'  # yellow-like
 COLOR_SINK = '\033[91m'    # red-like
 COLOR_RESET = '\033[0m'
 
-# Patterns to identify data sources and dangerous sinks
-SOURCE_PATTERNS = re.compile(
-    r"\b(?:document\.(?:cookie|referrer|URL(?:Unencoded)?|baseURI)|"
-    r"location\.(?:href|search|hash|pathname)|window\.name|"
-    r"history\.(?:pushState|replaceState)(?:local|session)Storage)\b"
-)
-SINK_PATTERNS = re.compile(
-    r"\b(?:eval|Function|set(?:Timeout|Interval|Immediate)|execScript|document\.(?:write|writeln)|"
-    r"\w+\.innerHTML|\w+\.textContent|\w+\.src|crypto\.generateCRMFRequest|"
-    r"Range\.createContextualFragment)\b"
-)
-
 SCRIPT_BLOCK_RE = re.compile(r'(?is)<script[^>]*>(.*?)</script>')
 
+# Attacker-controlled sources (property chains, "window." prefix stripped)
+SOURCES = frozenset({
+    'document.cookie', 'document.referrer', 'document.URL', 'document.URLUnencoded',
+    'document.baseURI', 'document.documentURI', 'document.location',
+    'location', 'location.href', 'location.search', 'location.hash', 'location.pathname',
+    'document.location.href', 'document.location.search', 'document.location.hash',
+    'document.location.pathname', 'window.name',
+})
+SOURCE_PREFIXES = ('localStorage.', 'sessionStorage.')
+# Sources only as a whole value: their other properties (location.host) are not attacker-controlled
+_WHOLE_OBJECT_SOURCES = frozenset({'location', 'document.location'})
+
+# Functions executing or writing their string argument
+CALL_SINKS = frozenset({
+    'eval', 'Function', 'setTimeout', 'setInterval', 'setImmediate', 'execScript',
+    'document.write', 'document.writeln', 'crypto.generateCRMFRequest', '$', 'jQuery',
+})
+CALL_SINK_METHODS = frozenset({'insertAdjacentHTML', 'createContextualFragment', 'html'})
+# Timers only evaluate strings; a callback argument is not a sink
+_TIMER_SINKS = frozenset({'setTimeout', 'setInterval', 'setImmediate'})
+
+# Properties whose assignment renders HTML or navigates
+PROPERTY_SINKS = frozenset({'innerHTML', 'outerHTML', 'srcdoc', 'src', 'href', 'action', 'formAction'})
+NAVIGATION_SINKS = frozenset({'location', 'location.href', 'document.location', 'document.location.href'})
+
+# Calls that neutralise a tainted value
+SANITIZERS = frozenset({
+    'encodeURIComponent', 'encodeURI', 'escape', 'DOMPurify.sanitize', 'parseInt', 'parseFloat', 'Number',
+})
+
+_DECLARATIONS = frozenset({'var', 'let', 'const'})
+# Heads of braceless control-flow bodies: if (x) el.innerHTML = y;
+_CONTROL_HEADS = frozenset({'if', 'while', 'for', 'with'})
+_ASSIGN_OPS = frozenset({'=', '+=', '||=', '&&=', '??='})
+# After these tokens a '/' starts a regular expression literal, not a division
+_REGEX_PREFIX_WORDS = frozenset({'return', 'typeof', 'case', 'do', 'else', 'in', 'of', 'new', 'delete', 'void', 'throw'})
+# A line break after these tokens does not end the statement
+_CONTINUATION = frozenset({
+    '=', '+', '-', '*', '/', '%', '&&', '||', '??', '?', ':', ',', '(', '[', '.', '+=', '-=',
+    '==', '===', '!=', '!==', '<', '>', '<=', '>=', '=>', '&', '|', '^', '!',
+})
+_SNIPPET_WIDTH = 80
+
+_TOKEN_RE = re.compile('|'.join([
+    r'(?P<ws>\s+)',
+    r'(?P<comment>//[^\n]*|/\*.*?(?:\*/|\Z))',
+    r'(?P<string>"(?:\\.|[^"\\\n])*"?|\'(?:\\.|[^\'\\\n])*\'?|`(?:\\.|[^`\\])*`?)',
+    r'(?P<name>[A-Za-z_$][\w$]*(?:\s*\??\.\s*[A-Za-z_$][\w$]*)*)',
+    r'(?P<number>\d[\w.]*|\.\d\w*)',
+    r'(?P<punct>>>>=|\.\.\.|===|!==|\*\*=|<<=|>>=|>>>|\|\|=|&&=|\?\?=|=>|==|!=|<=|>=|&&|\|\||\?\?|\+\+|--'
+    r'|[-+*/%&|^]=|\?\.|.)',
+]), re.S)
+_REGEX_LITERAL_RE = re.compile(r'/(?:\\.|\[(?:\\.|[^\]\\\n])*\]|[^/\\\n\[])+/[A-Za-z]*')
+_CHAIN_WS_RE = re.compile(r'\s*(\??\.)\s*')
+_TEMPLATE_EXPR_RE = re.compile(r'\$\{([^}]*)\}')
+_TEMPLATE_NAME_RE = re.compile(r'[A-Za-z_$][\w$]*(?:\??\.[A-Za-z_$][\w$]*)*')
+
+
+@dataclass(frozen=True)
+class DomFinding:
+    """A source-to-sink data flow found in an inline script."""
+    line: int
+    source: str
+    sink: str
+    via: Optional[str]
+    snippet: str
+
+
+# (kind, value, line, position, line break before the token)
+Token = Tuple[str, str, int, int, bool]
+
+
+def tokenize(script: str) -> List[Token]:
+    """
+    Splits JavaScript into tokens in a single left-to-right pass.
+
+    Whitespace and comments are dropped; property chains (a.b.c) become one
+    'name' token; template literals contribute the names used inside ${...}.
+    """
+    tokens: List[Token] = []
+    pos = 0
+    line = 1
+    counted = 0
+    newline = False
+    end = len(script)
+    while pos < end:
+        ch = script[pos]
+        m = None
+        if ch == '/' and _regex_allowed(tokens):
+            m = _REGEX_LITERAL_RE.match(script, pos)
+        kind = 'regex' if m else None
+        if m is None:
+            m = _TOKEN_RE.match(script, pos)
+            kind = m.lastgroup
+        start = pos
+        pos = m.end()
+        if kind in ('ws', 'comment'):
+            if '\n' in m.group():
+                newline = True
+            continue
+        line += script.count('\n', counted, start)
+        counted = start
+        value = m.group()
+        if kind == 'name':
+            if not value.isidentifier():
+                value = _CHAIN_WS_RE.sub(r'\1', value).replace('?.', '.')
+            # window.x is the global x, except window.name which is a source itself
+            if value.startswith('window.') and value != 'window.name':
+                value = value[len('window.'):]
+        elif kind == 'string' and value.startswith('`') and '${' in value:
+            # only the interpolated expressions of a template literal can carry taint
+            for expr in _TEMPLATE_EXPR_RE.findall(value):
+                for name in _TEMPLATE_NAME_RE.findall(expr):
+                    tokens.append(('name', name.replace('?.', '.'), line, start, newline))
+                    newline = False
+            tokens.append(('punct', '+', line, start, False))
+            continue
+        tokens.append((kind, value, line, start, newline))
+        newline = False
+    return tokens
+
+
+def _regex_allowed(tokens: List[Token]) -> bool:
+    if not tokens:
+        return True
+    kind, value = tokens[-1][0], tokens[-1][1]
+    if kind == 'punct':
+        return value not in (')', ']', '}')
+    return kind == 'name' and value in _REGEX_PREFIX_WORDS
+
+
+def _match_parens(tokens: List[Token]) -> Dict[int, int]:
+    """Index of every '(' -> index of its closing ')' (one pass with a stack)."""
+    pairs: Dict[int, int] = {}
+    stack: List[int] = []
+    for idx, tok in enumerate(tokens):
+        if tok[0] != 'punct':
+            continue
+        if tok[1] == '(':
+            stack.append(idx)
+        elif tok[1] == ')' and stack:
+            pairs[stack.pop()] = idx
+    return pairs
+
+
+def _statements(tokens: List[Token]) -> Iterable[Tuple[int, int]]:
+    """Yields (start, end) token ranges of statements."""
+    start = 0
+    depth = 0
+    for idx, tok in enumerate(tokens):
+        kind, value, _, _, newline = tok
+        if (newline and depth == 0 and idx > start
+                and tokens[idx - 1][1] not in _CONTINUATION and value not in _CONTINUATION):
+            yield start, idx
+            start = idx
+        if kind == 'punct':
+            if value in (';', '{', '}'):
+                if idx > start:
+                    yield start, idx
+                start = idx + 1
+                depth = 0
+                continue
+            if value in ('(', '['):
+                depth += 1
+            elif value in (')', ']'):
+                depth = max(depth - 1, 0)
+    if start < len(tokens):
+        yield start, len(tokens)
+
 
-def find_dom_xss(text: str) -> list[str]:
+def _skip_control(tokens: List[Token], start: int, end: int, parens: Dict[int, int],
+                  openers: Dict[int, int]) -> int:
     """
-    Scans provided HTML/text for inline <script> blocks,
-    highlights sources and sinks, and returns list of annotated lines.
+    First token of the body of a braceless control-flow statement: skips
+    'if (...)', 'else', 'for (...)' heads and the tail of a for (...;...;...)
+    header that began in an earlier statement.
     """
-    results = []
+    for idx in range(start, end):
+        # ')' closing a '(' opened before this statement ends a for header
+        if openers.get(idx, end) < start:
+            start = idx + 1
+    while start < end and tokens[start][0] == 'name':
+        value = tokens[start][1]
+        if value in ('else', 'do'):
+            start += 1
+        elif value in _CONTROL_HEADS and start + 1 < end and tokens[start + 1][1] == '(':
+            start = parens.get(start + 1, end) + 1
+        else:
+            break
+    return start
 
-    # Extract all inline script contents
-    for match in SCRIPT_BLOCK_RE.finditer(text):
-        script = match.group(1).splitlines()
-        tracked_vars = set()
 
-        for idx, raw_line in enumerate(script, start=1):
-            line = raw_line.rstrip()
-            annotated = False
+def is_source(name: str) -> bool:
+    return name in SOURCES or name.startswith(SOURCE_PREFIXES)
+
+
+def _sanitised(tokens: List[Token], open_idx: int) -> bool:
+    """True if the '(' at open_idx starts the arguments of a sanitiser call."""
+    return open_idx > 0 and tokens[open_idx - 1][0] == 'name' and tokens[open_idx - 1][1] in SANITIZERS
+
+
+# '(' index -> (closing index, origin of the first tainted value inside, contains '=>')
+Ranges = Dict[int, Tuple[int, Optional[Tuple[str, Optional[str]]], bool]]
+
+
+class _TaintState:
+    """Tainted names of one script: name -> original source."""
+
+    def __init__(self):
+        self.tainted: Dict[str, str] = {}
+
+    def origin(self, name: str) -> Optional[Tuple[str, Optional[str]]]:
+        """(source, variable) if the name is a source or derives from a tainted name."""
+        if is_source(name):
+            return name, None
+        prefix = name
+        while True:
+            src = self.tainted.get(prefix)
+            if src is not None:
+                return src, prefix
+            cut = prefix.rfind('.')
+            if cut == -1:
+                return None
+            prefix = prefix[:cut]
+            # location.hash.slice derives from location.hash, location.host is not a source
+            if prefix not in _WHOLE_OBJECT_SOURCES and is_source(prefix):
+                return prefix, None
+
+    def ranges(self, tokens: List[Token], start: int, end: int) -> Ranges:
+        """
+        Taint of every parenthesised range of tokens[start:end] in one pass with
+        a stack: a closed range passes its origin and '=>' flag to the enclosing
+        one, so nested calls are not scanned again. A sanitiser only neutralises
+        the operand it wraps: its arguments do not taint the enclosing range.
+        Ranges left open at the end of the statement are closed at end.
+        """
+        result: Ranges = {}
+        stack: List[list] = []
+
+        def close(idx: int) -> None:
+            open_idx, origin, arrow = stack.pop()
+            result[open_idx] = (idx, origin, arrow)
+            if stack:
+                parent = stack[-1]
+                if parent[1] is None and not _sanitised(tokens, open_idx):
+                    parent[1] = origin
+                parent[2] = parent[2] or arrow
+
+        for idx in range(start, end):
+            kind, value = tokens[idx][0], tokens[idx][1]
+            if kind == 'punct':
+                if value == '(':
+                    stack.append([idx, None, False])
+                elif value == ')' and stack:
+                    close(idx)
+                elif value == '=>' and stack:
+                    stack[-1][2] = True
+            elif kind == 'name' and stack and stack[-1][1] is None:
+                stack[-1][1] = self.origin(value)
+        while stack:
+            close(end)
+        return result
+
+    def expression(self, tokens: List[Token], start: int, end: int,
+                   ranges: Ranges) -> Optional[Tuple[str, Optional[str]]]:
+        """
+        Origin of the first tainted value in tokens[start:end], None if clean or
+        sanitised; parenthesised ranges are looked up in ranges, not rescanned.
+        """
+        idx = start
+        while idx < end:
+            kind, value = tokens[idx][0], tokens[idx][1]
+            if kind == 'punct' and value == '(' and idx in ranges:
+                close, origin, _ = ranges[idx]
+                if origin is not None and not _sanitised(tokens, idx):
+                    return origin
+                idx = close + 1
+                continue
+            idx += 1
+            if kind == 'name':
+                found = self.origin(value)
+                if found is not None:
+                    return found
+        return None
+
+
+def _sink_call(name: str) -> bool:
+    return name in CALL_SINKS or ('.' in name and name.rsplit('.', 1)[-1] in CALL_SINK_METHODS)
+
+
+def _sink_property(name: str) -> bool:
+    return name in NAVIGATION_SINKS or ('.' in name and name.rsplit('.', 1)[-1] in PROPERTY_SINKS)
+
+
+def _snippet(script: str, pos: int) -> str:
+    # search only a window around the sink: minified bundles are one huge line
+    lo = max(0, pos - _SNIPPET_WIDTH)
+    hi = min(len(script), pos + _SNIPPET_WIDTH)
+    start = script.rfind('\n', lo, pos) + 1 or lo
+    end = script.find('\n', pos, hi)
+    if end == -1:
+        end = hi
+    return script[start:end].strip()
+
+
+def analyze_script(script: str) -> List[DomFinding]:
+    """
+    Follows data flow from DOM sources to sinks in one script.
+
+    Tracks var/let/const declarations, plain and chained assignments and
+    property chains; reports sink calls and sink property assignments that
+    receive a tainted value. Runs in time linear in the script size.
+    """
+    tokens = tokenize(script)
+    parens = _match_parens(tokens)
+    openers = {close: open_idx for open_idx, close in parens.items()}
+    state = _TaintState()
+    findings: List[DomFinding] = []
 
-            # Detect sources
-            for src_match in SOURCE_PATTERNS.finditer(line):
-                src = src_match.group()
-                # mark and remember variable usage
-                line = line.replace(src, f"{COLOR_SOURCE}{src}{COLOR_RESET}")
-                annotated = True
-                # if variable assignment, track variable name
-                var_assign = re.search(r"var\s+([A-Za-z_$][\w$]*)", line)
-                if var_assign:
-                    tracked_vars.add(var_assign.group(1))
+    def report(idx: int, sink: str, origin: Tuple[str, Optional[str]]) -> None:
+        tok = tokens[idx]
+        findings.append(DomFinding(tok[2], origin[0], sink, origin[1], _snippet(script, tok[3])))
 
-            # Highlight tracked variables
-            for var in list(tracked_vars):
-                if re.search(rf"\b{re.escape(var)}\b", line):
-                    line = re.sub(rf"\b{re.escape(var)}\b",
-                                   f"{COLOR_SOURCE}{var}{COLOR_RESET}", line)
-                    annotated = True
+    for start, end in _statements(tokens):
+        ranges = state.ranges(tokens, start, end)
+        # sink calls: sink(...) with a tainted argument
+        for idx in range(start, end - 1):
+            kind, value = tokens[idx][0], tokens[idx][1]
+            if kind != 'name' or tokens[idx + 1][1] != '(':
+                continue
+            # method of a call result: $('#x').html(...)
+            if idx > 0 and tokens[idx - 1][1] == '.':
+                value = '.' + value
+            if not _sink_call(value):
+                continue
+            close, origin, arrow = ranges[idx + 1]
+            if value in _TIMER_SINKS and idx + 2 < close and (tokens[idx + 2][1] == 'function' or arrow):
+                continue
+            if origin:
+                report(idx, value, origin)
 
-            # Detect sinks
-            for sink_match in SINK_PATTERNS.finditer(raw_line):
-                sink = sink_match.group()
-                line = line.replace(sink, f"{COLOR_SINK}{sink}{COLOR_RESET}")
-                annotated = True
+        # assignments: targets = ... = expression
+        first = _skip_control(tokens, start, end, parens, openers)
+        if first >= end:
+            continue
+        declaration = tokens[first][0] == 'name' and tokens[first][1] in _DECLARATIONS
+        if declaration:
+            first += 1
+        for decl_start, decl_end in _split_commas(tokens, first, end) if declaration else [(first, end)]:
+            _assign(tokens, decl_start, decl_end, state, ranges, report)
 
-            if annotated:
-                # prefix with line number
-                results.append(f"{idx:>3}: {line}")
+    return findings
 
+
+def _split_commas(tokens: List[Token], start: int, end: int) -> List[Tuple[int, int]]:
+    """Splits 'a = 1, b = 2' at top-level commas."""
+    parts = []
+    depth = 0
+    part = start
+    for idx in range(start, end):
+        value = tokens[idx][1]
+        if tokens[idx][0] != 'punct':
+            continue
+        if value in ('(', '[', '{'):
+            depth += 1
+        elif value in (')', ']', '}'):
+            depth -= 1
+        elif value == ',' and depth == 0:
+            parts.append((part, idx))
+            part = idx + 1
+    parts.append((part, end))
+    return parts
+
+
+def _assign(tokens: List[Token], start: int, end: int, state: _TaintState, ranges: Ranges, report) -> None:
+    # top-level assignment operators of the statement
+    ops = []
+    depth = 0
+    for idx in range(start, end):
+        kind, value = tokens[idx][0], tokens[idx][1]
+        if kind != 'punct':
+            continue
+        if value in ('(', '['):
+            depth += 1
+        elif value in (')', ']'):
+            depth -= 1
+        elif depth == 0 and value in _ASSIGN_OPS:
+            ops.append(idx)
+        elif depth == 0 and value == '=>':
+            break
+    if not ops:
+        return
+    origin = state.expression(tokens, ops[-1] + 1, end, ranges)
+    target_start = start
+    for op in ops:
+        target = _target(tokens, target_start, op)
+        target_start = op + 1
+        if target is None:
+            continue
+        name, idx = target
+        if origin and _sink_property(name):
+            report(idx, name, origin)
+        if name.startswith('.'):
+            # property of a call result is not tracked
+            continue
+        if origin:
+            state.tainted[name] = origin[0]
+        elif tokens[op][1] == '=':
+            # overwritten with a clean value
+            state.tainted.pop(name, None)
+
+
+def _target(tokens: List[Token], start: int, end: int) -> Optional[Tuple[str, int]]:
+    """
+    Assigned name of 'x', 'a.b' or 'a[i]' (the whole object for element writes);
+    '.prop' for a property of a call result such as f(...).innerHTML.
+    """
+    if end - start == 1 and tokens[start][0] == 'name':
+        return tokens[start][1], start
+    if end - start > 1 and tokens[start][0] == 'name' and tokens[start + 1][1] == '[':
+        return tokens[start][1], start
+    if end - start > 2 and tokens[end - 1][0] == 'name' and tokens[end - 2][1] == '.':
+        return '.' + tokens[end - 1][1], end - 1
+    return None
+
+
+def _inline_scripts(source: Union[str, PageModel]) -> Iterable[str]:
+    # a parsed page already carries its inline scripts; raw text falls back to the regex
+    if isinstance(source, PageModel):
+        return source.scripts
+    return (match.group(1) for match in SCRIPT_BLOCK_RE.finditer(source))
+
+
+def analyze_scripts(scripts: Tuple[str, ...]) -> Tuple[Tuple[DomFinding, ...], ...]:
+    """Findings of several scripts in one job (the unit sent to the analysis pool)."""
+    return tuple(tuple(analyze_script(script)) for script in scripts)
+
+
+class ScriptAnalysisCache:
+    """
+    Scan-wide memo of DOM findings keyed by a content hash of each script.
+
+    The same inline snippet repeated on every page, or the same external file
+    linked from many pages, is analysed once; later occurrences cost a hash
+    lookup. External scripts are also fetched once per URL.
+    """
+
+    def __init__(self, max_entries: int = 8192):
+        self.max_entries = max_entries
+        self._findings: 'OrderedDict[bytes, Tuple[DomFinding, ...]]' = OrderedDict()
+        self._reported: Set[bytes] = set()
+        self._external: Dict[str, asyncio.Future] = {}
+        # analysed by warm() but not yet requested: the first lookup is not a hit
+        self._warmed: Set[bytes] = set()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def digest(script: str) -> bytes:
+        return hashlib.blake2b(script.encode('utf-8', 'surrogatepass'), digest_size=16).digest()
+
+    def analyze(self, script: str) -> Tuple[bytes, Tuple[DomFinding, ...]]:
+        """(content hash, findings) of one script, analysed at most once."""
+        key = self.digest(script)
+        findings = self._findings.get(key)
+        if findings is not None:
+            self._findings.move_to_end(key)
+            if key in self._warmed:
+                self._warmed.discard(key)
+            else:
+                self.hits += 1
+            return key, findings
+        self.misses += 1
+        with get_metrics().stage('dom'):
+            findings = tuple(analyze_script(script))
+        self._store(key, findings)
+        return key, findings
+
+    def _store(self, key: bytes, findings: Tuple[DomFinding, ...]) -> None:
+        self._findings[key] = findings
+        if len(self._findings) > self.max_entries:
+            self._warmed.discard(self._findings.popitem(last=False)[0])
+
+    async def warm(self, source: Union[str, PageModel, Iterable[str]]) -> None:
+        """
+        Analyses the not-yet-seen scripts of a page (or of a list of scripts)
+        in one job through engine.executor, so large scripts do not block the
+        event loop. The following analyze()/report calls are then cache lookups.
+        """
+        scripts = _inline_scripts(source) if isinstance(source, (str, PageModel)) else source
+        missing: Dict[bytes, str] = {}
+        for script in scripts:
+            key = self.digest(script)
+            if key not in self._findings and key not in missing:
+                missing[key] = script
+        if not missing:
+            return
+        bodies = tuple(missing.values())
+        with get_metrics().stage('dom'):
+            results = await run_cpu(analyze_scripts, bodies, size=sum(map(len, bodies)))
+        for key, findings in zip(missing, results):
+            if key not in self._findings:
+                self.misses += 1
+                self._warmed.add(key)
+                self._store(key, findings)
+
+    def first_report(self, key: bytes) -> bool:
+        """True the first time findings of this script are reported in the scan."""
+        if key in self._reported:
+            return False
+        self._reported.add(key)
+        return True
+
+    async def analyze_external(
+        self,
+        url: str,
+        fetch: Callable[[str], Awaitable[Optional[str]]]
+    ) -> Tuple[bytes, Tuple[DomFinding, ...]]:
+        """
+        Fetches an external script once per URL (concurrent callers share the
+        download) and analyses its content through the hash cache.
+        """
+        future = self._external.get(url)
+        if future is None:
+            future = self._external[url] = asyncio.ensure_future(self._load_external(url, fetch))
+        return await asyncio.shield(future)
+
+    async def _load_external(self, url: str, fetch) -> Tuple[bytes, Tuple[DomFinding, ...]]:
+        body = await fetch(url)
+        if not body:
+            return b'', ()
+        await self.warm((body,))
+        return self.analyze(body)
+
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'scripts': len(self._findings),
+            'external': len(self._external),
+        }
+
+
+def find_dom_xss(text: Union[str, PageModel], cache: Optional[ScriptAnalysisCache] = None) -> List[DomFinding]:
+    """
+    Analyses inline <script> blocks of provided HTML/text or a parsed PageModel
+    and returns structured source-to-sink findings.
+    With a cache, identical scripts are analysed only once per scan.
+    """
+    results: List[DomFinding] = []
+    for body in _inline_scripts(text):
+        results.extend(cache.analyze(body)[1] if cache is not None else analyze_script(body))
     return results
 
 
-def report_dom_findings(html: str):
+def _highlight(snippet: str, name: str, color: str) -> str:
+    return re.sub(rf'(?<![\w$]){re.escape(name)}(?![\w$])', f"{color}{name}{COLOR_RESET}", snippet)
+
+
+def render_findings(findings: Iterable[DomFinding]) -> List[str]:
+    """
+    Formats findings for the terminal: line number, snippet with
+    highlighted source and sink, and the flow summary.
+    """
+    lines = []
+    for f in findings:
+        snippet = f.snippet
+        for name in filter(None, (f.source, f.via)):
+            snippet = _highlight(snippet, name, COLOR_SOURCE)
+        snippet = _highlight(snippet, f.sink.lstrip('.'), COLOR_SINK)
+        flow = f"{f.source} -> {f.via} -> {f.sink}" if f.via else f"{f.source} -> {f.sink}"
+        lines.append(f"{f.line:>3}: {snippet}  [{flow}]")
+    return lines
+
+
+def report_dom_findings(html: Union[str, PageModel], cache: Optional[ScriptAnalysisCache] = None):
     """
     Runs detection and prints any found DOM-XSS risks.
+
+    With a cache, findings of a script already reported earlier in the scan
+    are only counted, not printed again.
     """
-    findings = find_dom_xss(html)
+    if cache is None:
+        findings = find_dom_xss(html)
+        repeated = 0
+    else:
+        findings = []
+        repeated = 0
+        for body in _inline_scripts(html):
+            key, found = cache.analyze(body)
+            if not found:
+                continue
+            if cache.first_report(key):
+                findings.extend(found)
+            else:
+                repeated += len(found)
     if findings:
         click.secho("[DOM XSS] Potential risky code segments detected:", fg="cyan")
-        for line in findings:
+        for line in render_findings(findings):
             click.echo(line)
-    else:
-        click.secho("[DOM XSS] No issues found.", fg="green")
\ No newline at end of file
+    if repeated:
+        click.secho(f"[DOM XSS] {repeated} finding(s) in scripts already reported", fg="cyan")
+    if not findings and not repeated:
+        click.secho("[DOM XSS] No issues found.", fg="green")
+
+
+def report_external_findings(url: str, key: bytes, findings: Iterable[DomFinding], cache: ScriptAnalysisCache):
+    """Prints findings of an external script the first time its content is seen."""
+    findings = list(findings)
+    if findings and cache.first_report(key):
+        click.secho(f"[DOM XSS] External script {url}:", fg="cyan")
+        for line in render_findings(findings):
+            click.echo(line)
+
+
+async def scan_external_scripts(
+    page: PageModel,
+    base_url: str,
+    in_scope: Callable[[str], bool],
+    fetch: Callable[[str], Awaitable[Optional[str]]],
+    cache: ScriptAnalysisCache
+) -> List[DomFinding]:
+    """
+    Analyses <script src> files of a page that are in scope (in_scope(url) is True).
+
+    Every URL is fetched once per scan and identical contents are analysed once;
+    findings are printed the first time a script is seen.
+    """
+    urls = []
+    for src in page.script_srcs:
+        url = urldefrag(urljoin(base_url, src))[0]
+        if url not in urls and in_scope(url):
+            urls.append(url)
+    results = await asyncio.gather(*(cache.analyze_external(url, fetch) for url in urls))
+    findings: List[DomFinding] = []
+    for url, (key, found) in zip(urls, results):
+        report_external_findings(url, key, found, cache)
+        findings.extend(found)
+    return findings
@@ -0,0 +1,91 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+from engine.config import CPU_WORKERS, OFFLOAD_MIN_BYTES
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar('T')
+
+
+class AnalysisExecutor:
+    """
+    Где выполняются CPU-задачи сканирования (разбор HTML, DOM-анализ, сигнатуры WAF).
+
+    Базовый исполнитель выполняет задачу сразу в потоке event loop.
+    Задачи — функции уровня модуля с компактными аргументами (строки, кортежи),
+    поэтому исполнитель можно заменить на пул процессов или свой (см. set_executor).
+    """
+
+    async def run(self, func: Callable[..., T], *args: Any, size: int = 0) -> T:
+        """size — объём данных задачи (байт/символов), по нему решается, стоит ли её выносить."""
+        return func(*args)
+
+    def close(self) -> None:
+        pass
+
+
+class ProcessExecutor(AnalysisExecutor):
+    """
+    Пул процессов по числу ядер. Сеть остаётся в event loop, а в пул уходят
+    только задачи от min_size: маленькую страницу дешевле разобрать на месте,
+    чем передавать между процессами. Пул создаётся при первой такой задаче.
+    """
+
+    def __init__(self, workers: int = 0, min_size: int = OFFLOAD_MIN_BYTES):
+        self.workers = workers or os.cpu_count() or 1
+        self.min_size = min_size
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self.offloaded = 0
+
+    async def run(self, func: Callable[..., T], *args: Any, size: int = 0) -> T:
+        if size < self.min_size:
+            return func(*args)
+        if self._pool is None:
+            # forkserver: рабочие процессы не наследуют сокеты и потоки event loop
+            methods = multiprocessing.get_all_start_methods()
+            context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else None)
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=context)
+            logger.debug(f"Пул анализа: {self.workers} процессов")
+        self.offloaded += 1
+        return await asyncio.get_running_loop().run_in_executor(self._pool, func, *args)
+
+    def close(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
+
+
+def create_executor(workers: Optional[int] = CPU_WORKERS) -> AnalysisExecutor:
+    """workers: None или 0 — по числу ядер, 1 — без пула (в потоке event loop)."""
+    if workers == 1:
+        return AnalysisExecutor()
+    return ProcessExecutor(workers or 0)
+
+
+_EXECUTOR: Optional[AnalysisExecutor] = None
+
+
+def get_executor() -> AnalysisExecutor:
+    """Общий исполнитель процесса (создаётся при первом обращении)."""
+    global _EXECUTOR
+    if _EXECUTOR is None:
+        _EXECUTOR = create_executor()
+    return _EXECUTOR
+
+
+def set_executor(executor: AnalysisExecutor) -> None:
+    """Заменяет общий исполнитель; предыдущий закрывается."""
+    global _EXECUTOR
+    if _EXECUTOR is not None and _EXECUTOR is not executor:
+        _EXECUTOR.close()
+    _EXECUTOR = executor
+
+
+async def run_cpu(func: Callable[..., T], *args: Any, size: int = 0) -> T:
+    """Выполняет CPU-задачу через общий исполнитель."""
+    return await get_executor().run(func, *args, size=size)
@@ -0,0 +1,113 @@
+import asyncio
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+Fingerprint = Tuple[str, str, Tuple[Tuple[str, str], ...]]
+
+
+def request_fingerprint(method: str, url: str, data: Optional[dict] = None) -> Fingerprint:
+    """
+    Нормализованный отпечаток запроса (method, url, body).
+
+    Схема и хост приводятся к нижнему регистру, фрагмент отбрасывается,
+    query-параметры (вместе с GET-data) сортируются, тело формы — тоже.
+    """
+    method = method.upper()
+    parts = urlsplit(url)
+    query = parse_qsl(parts.query, keep_blank_values=True)
+    body: Tuple[Tuple[str, str], ...] = ()
+    if data:
+        items = [(str(k), str(v)) for k, v in data.items()]
+        if method == 'GET':
+            query.extend(items)
+        else:
+            body = tuple(sorted(items))
+    norm_url = urlunsplit((
+        parts.scheme.lower(), parts.netloc.lower(), parts.path or '/',
+        urlencode(sorted(query)), ''
+    ))
+    return method, norm_url, body
+
+
+class ResponseCache:
+    """
+    LRU-кэш ответов с ограничением по числу записей и суммарному размеру тел.
+
+    Одновременные одинаковые запросы объединяются (single-flight): сеть или диск
+    вызывается один раз, остальные ждут тот же результат.
+    Ошибки (None) не кэшируются.
+    """
+
+    def __init__(self, max_entries: int = 2048, max_bytes: int = 64 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: 'OrderedDict[Fingerprint, dict]' = OrderedDict()
+        self._inflight: Dict[Fingerprint, asyncio.Future] = {}
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    async def get_or_load(self, key: Fingerprint, loader: Callable[[], Awaitable[Optional[dict]]]) -> Optional[dict]:
+        """Возвращает копию ответа из кэша или загружает его через loader()."""
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(entry)
+
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            try:
+                result = await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                # отменили не нас, а загружающую задачу — загружаем сами
+                if not pending.cancelled():
+                    raise
+                return await self.get_or_load(key, loader)
+            return dict(result) if result is not None else None
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            result = await loader()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # исключение уже передано ожидающим; не даём ему «потеряться» в логах
+            future.exception()
+            raise
+        else:
+            future.set_result(result)
+            if result is not None:
+                self._store(key, result)
+        finally:
+            del self._inflight[key]
+        return dict(result) if result is not None else None
+
+    def _store(self, key: Fingerprint, response: dict) -> None:
+        size = len(response.get('text', ''))
+        if size > self.max_bytes:
+            return
+        self._entries[key] = response
+        self._bytes += size
+        while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+            _, old = self._entries.popitem(last=False)
+            self._bytes -= len(old.get('text', ''))
+
+    def stats(self) -> dict:
+        """Счётчики попаданий, промахов и объединённых запросов."""
+        total = self.hits + self.misses + self.coalesced
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'coalesced': self.coalesced,
+            'entries': len(self._entries),
+            'bytes': self._bytes,
+            'hit_ratio': round((self.hits + self.coalesced) / total, 3) if total else 0.0,
+        }
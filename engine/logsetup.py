@@ -5,11 +5,11 @@ import sys
 DEFAULT_LOG_LEVEL = logging.INFO
 
 
-def setup_logging(level: int = DEFAULT_LOG_LEVEL, log_file: str = None) -> None:
+def setup_logging(level: int = DEFAULT_LOG_LEVEL, log_file: str = None, stream=None) -> None:
     """
     Настраивает корневой логгер:
 
-    - Вывод в консоль (StreamHandler).
+    - Вывод в консоль (StreamHandler, по умолчанию stdout; stream — другой поток).
     - При указании log_file — также в файл.
     """
     logger = logging.getLogger()
@@ -26,7 +26,7 @@ def setup_logging(level: int = DEFAULT_LOG_LEVEL, log_file: str = None) -> None:
     )
 
     # Консольный обработчик
-    ch = logging.StreamHandler(sys.stdout)
+    ch = logging.StreamHandler(stream or sys.stdout)
     ch.setLevel(level)
     ch.setFormatter(formatter)
     logger.addHandler(ch)
@@ -0,0 +1,229 @@
+import bisect
+import json
+import logging
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм времени, секунды
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: LabelValues, extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    """Счётчик с метками: значения по кортежу меток."""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.values: Dict[LabelValues, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def render(self) -> Iterator[str]:
+        for values, value in self.values.items():
+            yield f"{self.name}{_labels(self.labels, values)} {value:g}"
+
+
+class Histogram:
+    """
+    Гистограмма с метками: счётчики по корзинам, сумма и число наблюдений.
+    Квантили оцениваются линейной интерполяцией внутри корзины.
+    """
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # метки -> [счётчики корзин (последняя — +Inf), сумма, число]
+        self.values: Dict[LabelValues, list] = {}
+
+    def observe(self, value: float, *labels: str) -> None:
+        entry = self.values.get(labels)
+        if entry is None:
+            entry = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        entry[0][bisect.bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+    def quantile(self, q: float, *labels: str) -> Optional[float]:
+        entry = self.values.get(labels)
+        if not entry or not entry[2]:
+            return None
+        rank = q * entry[2]
+        seen = 0
+        for i, count in enumerate(entry[0]):
+            if count and seen + count >= rank:
+                lower = self.buckets[i - 1] if i > 0 else 0.0
+                # в корзине +Inf верхняя граница неизвестна — берём последнюю конечную
+                upper = self.buckets[i] if i < len(self.buckets) else self.buckets[-1]
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+    def render(self) -> Iterator[str]:
+        for values, (counts, total, count) in self.values.items():
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket
+                le = '+Inf' if bound == float('inf') else f'{bound:g}'
+                extra = f'le="{le}"'
+                yield f"{self.name}_bucket{_labels(self.labels, values, extra)} {cumulative}"
+            yield f"{self.name}_sum{_labels(self.labels, values)} {total:g}"
+            yield f"{self.name}_count{_labels(self.labels, values)} {count}"
+
+
+class ScanMetrics:
+    """
+    Метрики сканирования процесса.
+
+    - запросы по хостам: число по статусу (или 'error'), задержка, байты тела, повторы;
+    - этапы обработки (parse, dom, waf): время каждого вызова по часам (wall time),
+      включая ожидание в очереди пула анализа, а не процессорное время.
+    Доступны в формате Prometheus (render_prometheus, MetricsServer)
+    и сводкой JSON (summary) в конце запуска.
+    """
+
+    def __init__(self):
+        self.started = time.time()
+        self.requests = Counter('xssad_requests_total', 'HTTP requests by host and status', ('host', 'status'))
+        self.latency = Histogram('xssad_request_seconds', 'HTTP request latency', ('host',))
+        self.bytes = Counter('xssad_response_bytes_total', 'Response body bytes read', ('host',))
+        self.retries = Counter('xssad_retries_total', 'Retried HTTP requests', ('host',))
+        self.stages = Histogram('xssad_stage_wall_seconds',
+                                'Wall-clock time of processing stages, including analysis pool queueing', ('stage',))
+        self._metrics = (self.requests, self.latency, self.bytes, self.retries, self.stages)
+
+    def record_request(self, host: str, status: Optional[int], latency: float, size: int = 0) -> None:
+        """status None — сетевая ошибка или таймаут."""
+        self.requests.inc(host, str(status) if status is not None else 'error')
+        self.latency.observe(latency, host)
+        if size:
+            self.bytes.inc(host, amount=size)
+
+    def record_retry(self, host: str) -> None:
+        self.retries.inc(host)
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """Измеряет время этапа обработки по часам (вместе с ожиданием пула)."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages.observe(time.perf_counter() - started, name)
+
+    def render_prometheus(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+    def summary(self) -> dict:
+        """Сводка по хостам и этапам: число запросов, ошибки, статусы, байты, задержки, пропускная способность."""
+        elapsed = max(time.time() - self.started, 1e-9)
+        hosts: Dict[str, dict] = {}
+        for (host, status), count in self.requests.values.items():
+            entry = hosts.setdefault(host, {'requests': 0, 'errors': 0, 'statuses': {}})
+            entry['requests'] += int(count)
+            if status == 'error':
+                entry['errors'] += int(count)
+            else:
+                entry['statuses'][status] = int(count)
+        for host, entry in hosts.items():
+            _, total, count = self.latency.values.get((host,), (None, 0.0, 0))
+            entry['bytes'] = int(self.bytes.values.get((host,), 0))
+            entry['retries'] = int(self.retries.values.get((host,), 0))
+            if count:
+                entry['latency_mean'] = round(total / count, 4)
+                entry['latency_p50'] = round(self.latency.quantile(0.5, host), 4)
+                entry['latency_p95'] = round(self.latency.quantile(0.95, host), 4)
+        stages = {
+            name: {
+                'count': count,
+                'wall_seconds': round(total, 4),
+                'wall_mean': round(total / count, 6),
+                'wall_p95': round(self.stages.quantile(0.95, name), 6),
+            }
+            for (name,), (_, total, count) in self.stages.values.items()
+        }
+        total_requests = sum(entry['requests'] for entry in hosts.values())
+        return {
+            'elapsed': round(elapsed, 2),
+            'requests': total_requests,
+            'requests_per_second': round(total_requests / elapsed, 2),
+            'hosts': hosts,
+            'stages': stages,
+        }
+
+    def write_summary(self, path: str) -> None:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.summary(), f, ensure_ascii=False, indent=2)
+
+
+METRICS = ScanMetrics()
+
+
+def get_metrics() -> ScanMetrics:
+    """Метрики процесса."""
+    return METRICS
+
+
+class MetricsServer:
+    """Локальный HTTP-эндпоинт /metrics в текстовом формате Prometheus."""
+
+    def __init__(self, metrics: ScanMetrics = METRICS, host: str = '127.0.0.1', port: int = 9464):
+        self.metrics = metrics
+        self.host = host
+        self.port = port
+        self._runner: Optional[web.AppRunner] = None
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        return web.Response(text=self.metrics.render_prometheus(), content_type='text/plain', charset='utf-8',
+                            headers={'X-Content-Type-Options': 'nosniff'})
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_get('/metrics', self._handle)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"Метрики: http://{self.host}:{self.port}/metrics")
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def __aenter__(self) -> 'MetricsServer':
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.stop()
@@ -1,10 +1,11 @@
 import random
-from typing import List
+from typing import List, Optional
 from urllib.parse import quote
 
 
-def random_case(payload: str) -> str:
-    return ''.join(ch.upper() if random.random() < 0.5 else ch.lower() for ch in payload)
+def random_case(payload: str, rng: Optional[random.Random] = None) -> str:
+    rand = (rng or random).random
+    return ''.join(ch.upper() if rand() < 0.5 else ch.lower() for ch in payload)
 
 
 def entity_encode(payload: str) -> str:
@@ -15,10 +16,10 @@ def percent_encode(payload: str) -> str:
     return quote(payload)
 
 
-def obfuscate(payload: str) -> List[str]:
-    variants = [random_case(payload), entity_encode(payload), percent_encode(payload)]
+def obfuscate(payload: str, rng: Optional[random.Random] = None) -> List[str]:
+    variants = [random_case(payload, rng), entity_encode(payload), percent_encode(payload)]
     seen = set(); result: List[str] = []
     for v in variants:
         if v not in seen:
             result.append(v); seen.add(v)
-    return result
\ No newline at end of file
+    return result
@@ -0,0 +1,130 @@
+import logging
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple
+
+from engine.config import PARSER_BACKEND
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class FormModel:
+    """Форма страницы: action, метод и поля (name, value) <input>/<textarea>."""
+    action: str
+    method: str
+    inputs: Tuple[Tuple[str, str], ...]
+
+
+@dataclass(frozen=True)
+class PageModel:
+    """
+    Результат однократного разбора HTML-страницы.
+
+    Используется краулером (links), извлечением эндпоинтов (links, forms)
+    и DOM-сканером (scripts, script_srcs). Сам HTML не хранится.
+    """
+    url: str
+    links: Tuple[str, ...]
+    forms: Tuple[FormModel, ...]
+    inputs: Tuple[Tuple[str, str], ...]
+    scripts: Tuple[str, ...]
+    script_srcs: Tuple[str, ...]
+
+
+def _parse_bs4(html: str, url: str) -> PageModel:
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, 'html.parser')
+    links = tuple(a['href'] for a in soup.find_all('a', href=True))
+    forms = []
+    for form in soup.find_all('form'):
+        fields = []
+        # собираем все <input> и <textarea>
+        for tag in form.find_all(['input', 'textarea']):
+            name = tag.get('name')
+            if name:
+                fields.append((name, tag.get('value', '')))
+        forms.append(FormModel(form.get('action', ''), form.get('method', 'get').upper(), tuple(fields)))
+    inputs = tuple(
+        (tag['name'], tag.get('value', ''))
+        for tag in soup.find_all(['input', 'textarea']) if tag.get('name')
+    )
+    scripts = []
+    srcs = []
+    for tag in soup.find_all('script'):
+        if tag.get('src'):
+            srcs.append(tag['src'])
+        elif tag.string and tag.string.strip():
+            scripts.append(str(tag.string))
+    return PageModel(url, links, tuple(forms), inputs, tuple(scripts), tuple(srcs))
+
+
+def _parse_lxml(html: str, url: str) -> PageModel:
+    import lxml.html
+
+    root = lxml.html.document_fromstring(html)
+    links = tuple(a.get('href') for a in root.iter('a') if a.get('href') is not None)
+    forms = []
+    for form in root.iter('form'):
+        fields = tuple(
+            (tag.get('name'), tag.get('value', ''))
+            for tag in form.iter('input', 'textarea') if tag.get('name')
+        )
+        forms.append(FormModel(form.get('action', ''), form.get('method', 'get').upper(), fields))
+    inputs = tuple(
+        (tag.get('name'), tag.get('value', ''))
+        for tag in root.iter('input', 'textarea') if tag.get('name')
+    )
+    scripts = []
+    srcs = []
+    for tag in root.iter('script'):
+        if tag.get('src'):
+            srcs.append(tag.get('src'))
+        elif tag.text and tag.text.strip():
+            scripts.append(tag.text)
+    return PageModel(url, links, tuple(forms), inputs, tuple(scripts), tuple(srcs))
+
+
+# Доступные бэкенды разбора: имя -> функция (html, url) -> PageModel
+PARSER_BACKENDS: Dict[str, Callable[[str, str], PageModel]] = {
+    'html.parser': _parse_bs4,
+    'lxml': _parse_lxml,
+}
+
+
+def register_backend(name: str, func: Callable[[str, str], PageModel]) -> None:
+    """Регистрирует дополнительный бэкенд разбора HTML."""
+    PARSER_BACKENDS[name] = func
+
+
+def _default_backend() -> str:
+    if PARSER_BACKEND != 'auto':
+        return PARSER_BACKEND
+    try:
+        import lxml.html  # noqa: F401
+        return 'lxml'
+    except ImportError:
+        return 'html.parser'
+
+
+_DEFAULT_BACKEND = _default_backend()
+
+
+def parse_page(html: str, url: str = '', backend: Optional[str] = None) -> PageModel:
+    """
+    Разбирает HTML один раз и возвращает PageModel.
+
+    backend — имя из PARSER_BACKENDS; по умолчанию engine.config.PARSER_BACKEND
+    ('auto' — lxml, если установлен, иначе html.parser).
+    Если быстрый бэкенд не справился с документом, используется html.parser.
+    """
+    if not html or not html.strip():
+        return PageModel(url, (), (), (), (), ())
+    name = backend or _DEFAULT_BACKEND
+    try:
+        return PARSER_BACKENDS[name](html, url)
+    except Exception as e:
+        if name == 'html.parser':
+            raise
+        logger.debug(f"Бэкенд {name} не разобрал {url}: {e}, используем html.parser")
+        return _parse_bs4(html, url)
@@ -1,10 +1,12 @@
-from bs4 import BeautifulSoup
-from urllib.parse import urlparse, parse_qsl
+from typing import Dict, List, Tuple, Union
+from urllib.parse import urldefrag, urljoin, urlparse, parse_qsl
 
+from engine.page import PageModel, parse_page
 
-def extract_endpoints(html: str) -> list[dict]:
+
+def extract_endpoints(page: Union[str, PageModel]) -> list[dict]:
     """
-    Извлекает точки ввода из HTML-контента.
+    Извлекает точки ввода из HTML-контента или уже разобранной PageModel.
 
     Возвращает список словарей с ключами:
       - type: 'link' или 'form'
@@ -14,12 +16,12 @@ def extract_endpoints(html: str) -> list[dict]:
       - value: значение параметра (для link)
       - params: словарь name->value (для form)
     """
+    if isinstance(page, str):
+        page = parse_page(page)
     endpoints: list[dict] = []
-    soup = BeautifulSoup(html, 'html.parser')
 
     # Ссылки с параметрами GET
-    for a in soup.find_all('a', href=True):
-        href = a['href']
+    for href in page.links:
         parsed = urlparse(href)
         if parsed.query:
             for key, val in parse_qsl(parsed.query, keep_blank_values=True):
@@ -32,22 +34,77 @@ def extract_endpoints(html: str) -> list[dict]:
                 })
 
     # Формы
-    for form in soup.find_all('form'):
-        method = form.get('method', 'get').upper()
-        action = form.get('action', '')
-        inputs = {}
-        # собираем все <input> и <textarea>
-        for tag in form.find_all(['input', 'textarea']):
-            name = tag.get('name')
-            if not name:
-                continue
-            # для чекбоксов и радио берём атрибут value, по умолчанию empty
-            inputs[name] = tag.get('value', '')
+    for form in page.forms:
         endpoints.append({
             'type': 'form',
-            'url': action,
-            'method': method,
-            'params': inputs
+            'url': form.action,
+            'method': form.method,
+            # для чекбоксов и радио берём атрибут value, по умолчанию empty
+            'params': dict(form.inputs)
         })
 
-    return endpoints
\ No newline at end of file
+    return endpoints
+
+
+EndpointFingerprint = Tuple[str, str, Tuple[str, ...], str]
+
+
+def endpoint_fingerprint(page_url: str, endpoint: dict) -> EndpointFingerprint:
+    """
+    Отпечаток эндпоинта для всего сканирования:
+    (method, абсолютный action без query, отсортированные имена параметров, проверяемый параметр).
+
+    Значения параметров не учитываются: одна и та же форма поиска в шапке
+    каждой страницы даёт один отпечаток. Для ссылок проверяемый параметр
+    входит в отпечаток, т.к. каждый параметр ссылки — отдельный эндпоинт.
+    """
+    action = urldefrag(urljoin(page_url, endpoint.get('url') or ''))[0]
+    parsed = urlparse(action)
+    names = {name for name, _ in parse_qsl(parsed.query, keep_blank_values=True)}
+    names.update(endpoint.get('params') or {})
+    target = (endpoint.get('param') or '') if endpoint.get('type') == 'link' else ''
+    return (
+        endpoint.get('method', 'GET').upper(),
+        parsed._replace(query='').geturl(),
+        tuple(sorted(names)),
+        target,
+    )
+
+
+class EndpointIndex:
+    """
+    Индекс эндпоинтов сканирования: отпечаток -> страницы, на которых он встречается.
+
+    Первая страница с эндпоинтом проверяет его, остальные только привязываются
+    к найденному. URL страниц хранятся один раз.
+    """
+
+    def __init__(self):
+        self._pages: List[str] = []
+        self._page_ids: Dict[str, int] = {}
+        self._entries: Dict[EndpointFingerprint, List[int]] = {}
+        self.duplicates = 0
+
+    def add(self, fingerprint: EndpointFingerprint, page_url: str) -> bool:
+        """Регистрирует эндпоинт на странице; True — эндпоинт встретился впервые."""
+        page_id = self._page_ids.get(page_url)
+        if page_id is None:
+            page_id = self._page_ids[page_url] = len(self._pages)
+            self._pages.append(page_url)
+        pages = self._entries.get(fingerprint)
+        if pages is None:
+            self._entries[fingerprint] = [page_id]
+            return True
+        if pages[-1] != page_id:
+            pages.append(page_id)
+        self.duplicates += 1
+        return False
+
+    def pages(self, fingerprint: EndpointFingerprint) -> List[str]:
+        return [self._pages[i] for i in self._entries.get(fingerprint, ())]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        return {'endpoints': len(self._entries), 'pages': len(self._pages), 'duplicates': self.duplicates}
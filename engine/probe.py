@@ -0,0 +1,71 @@
+import re
+from typing import Dict, Optional, Set
+
+from aiohttp import ClientSession
+
+from engine.httpcache import ResponseCache
+from engine.tester import endpoint_params, make_marker, send_batch
+
+# Контексты, в которых может отразиться значение параметра
+CONTEXT_HTML = 'html'
+CONTEXT_ATTRIBUTE = 'attribute'
+CONTEXT_SCRIPT = 'script'
+CONTEXT_URL = 'url'
+
+# Атрибуты, значение которых браузер трактует как URL
+_URL_ATTRS = {'href', 'src', 'action', 'formaction', 'data', 'poster', 'background'}
+_ATTR_NAME_RE = re.compile(r'([\w:-]+)\s*=\s*["\']?[^"\'\s>]*$')
+
+
+def reflection_contexts(text: str, marker: str) -> Set[str]:
+    """
+    Находит все вхождения marker в ответе и определяет контекст каждого:
+    текст HTML, значение атрибута, блок <script> или URL-атрибут.
+    """
+    contexts: Set[str] = set()
+    if marker not in text:
+        return contexts
+    lower = text.lower()
+    start = lower.find(marker)
+    while start != -1:
+        # внутри <script>...</script>?
+        if lower.rfind('<script', 0, start) > lower.rfind('</script', 0, start):
+            contexts.add(CONTEXT_SCRIPT)
+        # внутри тега, т.е. последний '<' ближе, чем последний '>'?
+        elif lower.rfind('<', 0, start) > lower.rfind('>', 0, start):
+            tag = lower[lower.rfind('<', 0, start):start]
+            attr = _ATTR_NAME_RE.search(tag)
+            if attr and attr.group(1) in _URL_ATTRS:
+                contexts.add(CONTEXT_URL)
+            else:
+                contexts.add(CONTEXT_ATTRIBUTE)
+        else:
+            contexts.add(CONTEXT_HTML)
+        start = lower.find(marker, start + len(marker))
+    return contexts
+
+
+async def probe_endpoint(
+    session: ClientSession,
+    base_url: str,
+    endpoint: dict,
+    cache: Optional[ResponseCache] = None
+) -> Dict[str, Set[str]]:
+    """
+    Отправляет по одному уникальному маркеру в каждый параметр эндпоинта
+    (одним запросом, при отказе сервера — частями) и возвращает словарь
+    param -> множество контекстов отражения. Параметры без отражения в результат не попадают.
+    """
+    markers = {name: make_marker() for name in endpoint_params(endpoint)}
+    if not markers:
+        return {}
+    reflected: Dict[str, Set[str]] = {}
+    # если сервер отверг общий запрос, send_batch разобьёт параметры на части
+    for sent, response in await send_batch(session, base_url, endpoint, markers, cache):
+        if response is None:
+            continue
+        for name, marker in sent.items():
+            contexts = reflection_contexts(response['text'], marker)
+            if contexts:
+                reflected[name] = contexts
+    return reflected
@@ -0,0 +1,315 @@
+import asyncio
+import logging
+import random
+import time
+import weakref
+from contextlib import asynccontextmanager, contextmanager, nullcontext
+from contextvars import ContextVar
+from email.utils import parsedate_to_datetime
+from typing import AsyncIterator, Dict, Iterator, Optional, Sequence
+from urllib.parse import urlparse
+
+from aiohttp import ClientError, ClientSession, ClientTimeout, InvalidURL, NonHttpUrlClientError
+
+from engine.bodyreader import read_body
+from engine.config import REQUEST_TIMEOUT
+from engine.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+# Ответы, означающие «слишком часто» / «временно недоступен»: снижаем темп и повторяем
+THROTTLE_STATUSES = {429, 503}
+# Временные ошибки шлюза: повторяем без снижения темпа
+RETRY_STATUSES = THROTTLE_STATUSES | {502, 504}
+
+
+def parse_retry_after(value: Optional[str], now: Optional[float] = None) -> Optional[float]:
+    """Retry-After в секундах: число секунд или HTTP-дата. None, если заголовка нет или он некорректен."""
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        moment = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if moment is None:
+        return None
+    return max(0.0, moment.timestamp() - (now if now is not None else time.time()))
+
+
+class RetryPolicy:
+    """
+    Ограниченные повторы с экспоненциальной задержкой и полным джиттером.
+
+    attempts — общее число попыток (1 — без повторов).
+    Retry-After сервера имеет приоритет, но не больше max_delay.
+    """
+
+    def __init__(self, attempts: int = 3, base_delay: float = 0.5, max_delay: float = 30.0):
+        self.attempts = max(1, attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+class _HostState:
+    __slots__ = ('limit', 'active', 'successes', 'latency', 'baseline', 'resume_at', 'cond')
+
+    def __init__(self, limit: float):
+        self.limit = limit
+        self.active = 0
+        self.successes = 0
+        self.latency: Optional[float] = None
+        self.baseline: Optional[float] = None
+        self.resume_at = 0.0
+        self.cond = asyncio.Condition()
+
+
+class HostRateController:
+    """
+    Адаптивный лимит параллельных запросов на хост (AIMD).
+
+    - Пока хост отвечает нормально, лимит растёт на 1 после каждых `limit` успехов.
+    - На 429/503, сетевые ошибки и таймауты лимит уменьшается вдвое,
+      а хост ставится на паузу (Retry-After или backoff).
+    - Рост задержки ответа в latency_factor раз относительно лучшей
+      наблюдавшейся тоже уменьшает лимит.
+    """
+
+    def __init__(self, initial: int = 2, min_limit: int = 1, max_limit: int = 16,
+                 latency_factor: float = 3.0, backoff: float = 1.0):
+        self.initial = initial
+        self.min_limit = min_limit
+        self.max_limit = max(max_limit, min_limit)
+        self.latency_factor = latency_factor
+        self.backoff = backoff
+        self._hosts: Dict[str, _HostState] = {}
+        self.throttled = 0
+        self.errors = 0
+
+    def _state(self, host: str) -> _HostState:
+        state = self._hosts.get(host)
+        if state is None:
+            state = self._hosts[host] = _HostState(min(max(self.initial, self.min_limit), self.max_limit))
+        return state
+
+    def limit(self, host: str) -> int:
+        return int(self._state(host).limit)
+
+    @asynccontextmanager
+    async def slot(self, host: str) -> AsyncIterator[None]:
+        """Ждёт свободного места в лимите хоста и окончания паузы."""
+        state = self._state(host)
+        async with state.cond:
+            while True:
+                pause = state.resume_at - time.monotonic()
+                if pause > 0:
+                    # пауза может продлиться, пока ждём, — проверяем снова
+                    state.cond.release()
+                    try:
+                        await asyncio.sleep(pause)
+                    finally:
+                        await state.cond.acquire()
+                    continue
+                if state.active < int(state.limit):
+                    break
+                await state.cond.wait()
+            state.active += 1
+        try:
+            yield
+        finally:
+            async with state.cond:
+                state.active -= 1
+                state.cond.notify_all()
+
+    def _decrease(self, state: _HostState, pause: float) -> None:
+        state.limit = max(self.min_limit, state.limit / 2)
+        state.successes = 0
+        state.resume_at = max(state.resume_at, time.monotonic() + pause)
+
+    def record(self, host: str, status: Optional[int], latency: float,
+               retry_after: Optional[float] = None, error: bool = False) -> None:
+        """Учитывает результат запроса к хосту."""
+        state = self._state(host)
+        if error or status in THROTTLE_STATUSES:
+            if error:
+                self.errors += 1
+            else:
+                self.throttled += 1
+            pause = retry_after if retry_after is not None else random.uniform(0, self.backoff)
+            self._decrease(state, pause)
+            logger.debug(f"{host}: замедление, лимит {state.limit:.1f}, пауза {pause:.1f}s")
+            return
+
+        # EWMA задержки и лучшая наблюдавшаяся задержка как ориентир
+        state.latency = latency if state.latency is None else 0.8 * state.latency + 0.2 * latency
+        state.baseline = state.latency if state.baseline is None else min(state.baseline, state.latency)
+        if state.baseline > 0 and state.latency > state.baseline * self.latency_factor and state.limit > self.min_limit:
+            self._decrease(state, 0)
+            # после снижения ориентир сдвигается, иначе лимит упадёт до минимума
+            state.baseline = state.latency
+            return
+
+        state.successes += 1
+        if state.successes >= int(state.limit) and state.limit < self.max_limit:
+            state.limit += 1
+            state.successes = 0
+
+    def stats(self) -> dict:
+        return {
+            'hosts': {host: int(state.limit) for host, state in self._hosts.items()},
+            'throttled': self.throttled,
+            'errors': self.errors,
+        }
+
+
+_DEFAULT_RETRY = RetryPolicy()
+# Контроллер по умолчанию — свой для каждого event loop (asyncio-примитивы привязаны к циклу)
+_loop_controllers: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, HostRateController]' = \
+    weakref.WeakKeyDictionary()
+
+# Контроллер и политика повторов текущего сканирования; задачи, созданные
+# внутри сканирования, наследуют их автоматически
+_current_controller: ContextVar[Optional[HostRateController]] = ContextVar('rate_controller', default=None)
+_current_retry: ContextVar[RetryPolicy] = ContextVar('retry_policy', default=_DEFAULT_RETRY)
+# Общий предел запросов «в полёте» для нескольких сканирований сразу (см. request_limit)
+_current_limit: ContextVar[Optional[asyncio.Semaphore]] = ContextVar('request_limit', default=None)
+
+
+def get_controller() -> HostRateController:
+    controller = _current_controller.get()
+    if controller is None:
+        loop = asyncio.get_running_loop()
+        controller = _loop_controllers.get(loop)
+        if controller is None:
+            controller = _loop_controllers[loop] = HostRateController()
+    return controller
+
+
+def get_retry_policy() -> RetryPolicy:
+    return _current_retry.get()
+
+
+class _RateControlScope:
+    """Область действия контроллера; работает и как with, и как async with."""
+
+    def __init__(self, controller: HostRateController, retry: Optional[RetryPolicy]):
+        self.controller = controller
+        self.retry = retry
+        self._tokens = None
+
+    def __enter__(self) -> HostRateController:
+        self._tokens = (
+            _current_controller.set(self.controller),
+            _current_retry.set(self.retry) if self.retry is not None else None,
+        )
+        return self.controller
+
+    def __exit__(self, *exc) -> None:
+        token, retry_token = self._tokens
+        _current_controller.reset(token)
+        if retry_token is not None:
+            _current_retry.reset(retry_token)
+
+    async def __aenter__(self) -> HostRateController:
+        return self.__enter__()
+
+    async def __aexit__(self, *exc) -> None:
+        self.__exit__(*exc)
+
+
+def rate_control(controller: HostRateController, retry: Optional[RetryPolicy] = None) -> _RateControlScope:
+    """
+    Назначает контроллер (и политику повторов) на время сканирования:
+    запросы в этой области и в созданных внутри неё задачах идут через них.
+    """
+    return _RateControlScope(controller, retry)
+
+
+@contextmanager
+def request_limit(limit: int) -> Iterator[asyncio.Semaphore]:
+    """
+    Ограничивает число одновременных запросов во всех сканированиях, запущенных
+    в этой области (в том числе со своими контроллерами темпа): каждая попытка
+    perform_request занимает место в общем семафоре на время запроса.
+    """
+    semaphore = asyncio.Semaphore(limit)
+    token = _current_limit.set(semaphore)
+    try:
+        yield semaphore
+    finally:
+        _current_limit.reset(token)
+
+
+def client_timeout() -> ClientTimeout:
+    """Таймауты соединения и чтения для сессий сканирования (см. config.REQUEST_TIMEOUT)."""
+    return ClientTimeout(**REQUEST_TIMEOUT)
+
+
+async def perform_request(
+    session: ClientSession,
+    method: str,
+    url: str,
+    params: Optional[dict] = None,
+    data: Optional[dict] = None,
+    markers: Sequence[str] = ()
+) -> Optional[dict]:
+    """
+    HTTP-запрос под контролем темпа хоста с повторами.
+
+    Повторяются сетевые ошибки, таймауты и ответы RETRY_STATUSES (с учётом Retry-After);
+    число попыток ограничено RetryPolicy. Возвращает {'status_code', 'headers', 'text', 'truncated'}
+    последнего ответа или None, если ответа так и не было. Некорректный или не-HTTP URL
+    (javascript: в action, mailto: в ссылке) сразу даёт None: без повторов и без учёта в темпе хоста.
+    Тело читается потоково и с ограничением размера; с markers чтение
+    заканчивается, как только найдены все маркеры (см. engine.bodyreader.read_body).
+    """
+    try:
+        host = urlparse(url).netloc
+    except ValueError as e:
+        # например, незакрытая скобка IPv6-адреса
+        logger.debug(f"{method} {url}: {e!r}")
+        return None
+    controller = get_controller()
+    retry = get_retry_policy()
+    metrics = get_metrics()
+    limit = _current_limit.get()
+    for attempt in range(retry.attempts):
+        last = attempt + 1 >= retry.attempts
+        # сначала слот хоста, потом общий предел: ожидание своего хоста не держит место других
+        async with controller.slot(host), limit if limit is not None else nullcontext():
+            started = time.monotonic()
+            try:
+                # async with возвращает соединение в пул сразу после чтения тела
+                async with session.request(method, url, params=params, data=data) as resp:
+                    body = await read_body(resp, markers)
+            except (InvalidURL, NonHttpUrlClientError) as e:
+                # запрос не уходил в сеть: хосту это не ошибка, повтор ничего не изменит
+                logger.debug(f"{method} {url}: {e!r}")
+                return None
+            except (ClientError, asyncio.TimeoutError) as e:
+                latency = time.monotonic() - started
+                controller.record(host, None, latency, error=True)
+                metrics.record_request(host, None, latency)
+                if last:
+                    logger.debug(f"{method} {url}: {e!r}")
+                    return None
+                error = True
+            else:
+                error = False
+                latency = time.monotonic() - started
+                retry_after = parse_retry_after(resp.headers.get('Retry-After'))
+                controller.record(host, resp.status, latency, retry_after)
+                metrics.record_request(host, resp.status, latency, body['size'])
+                if last or resp.status not in RETRY_STATUSES:
+                    return {'status_code': resp.status, 'headers': resp.headers,
+                            'text': body['text'], 'truncated': body['truncated']}
+        metrics.record_retry(host)
+        await asyncio.sleep(retry.delay(attempt, None if error else retry_after))
+    return None
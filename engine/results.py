@@ -0,0 +1,152 @@
+import json
+from array import array
+from collections.abc import Sequence
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from engine.sinks import ResultSink
+
+# Код исхода попытки
+OUTCOME_MISS = 0
+OUTCOME_HIT = 1
+
+
+class _Interned:
+    """Таблица уникальных значений: значение -> номер и обратно."""
+
+    __slots__ = ('values', '_ids')
+
+    def __init__(self, first: Tuple = ()):
+        self.values: List = list(first)
+        self._ids: Dict = {v: i for i, v in enumerate(self.values)}
+
+    def intern(self, value) -> int:
+        idx = self._ids.get(value)
+        if idx is None:
+            idx = self._ids[value] = len(self.values)
+            self.values.append(value)
+        return idx
+
+
+class ResultStore(ResultSink, Sequence):
+    """
+    Компактное хранилище результатов сканирования.
+
+    Эндпоинты (страница, тип, URL, метод, параметры) хранятся один раз
+    в таблице, payload'ы и имена WAF — тоже; каждая попытка — строка
+    из четырёх чисел в массивах array. Снаружи хранилище выглядит
+    как последовательность словарей прежнего формата (9 ключей).
+    """
+
+    def __init__(self):
+        # (url, endpoint_type, endpoint_url, endpoint_method, endpoint_params)
+        self._endpoints = _Interned()
+        self._payloads = _Interned()
+        # WAF с номером 0 — «не обнаружен»
+        self._wafs = _Interned((None,))
+        self._row_endpoint = array('I')
+        self._row_payload = array('I')
+        self._row_waf = array('H')
+        self._row_outcome = array('B')
+        # эндпоинт -> все страницы, где он встречается (если их больше одной)
+        self._endpoint_pages: Dict[int, List[str]] = {}
+
+    def endpoint_id(self, url: str, endpoint: dict) -> int:
+        """
+        Номер эндпоинта в таблице; вызывается один раз на эндпоинт,
+        а не на каждый payload.
+        """
+        params = endpoint.get('params') or {endpoint.get('param'): endpoint.get('value')}
+        return self._endpoints.intern((
+            url,
+            endpoint.get('type'),
+            endpoint.get('url'),
+            endpoint.get('method', 'GET'),
+            json.dumps(params),
+        ))
+
+    def link_pages(self, endpoint_id: int, pages: List[str]) -> None:
+        """Привязывает эндпоинт (проверенный один раз) ко всем страницам, где он есть."""
+        if len(pages) > 1:
+            self._endpoint_pages[endpoint_id] = pages
+
+    def pages(self, index: int) -> List[str]:
+        """Страницы, к которым относится строка результата."""
+        endpoint_id = self._row_endpoint[index]
+        return self._endpoint_pages.get(endpoint_id) or [self._endpoints.values[endpoint_id][0]]
+
+    def vuln_type(self, endpoint_id: int) -> str:
+        return 'stored' if self._endpoints.values[endpoint_id][1] == 'form' else 'reflected'
+
+    def make_record(self, endpoint_id: int, payload: str, success: bool, waf: Optional[str]) -> dict:
+        """Запись в формате словаря без сохранения строки."""
+        url, et, endpoint_url, method, params = self._endpoints.values[endpoint_id]
+        return {
+            'url': url,
+            'endpoint_type': et,
+            'endpoint_url': endpoint_url,
+            'endpoint_method': method,
+            'endpoint_params': params,
+            'payload': payload,
+            'success': success,
+            'waf': waf,
+            'vuln_type': self.vuln_type(endpoint_id)
+        }
+
+    def add(self, endpoint_id: int, payload: str, success: bool, waf: Optional[str]) -> int:
+        """Сохраняет попытку и возвращает номер строки."""
+        self._row_endpoint.append(endpoint_id)
+        self._row_payload.append(self._payloads.intern(payload))
+        self._row_waf.append(self._wafs.intern(waf))
+        self._row_outcome.append(OUTCOME_HIT if success else OUTCOME_MISS)
+        return len(self._row_outcome) - 1
+
+    def write(self, record: dict) -> None:
+        """Приём записи-словаря (интерфейс ResultSink)."""
+        endpoint_id = self._endpoints.intern((
+            record['url'], record['endpoint_type'], record['endpoint_url'],
+            record['endpoint_method'], record['endpoint_params'],
+        ))
+        self.add(endpoint_id, record['payload'], record['success'], record['waf'])
+
+    def __len__(self) -> int:
+        return len(self._row_outcome)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        return self.make_record(
+            self._row_endpoint[index],
+            self._payloads.values[self._row_payload[index]],
+            self._row_outcome[index] == OUTCOME_HIT,
+            self._wafs.values[self._row_waf[index]],
+        )
+
+    def __iter__(self) -> Iterator[dict]:
+        for i in range(len(self)):
+            yield self[i]
+
+    def successes(self) -> Iterator[dict]:
+        for i, outcome in enumerate(self._row_outcome):
+            if outcome == OUTCOME_HIT:
+                yield self[i]
+
+    def to_dicts(self, include_pages: bool = False) -> List[dict]:
+        """
+        Все записи списком словарей (для json.dump и прежнего кода).
+        include_pages добавляет ключ 'pages' — все страницы с этим эндпоинтом.
+        """
+        if not include_pages:
+            return list(self)
+        return [dict(self[i], pages=self.pages(i)) for i in range(len(self))]
+
+    def stats(self) -> dict:
+        return {
+            'rows': len(self),
+            'endpoints': len(self._endpoints.values),
+            'payloads': len(self._payloads.values),
+            'hits': self._row_outcome.count(OUTCOME_HIT),
+        }
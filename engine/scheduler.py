@@ -0,0 +1,126 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Маркер пропущенной/упавшей единицы работы: в результаты не попадает
+_SKIPPED = object()
+
+
+class WorkScheduler:
+    """
+    Планировщик единиц работы сканирования (страница × эндпоинт × payload).
+
+    - Общий лимит одновременно выполняемых задач (concurrency).
+    - Лимит на один хост (per_host).
+    - Ограниченная очередь ожидающих задач: submit() ждёт, пока не освободится место.
+    - Результаты отдаются в порядке постановки (детерминированно),
+      даже если задачи завершились в другом порядке.
+    - cancel() отменяет всё, что ещё не завершилось.
+    """
+
+    def __init__(
+        self,
+        concurrency: int = 5,
+        per_host: int = 2,
+        max_pending: Optional[int] = None,
+        on_result: Optional[Callable[[Any], None]] = None
+    ):
+        self._global = asyncio.Semaphore(concurrency)
+        self._per_host = per_host
+        self._hosts: Dict[str, asyncio.Semaphore] = {}
+        self._slots = asyncio.Semaphore(max_pending or concurrency * 4)
+        self._tasks: Set[asyncio.Task] = set()
+        self._on_result = on_result
+        self._results: List[Any] = []
+        self._done: Dict[int, Any] = {}
+        self._next_seq = 0
+        self._next_emit = 0
+        self._cancelled = False
+
+    def _host_semaphore(self, host: str) -> asyncio.Semaphore:
+        sem = self._hosts.get(host)
+        if sem is None:
+            sem = self._hosts[host] = asyncio.Semaphore(self._per_host)
+        return sem
+
+    @asynccontextmanager
+    async def limit(self, host: str) -> AsyncIterator[None]:
+        """
+        Занимает слот хоста и общий слот на время вспомогательного запроса
+        (например, пробы), не ставя его в очередь результатов.
+        """
+        async with self._host_semaphore(host):
+            async with self._global:
+                yield
+
+    async def submit(self, host: str, factory: Callable[[], Awaitable[Any]]) -> int:
+        """
+        Ставит единицу работы в очередь и возвращает её порядковый номер.
+
+        factory вызывается только когда задача получила слоты хоста и общий слот,
+        поэтому корутины не создаются заранее для всей очереди.
+        """
+        if self._cancelled:
+            raise asyncio.CancelledError()
+        await self._slots.acquire()
+        seq = self._next_seq
+        self._next_seq += 1
+        task = asyncio.create_task(self._run(seq, host, factory))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return seq
+
+    async def _run(self, seq: int, host: str, factory: Callable[[], Awaitable[Any]]) -> None:
+        result: Any = _SKIPPED
+        try:
+            # сначала слот хоста, затем общий, чтобы ожидающие одного хоста не занимали общие слоты
+            async with self._host_semaphore(host):
+                async with self._global:
+                    result = await factory()
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            logger.error(f"Ошибка в задаче #{seq} ({host}): {e}")
+        finally:
+            self._slots.release()
+            self._complete(seq, result)
+
+    def _complete(self, seq: int, result: Any) -> None:
+        self._done[seq] = result
+        # выдаём непрерывный префикс завершённых задач по порядку
+        while self._next_emit in self._done:
+            res = self._done.pop(self._next_emit)
+            self._next_emit += 1
+            if res is _SKIPPED or res is None:
+                continue
+            if self._on_result is not None:
+                self._on_result(res)
+            else:
+                self._results.append(res)
+
+    async def join(self) -> List[Any]:
+        """
+        Ждёт завершения всех поставленных задач.
+
+        Возвращает результаты в порядке постановки (если не задан on_result).
+        """
+        while self._tasks:
+            await asyncio.gather(*list(self._tasks), return_exceptions=True)
+        return self._results
+
+    def cancel(self) -> None:
+        """Отменяет все незавершённые задачи и запрещает постановку новых."""
+        self._cancelled = True
+        for task in list(self._tasks):
+            task.cancel()
+
+    async def __aenter__(self) -> 'WorkScheduler':
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        if exc_type is not None:
+            self.cancel()
+        await self.join()
@@ -0,0 +1,93 @@
+import logging
+import os
+import pickle
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Optional
+
+from aiohttp import ClientSession, CookieJar, TCPConnector
+
+from engine.config import CONNECTION_POOL
+from engine.ratecontrol import client_timeout
+
+logger = logging.getLogger(__name__)
+
+
+def create_connector(per_host: Optional[int] = None, limit: Optional[int] = None) -> TCPConnector:
+    """
+    Пул соединений сканирования (настройки — config.CONNECTION_POOL):
+    общий лимит и лимит на хост, кэш DNS, keep-alive простаивающих соединений.
+    per_host переопределяет limit_per_host (не меньше верхней границы темпа хоста),
+    limit — общий лимит соединений (глобальный предел пакетного сканирования).
+    """
+    options = dict(CONNECTION_POOL)
+    if per_host:
+        options['limit_per_host'] = per_host
+    if limit:
+        options['limit'] = limit
+    return TCPConnector(
+        limit=options['limit'],
+        limit_per_host=options['limit_per_host'],
+        ttl_dns_cache=options['ttl_dns_cache'],
+        keepalive_timeout=options['keepalive_timeout'],
+        enable_cleanup_closed=True,
+    )
+
+
+def create_session(per_host: Optional[int] = None, cookie_jar: Optional[CookieJar] = None,
+                   limit: Optional[int] = None) -> ClientSession:
+    """
+    Сессия сканирования: настроенный пул, таймауты (см. engine.ratecontrol)
+    и сжатие ответов (Accept-Encoding выставляет aiohttp, тело распаковывается само).
+    """
+    return ClientSession(
+        connector=create_connector(per_host, limit),
+        timeout=client_timeout(),
+        cookie_jar=cookie_jar if cookie_jar is not None else CookieJar(unsafe=True),
+        auto_decompress=True,
+    )
+
+
+def load_cookie_jar(path: Optional[str]) -> CookieJar:
+    """
+    Cookie jar из файла (формат CookieJar.save); нет файла — пустой jar.
+    unsafe=True: cookies принимаются и от хостов-IP (локальные стенды).
+    """
+    jar = CookieJar(unsafe=True)
+    if path and os.path.isfile(path):
+        try:
+            jar.load(path)
+        except (OSError, EOFError, ValueError, TypeError, AttributeError, pickle.UnpicklingError) as e:
+            # повреждённый или чужой файл — начинаем с пустого jar
+            logger.error(f"Не удалось загрузить cookies из {path}: {e}")
+    return jar
+
+
+@asynccontextmanager
+async def scan_session(per_host: Optional[int] = None, cookie_file: Optional[str] = None,
+                       limit: Optional[int] = None) -> AsyncIterator[ClientSession]:
+    """
+    Одна сессия на всё сканирование: краулер, пробы, проверки payloads
+    и blind-инъекции переиспользуют соединения и результаты DNS.
+    С cookie_file cookies загружаются перед сканированием и сохраняются после.
+    """
+    jar = load_cookie_jar(cookie_file)
+    async with create_session(per_host, jar, limit) as session:
+        try:
+            yield session
+        finally:
+            if cookie_file:
+                try:
+                    jar.save(cookie_file)
+                except OSError as e:
+                    logger.error(f"Не удалось сохранить cookies в {cookie_file}: {e}")
+
+
+@asynccontextmanager
+async def borrow_session(session: Optional[ClientSession] = None,
+                         per_host: Optional[int] = None) -> AsyncIterator[ClientSession]:
+    """Переданная сессия (закрывает её владелец) или собственная на время блока."""
+    if session is not None:
+        yield session
+        return
+    async with scan_session(per_host) as own_session:
+        yield own_session
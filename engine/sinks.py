@@ -0,0 +1,131 @@
+import abc
+import csv
+import json
+import logging
+import time
+from typing import List, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Поля записи результата в порядке вывода (см. full_scan/single_scan)
+RECORD_FIELDS = (
+    'url', 'endpoint_type', 'endpoint_url', 'endpoint_method', 'endpoint_params',
+    'payload', 'success', 'waf', 'vuln_type',
+)
+
+
+class ResultSink(abc.ABC):
+    """
+    Приёмник результатов: сканирование пишет в него записи по мере получения.
+
+    Используется как контекстный менеджер; close() сбрасывает буфер.
+    """
+
+    @abc.abstractmethod
+    def write(self, record: dict) -> None:
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.flush()
+
+    def __enter__(self) -> 'ResultSink':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
+
+class _BufferedFileSink(ResultSink):
+    """
+    Общая часть файловых приёмников: строки копятся в буфере и сбрасываются
+    на диск каждые buffer_size записей или flush_interval секунд,
+    так что файл можно читать, пока сканирование ещё идёт.
+    """
+
+    def __init__(self, path: str, buffer_size: int = 100, flush_interval: float = 5.0, append: bool = False):
+        self.path = path
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.count = 0
+        self._buffer: List[dict] = []
+        self._last_flush = time.monotonic()
+        # append — дописывание при возобновлении прерванного сканирования
+        self._file = open(path, 'a' if append else 'w', newline='', encoding='utf-8')
+
+    @abc.abstractmethod
+    def _write_rows(self, rows: List[dict]) -> None:
+        raise NotImplementedError
+
+    def write(self, record: dict) -> None:
+        self._buffer.append(record)
+        self.count += 1
+        if len(self._buffer) >= self.buffer_size or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self) -> None:
+        if self._file is None:
+            return
+        if self._buffer:
+            self._write_rows(self._buffer)
+            self._buffer = []
+        self._file.flush()
+        self._last_flush = time.monotonic()
+
+    def close(self) -> None:
+        if self._file is None:
+            return
+        self.flush()
+        self._file.close()
+        self._file = None
+        logger.info(f"Записано результатов: {self.count} -> {self.path}")
+
+
+class JsonlSink(_BufferedFileSink):
+    """Одна JSON-запись на строку."""
+
+    def _write_rows(self, rows: List[dict]) -> None:
+        self._file.write(''.join(json.dumps(row, ensure_ascii=False) + '\n' for row in rows))
+
+
+class CsvSink(_BufferedFileSink):
+    """CSV с фиксированным заголовком RECORD_FIELDS."""
+
+    def __init__(self, path: str, fieldnames: Sequence[str] = RECORD_FIELDS, **kwargs):
+        super().__init__(path, **kwargs)
+        self._writer = csv.DictWriter(self._file, fieldnames=list(fieldnames), extrasaction='ignore')
+        if self._file.tell() == 0:
+            self._writer.writeheader()
+
+    def _write_rows(self, rows: List[dict]) -> None:
+        self._writer.writerows(rows)
+
+
+class SuccessOnlySink(ResultSink):
+    """Пропускает во вложенный приёмник только успешные находки."""
+
+    def __init__(self, inner: ResultSink):
+        self.inner = inner
+
+    def write(self, record: dict) -> None:
+        if record.get('success'):
+            self.inner.write(record)
+
+    def flush(self) -> None:
+        self.inner.flush()
+
+    def close(self) -> None:
+        self.inner.close()
+
+
+def open_sink(fmt: str, path: str, only_success: bool = False, **kwargs) -> ResultSink:
+    """Создаёт файловый приёмник по формату ('json'/'jsonl' или 'csv')."""
+    if fmt in ('json', 'jsonl'):
+        sink: ResultSink = JsonlSink(path, **kwargs)
+    elif fmt == 'csv':
+        sink = CsvSink(path, **kwargs)
+    else:
+        raise ValueError(f"Неизвестный формат результатов: {fmt}")
+    return SuccessOnlySink(sink) if only_success else sink
@@ -0,0 +1,138 @@
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+from typing import Callable, Dict, Iterable, List, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+# Состояния страницы во фронтире
+PAGE_PENDING = 0
+PAGE_DONE = 1
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS pages (url TEXT PRIMARY KEY, depth INTEGER NOT NULL, status INTEGER NOT NULL DEFAULT 0);
+CREATE TABLE IF NOT EXISTS units (key BLOB PRIMARY KEY);
+"""
+
+
+def unit_key(*parts) -> bytes:
+    """Компактный ключ единицы работы (страница, эндпоинт, payload) — 16 байт BLAKE2."""
+    raw = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.blake2b(raw.encode('utf-8'), digest_size=16).digest()
+
+
+class ScanState:
+    """
+    Состояние сканирования в SQLite для возобновления после перезапуска.
+
+    Хранит фронтир краулера (все найденные URL с глубиной), отметки о полностью
+    просканированных страницах и ключи выполненных единиц работы.
+    Записи копятся в транзакции и фиксируются каждые commit_every изменений
+    или commit_interval секунд, а также при close().
+
+    before_commit вызывается перед каждой фиксацией: сканирование сбрасывает в нём
+    приёмник результатов, чтобы единица работы не оказалась отмеченной выполненной
+    раньше, чем её запись попала в файл (иначе после аварийной остановки находка
+    потеряется, а возобновление её пропустит).
+    """
+
+    def __init__(self, path: str, start_url: str, commit_every: int = 200, commit_interval: float = 2.0):
+        self.path = path
+        self.commit_every = commit_every
+        self.commit_interval = commit_interval
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        self._dirty = 0
+        self._last_commit = time.monotonic()
+        self.before_commit: Optional[Callable[[], None]] = None
+
+        row = self._db.execute("SELECT value FROM meta WHERE key = 'start_url'").fetchone()
+        if row is None:
+            self._db.execute("INSERT INTO meta (key, value) VALUES ('start_url', ?)", (start_url,))
+            self._db.commit()
+        elif row[0] != start_url:
+            self._db.close()
+            raise ValueError(f"Файл состояния {path} относится к другому сканированию: {row[0]}")
+
+        # выполненные единицы держим в памяти: проверка идёт на каждый payload
+        self._units: Set[bytes] = {key for (key,) in self._db.execute("SELECT key FROM units")}
+        self.resumed = bool(self._units) or self.has_pages()
+        if self.resumed:
+            logger.info(f"Возобновление из {path}: страниц {self.count_pages()}, единиц работы {len(self._units)}")
+
+    def _touch(self, changes: int = 1) -> None:
+        self._dirty += changes
+        if self._dirty >= self.commit_every or time.monotonic() - self._last_commit >= self.commit_interval:
+            self.commit()
+
+    def commit(self) -> None:
+        if self._db is None:
+            return
+        if self.before_commit is not None:
+            self.before_commit()
+        self._db.commit()
+        self._dirty = 0
+        self._last_commit = time.monotonic()
+
+    def close(self) -> None:
+        if self._db is None:
+            return
+        self.commit()
+        self._db.close()
+        self._db = None
+
+    # --- фронтир краулера ---
+
+    def has_pages(self) -> bool:
+        return self._db.execute("SELECT 1 FROM pages LIMIT 1").fetchone() is not None
+
+    def count_pages(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+
+    def add_pages(self, urls: Iterable[str], depth: int) -> None:
+        """Добавляет найденные URL во фронтир (уже известные не меняются)."""
+        cur = self._db.executemany(
+            "INSERT OR IGNORE INTO pages (url, depth, status) VALUES (?, ?, ?)",
+            ((url, depth, PAGE_PENDING) for url in urls)
+        )
+        self._touch(max(cur.rowcount, 0))
+
+    def seen_pages(self) -> Set[str]:
+        return {url for (url,) in self._db.execute("SELECT url FROM pages")}
+
+    def pending_pages(self) -> Dict[int, List[str]]:
+        """Непросканированные страницы по глубине, в порядке добавления."""
+        levels: Dict[int, List[str]] = {}
+        for url, depth in self._db.execute(
+            "SELECT url, depth FROM pages WHERE status = ? ORDER BY rowid", (PAGE_PENDING,)
+        ):
+            levels.setdefault(depth, []).append(url)
+        return levels
+
+    def mark_page_done(self, url: str) -> None:
+        self._db.execute("UPDATE pages SET status = ? WHERE url = ?", (PAGE_DONE, url))
+        self._touch()
+
+    # --- единицы работы ---
+
+    def unit_done(self, key: bytes) -> bool:
+        return key in self._units
+
+    def mark_unit_done(self, key: bytes) -> None:
+        if key in self._units:
+            return
+        self._units.add(key)
+        self._db.execute("INSERT OR IGNORE INTO units (key) VALUES (?)", (key,))
+        self._touch()
+
+    def __enter__(self) -> 'ScanState':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        self.close()
+
@@ -0,0 +1,84 @@
+from collections import defaultdict
+from typing import Dict, Hashable, Iterable, List, Optional, Sequence
+
+
+class ConfirmationPolicy:
+    """
+    Когда прекращать проверку эндпоинта.
+
+    max_hits — сколько успешных payloads нужно на каждый параметр;
+    None или 0 — проверять весь список (прежнее поведение).
+    """
+
+    def __init__(self, max_hits: Optional[int] = None):
+        self.max_hits = max_hits or 0
+        self._hits: Dict[Hashable, Dict[str, int]] = defaultdict(dict)
+        self._targets: Dict[Hashable, Sequence[str]] = {}
+        self.saved = 0
+
+    def expect(self, endpoint_key: Hashable, params: Sequence[str]) -> None:
+        """
+        Параметры эндпоинта, которые нужно подтвердить (обычно — отразившиеся в пробе):
+        параметр, который не отражается, не должен держать проверку эндпоинта до конца списка.
+        """
+        self._targets[endpoint_key] = tuple(params)
+
+    def record(self, endpoint_key: Hashable, params: Iterable[str]) -> None:
+        """Учитывает успешный payload для перечисленных параметров эндпоинта."""
+        hits = self._hits[endpoint_key]
+        for name in params:
+            hits[name] = hits.get(name, 0) + 1
+
+    def satisfied(self, endpoint_key: Hashable, params: Sequence[str]) -> bool:
+        """
+        True, если каждый ожидаемый параметр эндпоинта (см. expect(),
+        по умолчанию — params) уже подтверждён max_hits раз.
+        """
+        if not self.max_hits:
+            return False
+        hits = self._hits.get(endpoint_key)
+        if not hits:
+            return False
+        targets = self._targets.get(endpoint_key, params)
+        return all(hits.get(name, 0) >= self.max_hits for name in targets)
+
+    def skip(self, endpoint_key: Hashable, params: Sequence[str]) -> bool:
+        """satisfied() со счётчиком сэкономленных проверок."""
+        if self.satisfied(endpoint_key, params):
+            self.saved += 1
+            return True
+        return False
+
+
+class PayloadRanker:
+    """
+    Адаптивный порядок payloads по хосту.
+
+    Payloads, уже сработавшие на хосте, идут первыми; заблокированные
+    (WAF, 403/406/429) — последними; остальные сохраняют исходный порядок.
+    """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._successes: Dict[str, Dict[str, int]] = defaultdict(dict)
+        self._blocks: Dict[str, Dict[str, int]] = defaultdict(dict)
+
+    def record(self, host: str, payload: str, success: bool, blocked: bool = False) -> None:
+        if success:
+            stats = self._successes[host]
+            stats[payload] = stats.get(payload, 0) + 1
+        elif blocked:
+            stats = self._blocks[host]
+            stats[payload] = stats.get(payload, 0) + 1
+
+    def order(self, host: str, payloads: Sequence[str]) -> List[str]:
+        if not self.enabled:
+            return list(payloads)
+        successes = self._successes.get(host)
+        blocks = self._blocks.get(host)
+        if not successes and not blocks:
+            return list(payloads)
+        successes = successes or {}
+        blocks = blocks or {}
+        # sorted устойчива: при равных счётчиках сохраняется порядок каталога
+        return sorted(payloads, key=lambda p: (-successes.get(p, 0), blocks.get(p, 0)))
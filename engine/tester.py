@@ -1,9 +1,144 @@
+import hashlib
 import os
+import secrets
+from typing import Dict, List, Optional, Sequence, Tuple
 from urllib.parse import urljoin, urlparse, urlencode, parse_qsl, urlunparse
 from aiohttp import ClientSession
-from engine.obfuscator import obfuscate
-from engine.encoder import encode_payload
-from engine.dom_scanner import find_dom_xss, report_dom_findings
+from engine.catalogue import get_catalogue
+from engine.dom_scanner import ScriptAnalysisCache, find_dom_xss, report_dom_findings
+from engine.httpcache import ResponseCache, request_fingerprint
+from engine.ratecontrol import perform_request
+
+def build_request(base_url: str, endpoint: dict, payload) -> Optional[Tuple[str, str, Optional[dict]]]:
+    """
+    Строит запрос для эндпоинта: (method, url, data) или None для неизвестного типа.
+
+    payload — строка (подставляется во все параметры эндпоинта)
+    либо словарь name->значение (значения для отдельных параметров).
+    Для GET data передаётся как query-параметры, для остальных методов — как тело формы.
+    """
+    def value(name: str, default: str) -> str:
+        if isinstance(payload, dict):
+            return payload.get(name, default)
+        return payload
+
+    if endpoint.get('type') == 'link':
+        parsed = urlparse(endpoint['url'])
+        params = dict(parse_qsl(parsed.query, keep_blank_values=True))
+        params[endpoint['param']] = value(endpoint['param'], params.get(endpoint['param'], ''))
+        new_q = urlencode(params)
+        new_url = parsed._replace(query=new_q)
+        req_url = urlunparse(new_url)
+        if not req_url.startswith(('http', 'file')):
+            req_url = urljoin(base_url, req_url)
+        return 'GET', req_url, None
+    if endpoint.get('type') == 'form':
+        action = endpoint.get('url', '')
+        req_url = action if action.startswith(('http','file')) else urljoin(base_url, action)
+        method = endpoint.get('method','GET').upper()
+        form = {k: value(k, v) for k, v in endpoint.get('params', {}).items()}
+        return method, req_url, form
+    if endpoint.get('type') == 'url':
+        # query-параметры самой страницы (fallback, когда эндпоинтов в HTML нет)
+        params = {k: value(k, v) for k, v in endpoint.get('params', {}).items()}
+        return 'GET', endpoint['url'], params
+    return None
+
+
+async def send_request(
+    session: ClientSession,
+    method: str,
+    req_url: str,
+    data: Optional[dict] = None,
+    cache: Optional[ResponseCache] = None,
+    markers: Sequence[str] = ()
+) -> Optional[dict]:
+    """
+    Выполняет запрос (или читает file://) и возвращает словарь
+    {'status_code', 'headers', 'text'} либо None при ошибке.
+
+    С cache одинаковые запросы (по нормализованному отпечатку) выполняются один раз.
+    markers — строки, ради которых читается ответ: когда все они найдены,
+    остаток тела не загружается. Маркеры определяются данными запроса,
+    поэтому ответ из кэша для того же отпечатка их тоже содержит.
+    """
+    if cache is not None:
+        return await cache.get_or_load(
+            request_fingerprint(method, req_url, data),
+            lambda: send_request(session, method, req_url, data, markers=markers)
+        )
+
+    if req_url.startswith('file://'):
+        path = req_url[len('file://'):].lstrip('/\\')
+        if not os.path.isfile(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+                return {'status_code': 200, 'headers': {}, 'text': f.read()}
+        except OSError:
+            return None
+
+    # темп хоста, таймауты и повторы — в perform_request; некорректный URL (javascript: в action) даёт None
+    return await perform_request(session, method, req_url, params=data if method == 'GET' else None,
+                                 data=data if method != 'GET' else None, markers=markers)
+
+
+# Статусы, которыми сервер отвергает слишком большой/необычный запрос:
+# пакет параметров в этом случае делится пополам и отправляется частями
+BATCH_REJECT_STATUSES = {400, 406, 413, 414, 422, 431}
+
+# Статусы, которыми WAF/фильтр обычно блокирует payload
+BLOCK_STATUSES = {403, 406, 429, 501}
+
+
+def make_marker(*key: str) -> str:
+    """
+    Безобидный маркер: только буквы и цифры, не меняется при кодировании.
+    Без key — случайный; с key — выводится из него, так что повтор того же
+    запроса (тот же эндпоинт и параметр) совпадает с ним и попадает в ResponseCache.
+    """
+    if not key:
+        return f"xsad{secrets.token_hex(4)}"
+    digest = hashlib.blake2b('\0'.join(key).encode('utf-8'), digest_size=4).hexdigest()
+    return f"xsad{digest}"
+
+
+def endpoint_params(endpoint: dict) -> List[str]:
+    """Имена параметров эндпоинта (один для link, все поля для form)."""
+    if endpoint.get('type') == 'link':
+        return [endpoint.get('param')]
+    return list(endpoint.get('params', {}))
+
+
+async def send_batch(
+    session: ClientSession,
+    base_url: str,
+    endpoint: dict,
+    values: Dict[str, str],
+    cache: Optional[ResponseCache] = None,
+    stop_on_match: bool = False
+) -> List[Tuple[Dict[str, str], Optional[dict]]]:
+    """
+    Отправляет значения сразу для нескольких параметров эндпоинта одним запросом.
+    stop_on_match — ответ дочитывается только до отражения всех значений
+    (пробе нужны все вхождения маркеров, поэтому там он выключен).
+
+    Если сервер отверг запрос (ошибка или статус из BATCH_REJECT_STATUSES),
+    пакет рекурсивно делится пополам. Возвращает список (отправленные значения, ответ).
+    """
+    request = build_request(base_url, endpoint, values)
+    if request is None:
+        return []
+    markers = tuple(values.values()) if stop_on_match else ()
+    response = await send_request(session, *request, cache=cache, markers=markers)
+    rejected = response is None or response['status_code'] in BATCH_REJECT_STATUSES
+    if rejected and len(values) > 1:
+        items = list(values.items())
+        mid = len(items) // 2
+        return (await send_batch(session, base_url, endpoint, dict(items[:mid]), cache, stop_on_match)
+                + await send_batch(session, base_url, endpoint, dict(items[mid:]), cache, stop_on_match))
+    return [(values, response)]
+
 
 async def test_payload(
     session: ClientSession,
@@ -11,66 +146,82 @@ async def test_payload(
     endpoint: dict,
     original: str,
     obfuscate_flag: bool,
-    encode_flag: bool
+    encode_flag: bool,
+    batch: bool = True,
+    cache: Optional[ResponseCache] = None,
+    dom_cache: Optional[ScriptAnalysisCache] = None
 ) -> tuple[bool, dict, str]:
+    """
+    Проверяет payload (и его варианты) на эндпоинте.
 
-    candidates = [original]
-    if obfuscate_flag:
-        for o in obfuscate(original):
-            if o not in candidates:
-                candidates.append(o)
-    if encode_flag:
-        for e in encode_payload(original):
-            if e not in candidates:
-                candidates.append(e)
+    При batch=True эндпоинт с несколькими параметрами получает в каждый параметр
+    свою помеченную копию payload одним запросом; отразившиеся параметры
+    возвращаются в response['reflected'].
+    cache — общий ResponseCache сканирования: повторы одного и того же запроса
+    (совпавшие варианты, одна ссылка на многих страницах, file://) не уходят в сеть.
+    dom_cache — общий ScriptAnalysisCache: одинаковые скрипты в ответах анализируются один раз.
+    Возвращает (успех, ответ, использованный payload).
+    При неудаче возвращается последний ответ-блокировка (BLOCK_STATUSES), а если блокировок
+    не было — последний полученный ответ: по нему определяется WAF. ответ['blocked']
+    показывает, что все полученные ответы на варианты были блокировками.
+    """
+    # варианты заранее построены в каталоге (с фиксированным зерном для random_case)
+    candidates = get_catalogue().variants(original, obfuscate_flag, encode_flag)
 
+    params = endpoint_params(endpoint)
+    batched = batch and len(params) > 1
+    request = build_request(base_url, endpoint, original)
+    local = request is not None and request[1].startswith('file://')
+
+    # метки параметров зависят только от эндпоинта и имени параметра
+    target = f"{request[0]} {request[1]}" if request is not None else ''
+    tags = {name: make_marker(target, name) for name in params} if batched else {}
+    answered = blocked = 0
+    last = last_blocked = None
     for payload in candidates:
-        method = 'GET'; data = None
-        if endpoint.get('type') == 'link':
-            parsed = urlparse(endpoint['url'])
-            params = dict(parse_qsl(parsed.query, keep_blank_values=True))
-            params[endpoint['param']] = payload
-            new_q = urlencode(params)
-            new_url = parsed._replace(query=new_q)
-            req_url = urlunparse(new_url)
-            if not req_url.startswith(('http', 'file')):
-                req_url = urljoin(base_url, req_url)
-        elif endpoint.get('type') == 'form':
-            action = endpoint.get('url', '')
-            req_url = action if action.startswith(('http','file')) else urljoin(base_url, action)
-            method = endpoint.get('method','GET').upper()
-            form = {k: payload for k in endpoint.get('params', {})}
-            data = form
+        if batched:
+            # отдельная метка на параметр, чтобы отнести отражение к конкретному полю
+            values = {name: tags[name] + payload for name in params}
+            sent = await send_batch(session, base_url, endpoint, values, cache, stop_on_match=True)
         else:
-            continue
-
-        if req_url.startswith('file://'):
-            path = req_url[len('file://'):].lstrip('/\\')
-            if os.path.isfile(path):
-                try:
-                    with open(path, 'r', encoding='utf-8', errors='ignore') as f:
-                        body = f.read()
-                except:
-                    continue
-                if payload in body:
-                    return True, {'text': body}, payload
-            continue
+            request = build_request(base_url, endpoint, payload)
+            if request is None:
+                continue
+            sent = [({}, await send_request(session, *request, cache=cache, markers=(payload,)))]
 
-        try:
-            if method == 'GET':
-                resp = await session.get(req_url, params=data)
-            else:
-                resp = await session.post(req_url, data=data)
-            text = await resp.text(errors='ignore')
-        except:
-            continue
-
-        if payload in text:
-            return True, {'headers': resp.headers, 'text': text}, payload
-
-        segments = find_dom_xss(text)
-        if segments:
-            report_dom_findings(text)
-            return True, {'headers': resp.headers, 'text': text}, payload
-
-    return False, {'headers': {}, 'text': ''}, original
\ No newline at end of file
+        for values, response in sent:
+            if response is None:
+                continue
+            answered += 1
+            last = response
+            if response['status_code'] in BLOCK_STATUSES:
+                blocked += 1
+                last_blocked = response
+            text = response['text']
+
+            if batched:
+                reflected = [name for name, value in values.items() if value in text]
+                if reflected:
+                    response['reflected'] = reflected
+                    return True, response, payload
+            elif payload in text:
+                return True, response, payload
+
+            # для локальных файлов DOM-анализ не выполняется, как и раньше
+            if not local:
+                if dom_cache is not None:
+                    # большие скрипты анализируются вне event loop (см. engine.executor)
+                    await dom_cache.warm(text)
+                segments = find_dom_xss(text, dom_cache)
+                if segments:
+                    report_dom_findings(text, dom_cache)
+                    return True, response, payload
+
+    shown = last_blocked or last or {'status_code': None, 'headers': {}, 'text': ''}
+    # новый словарь: сам ответ может лежать в общем кэше
+    return False, {
+        'status_code': shown['status_code'],
+        'headers': shown['headers'],
+        'text': shown['text'],
+        'blocked': bool(answered) and blocked == answered,
+    }, original
@@ -0,0 +1,89 @@
+import re
+from typing import Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+# Параметры отслеживания: на содержимое страницы не влияют
+TRACKING_PARAMS = {
+    'utm_source', 'utm_medium', 'utm_campaign', 'utm_term', 'utm_content', 'utm_id',
+    'gclid', 'dclid', 'fbclid', 'yclid', 'msclkid', '_ga', '_gl', 'mc_cid', 'mc_eid', '_openstat',
+}
+
+_DEFAULT_PORTS = {'http': '80', 'https': '443'}
+
+_INT_RE = re.compile(r'^\d+$')
+_HEX_RE = re.compile(r'^(?=.*\d)[0-9a-f]{8,}$|^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$', re.I)
+# слаг: не меньше трёх слов через '-' или '_' (заголовки статей, названия товаров)
+_SLUG_RE = re.compile(r'^[\w%]+(?:[-_][\w%]+){2,}$')
+
+
+def canonicalize_url(url: str) -> str:
+    """
+    Каноническая форма URL для дедупликации страниц:
+    схема и хост в нижнем регистре, без порта по умолчанию и фрагмента,
+    без параметров отслеживания, query-параметры отсортированы,
+    повторные '/' схлопнуты, завершающий '/' убран (кроме корня).
+    """
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    netloc = parts.netloc.lower()
+    host, sep, port = netloc.rpartition(':')
+    if sep and _DEFAULT_PORTS.get(scheme) == port:
+        netloc = host
+    path = re.sub(r'/{2,}', '/', parts.path) or '/'
+    if len(path) > 1 and path.endswith('/'):
+        path = path.rstrip('/') or '/'
+    query = [(k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True) if k.lower() not in TRACKING_PARAMS]
+    return urlunsplit((scheme, netloc, path, urlencode(sorted(query)), ''))
+
+
+def _template_segment(segment: str) -> str:
+    stem, dot, ext = segment.rpartition('.')
+    if not dot or not ext.isalnum() or len(ext) > 5:
+        stem, dot, ext = segment, '', ''
+    if _INT_RE.match(stem):
+        stem = '{int}'
+    elif _HEX_RE.match(stem):
+        stem = '{hex}'
+    elif _SLUG_RE.match(stem):
+        stem = '{slug}'
+    return f"{stem}{dot}{ext}"
+
+
+def url_pattern(url: str) -> str:
+    """
+    Шаблон «формы» URL: числовые, шестнадцатеричные и slug-сегменты пути
+    заменяются заполнителями, из query остаются только имена параметров.
+    /product/123 и /product/124?color=red -> host/product/{int} и host/product/{int}?color
+    """
+    parts = urlsplit(canonicalize_url(url))
+    path = '/'.join(_template_segment(seg) if seg else seg for seg in parts.path.split('/'))
+    names = sorted({k for k, _ in parse_qsl(parts.query, keep_blank_values=True)})
+    pattern = f"{parts.netloc}{path}"
+    return f"{pattern}?{'&'.join(names)}" if names else pattern
+
+
+class PatternSampler:
+    """
+    Ограничивает число страниц одного шаблона URL (см. url_pattern):
+    краулер загружает не больше sample_limit представителей каждой формы URL.
+    sample_limit None или 0 — без ограничения.
+    """
+
+    def __init__(self, sample_limit: Optional[int] = 3):
+        self.sample_limit = sample_limit or 0
+        self._counts: Dict[str, int] = {}
+        self.dropped = 0
+
+    def admit(self, url: str) -> bool:
+        if not self.sample_limit:
+            return True
+        pattern = url_pattern(url)
+        count = self._counts.get(pattern, 0)
+        if count >= self.sample_limit:
+            self.dropped += 1
+            return False
+        self._counts[pattern] = count + 1
+        return True
+
+    def stats(self) -> dict:
+        return {'patterns': len(self._counts), 'dropped': self.dropped}
@@ -1,58 +1,218 @@
 import json
+import logging
+import os
 import re
-import sys
-from typing import Any, Optional
+from typing import Any, Dict, List, Optional, Pattern, Set, Tuple
 
-# Загружаем сигнатуры
-try:
-    with open(sys.path[0] + '/db/wafSignatures.json', 'r', encoding='utf-8') as f:
-        WAF_SIGNATURES = json.load(f)
-except Exception:
-    WAF_SIGNATURES = {}
+from engine.executor import run_cpu
+from engine.metrics import get_metrics
 
+logger = logging.getLogger(__name__)
 
-def detect_waf(response: Any) -> Optional[str]:
+_SIGNATURES_FILE = os.path.join(os.path.dirname(__file__), '..', 'data', 'wafSignatures.json')
+
+# Вес совпадения по каждому полю сигнатуры
+_CODE_WEIGHT = 0.5
+_HEADER_WEIGHT = 1
+_PAGE_WEIGHT = 1
+
+
+def load_signatures(path: str = _SIGNATURES_FILE) -> Dict[str, dict]:
+    """
+    Загружает сигнатуры WAF из JSON.
+
+    Поддерживается как плоский словарь имя->сигнатура,
+    так и обёртка {"waf_signatures": {...}} из data/wafSignatures.json.
+    """
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError) as e:
+        logger.error(f"Не удалось загрузить сигнатуры WAF из {path}: {e}")
+        return {}
+    return data.get('waf_signatures', data)
+
+
+def _combine(patterns: List[Tuple[str, str]]) -> Tuple[Optional[Pattern], List[Tuple[str, Pattern]]]:
+    """
+    Компилирует список (имя группы, шаблон): общее выражение-альтернатива
+    для быстрой проверки и отдельные выражения каждой группы.
+    Некорректные шаблоны пропускаются. Если шаблоны, корректные по отдельности,
+    не складываются в одно выражение (например, флаг (?i) не в начале),
+    общее выражение не строится и поле проверяется каждым шаблоном.
+    """
+    compiled = []
+    for group, pattern in patterns:
+        try:
+            compiled.append((group, re.compile(pattern, re.I)))
+        except re.error as e:
+            logger.warning(f"Пропущен некорректный шаблон WAF {pattern!r}: {e}")
+    if not compiled:
+        return None, []
+    try:
+        prefilter = re.compile('|'.join(f"(?:{regex.pattern})" for _, regex in compiled), re.I)
+    except re.error as e:
+        logger.warning(f"Общее выражение сигнатур WAF не собрано, проверка по шаблонам: {e}")
+        prefilter = None
+    return prefilter, compiled
+
+
+class WafSignatureEngine:
+    """
+    Движок сигнатур WAF: шаблоны компилируются один раз. Для каждого поля
+    (код ответа, заголовки, тело) общее выражение-альтернатива быстро отсеивает
+    ответы без единого совпадения; если оно нашлось, поле проверяется каждой
+    сигнатурой отдельно — один и тот же текст засчитывается всем подходящим
+    сигнатурам, как при поочерёдной проверке.
+
+    Вердикт запоминается для хоста: найденный WAF — для всех ответов хоста,
+    отсутствие WAF — для ответов хоста с тем же кодом (блокировка обычно
+    приходит с другим кодом, и такой ответ будет проверен).
+    """
+
+    def __init__(self, signatures: Dict[str, dict]):
+        self.names: List[str] = list(signatures)
+        # имя группы -> (индекс сигнатуры, вес)
+        self._groups: Dict[str, Tuple[int, float]] = {}
+        code, headers, page = [], [], []
+        for idx, name in enumerate(self.names):
+            sig = signatures[name]
+            if sig.get('code'):
+                code.append(self._group(f"c{idx}", idx, _CODE_WEIGHT, sig['code']))
+            header_pattern = sig.get('headers')
+            if header_pattern:
+                if not isinstance(header_pattern, list):
+                    header_pattern = [header_pattern]
+                for n, pat in enumerate(header_pattern):
+                    headers.append(self._group(f"h{idx}_{n}", idx, _HEADER_WEIGHT, pat))
+            if sig.get('page'):
+                page.append(self._group(f"p{idx}", idx, _PAGE_WEIGHT, sig['page']))
+        self._code = _combine(code)
+        self._headers = _combine(headers)
+        self._page = _combine(page)
+        self._verdicts: Dict[str, str] = {}
+        # (хост, код ответа) без WAF
+        self._clean: Set[Tuple[str, str]] = set()
+
+    def _group(self, group: str, idx: int, weight: float, pattern: str) -> Tuple[str, str]:
+        self._groups[group] = (idx, weight)
+        return group, pattern
+
+    def _scan(self, field: Tuple[Optional[Pattern], List[Tuple[str, Pattern]]], text: str,
+              matched: Dict[str, float]) -> None:
+        prefilter, patterns = field
+        if not text or (prefilter is not None and not prefilter.search(text)):
+            return
+        for group, regex in patterns:
+            if regex.search(text):
+                matched[group] = self._groups[group][1]
+
+    def match(self, status_code: str, headers: str, body: str) -> Optional[str]:
+        """Возвращает имя WAF с наибольшим весом совпадений или None."""
+        matched: Dict[str, float] = {}
+        self._scan(self._code, status_code, matched)
+        self._scan(self._headers, headers, matched)
+        self._scan(self._page, body, matched)
+        if not matched:
+            return None
+        scores = [0.0] * len(self.names)
+        for group, weight in matched.items():
+            scores[self._groups[group][0]] += weight
+        # при равенстве побеждает сигнатура, стоящая раньше в файле
+        best = max(range(len(scores)), key=lambda i: (scores[i], -i))
+        return self.names[best] if scores[best] > 0 else None
+
+    def detect(self, response: Any, host: Optional[str] = None) -> Optional[str]:
+        """
+        Определяет WAF по ответу.
+
+        response может быть:
+          - aiohttp.ClientResponse (или объект с .status, .headers, .text)
+          - словарь {'status_code'/'status': ..., 'headers': ..., 'text': ...}
+        Если указан host и вердикт для него уже известен, возвращается сохранённый.
+        """
+        parts = _response_parts(response)
+        if self.known(host, parts[0]):
+            return self.verdict(host)
+        return self.remember(host, parts[0], self.match(*parts))
+
+    def verdict(self, host: Optional[str]) -> Optional[str]:
+        """Найденный для хоста WAF или None."""
+        return self._verdicts.get(host) if host else None
+
+    def known(self, host: Optional[str], status_code: str) -> bool:
+        """Есть ли уже вердикт для ответа хоста с таким кодом."""
+        return bool(host) and (host in self._verdicts or (host, status_code) in self._clean)
+
+    def remember(self, host: Optional[str], status_code: str, name: Optional[str]) -> Optional[str]:
+        """
+        Сохраняет вердикт match() для ответа хоста с кодом status_code
+        (для проверок вне движка, например в пуле процессов); возвращает name.
+        """
+        if host:
+            if name:
+                self._verdicts[host] = name
+            else:
+                self._clean.add((host, status_code))
+        return name
+
+    def verdicts(self) -> Dict[str, str]:
+        """Найденные WAF по хостам."""
+        return dict(self._verdicts)
+
+
+def _response_parts(response: Any) -> Tuple[str, str, str]:
+    """(код, заголовки, тело) ответа строками — компактные аргументы для match()."""
+    if isinstance(response, dict):
+        status_code = response.get('status_code', response.get('status', ''))
+        headers = response.get('headers', {})
+        body = response.get('text', '')
+    else:
+        status_code = getattr(response, 'status', '')
+        headers = getattr(response, 'headers', {})
+        body = getattr(response, 'text', '')
+    if not isinstance(body, str):
+        body = ''
+    if not isinstance(headers, str):
+        headers = '\n'.join(f"{k}: {v}" for k, v in headers.items())
+    return str(status_code or ''), headers, body
+
+
+# Загружаем сигнатуры один раз при импорте
+WAF_SIGNATURES = load_signatures()
+_ENGINE = WafSignatureEngine(WAF_SIGNATURES)
+
+
+def get_engine() -> WafSignatureEngine:
+    """Общий движок сигнатур процесса."""
+    return _ENGINE
+
+
+def detect_waf(response: Any, host: Optional[str] = None) -> Optional[str]:
     """
     Определяет WAF по сигнатурам.
 
     response может быть:
       - aiohttp.ClientResponse
       - словарь {'headers': ..., 'text': ...}
-    Возвращает имя WAF или None.
+    Возвращает имя WAF или None. С host вердикт кэшируется для хоста.
     """
-    # Извлечение кода, заголовков и тела
-    try:
-        status_code = str(response.status)
-        headers = {k.lower(): v for k, v in response.headers.items()}
-        body = response.text
-    except AttributeError:
-        # dict
-        status_code = str(response.get('status_code', ''))
-        headers = {k.lower(): v for k, v in response.get('headers', {}).items()}
-        body = response.get('text', '')
+    return _ENGINE.detect(response, host)
 
-    best_match = (0, None)
-    # Ищем совпадения
-    for name, sig in WAF_SIGNATURES.items():
-        score = 0
-        # код
-        code_pattern = sig.get('code')
-        if code_pattern and re.search(code_pattern, status_code):
-            score += 0.5
-        # заголовки
-        header_pattern = sig.get('headers')
-        if header_pattern:
-            if isinstance(header_pattern, list):
-                for pat in header_pattern:
-                    if re.search(pat, str(headers), re.I):
-                        score += 1
-            else:
-                if re.search(header_pattern, str(headers), re.I):
-                    score += 1
-        # тело
-        page_pattern = sig.get('page')
-        if page_pattern and re.search(page_pattern, body, re.I):
-            score += 1
-        if score > best_match[0]:
-            best_match = (score, name)
-    return best_match[1] if best_match[0] > 0 else None
\ No newline at end of file
+
+def _match(status_code: str, headers: str, body: str) -> Optional[str]:
+    # задача для пула процессов: в рабочем процессе свой экземпляр _ENGINE
+    return _ENGINE.match(status_code, headers, body)
+
+
+async def detect_waf_async(response: Any, host: Optional[str] = None) -> Optional[str]:
+    """
+    detect_waf(), при котором сопоставление большого тела ответа с сигнатурами
+    выполняется в пуле процессов (см. engine.executor), а не в event loop.
+    """
+    parts = _response_parts(response)
+    if _ENGINE.known(host, parts[0]):
+        return _ENGINE.verdict(host)
+    with get_metrics().stage('waf'):
+        name = await run_cpu(_match, *parts, size=len(parts[2]))
+    return _ENGINE.remember(host, parts[0], name)
@@ -0,0 +1,412 @@
+import abc
+import asyncio
+import hmac
+import ipaddress
+import json
+import logging
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Состояния задачи
+TASK_PENDING = 0
+TASK_LEASED = 1
+TASK_DONE = 2
+TASK_FAILED = 3
+
+_STATUS_NAMES = {TASK_PENDING: 'pending', TASK_LEASED: 'leased', TASK_DONE: 'done', TASK_FAILED: 'failed'}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS tasks (
+    id INTEGER PRIMARY KEY,
+    key TEXT UNIQUE NOT NULL,
+    kind TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status INTEGER NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_until REAL,
+    result TEXT,
+    error TEXT,
+    collected INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, lease_until);
+CREATE INDEX IF NOT EXISTS tasks_uncollected ON tasks (collected, status);
+"""
+
+
+class WorkQueue(abc.ABC):
+    """
+    Очередь задач распределённого сканирования (интерфейс).
+
+    Задача — (kind, payload) с уникальным ключом: повторная постановка той же
+    задачи игнорируется. Исполнитель берёт задачи в аренду (lease) на время
+    lease_seconds и продлевает её (renew), пока работает; задача с истёкшей
+    арендой (исполнитель пропал) снова выдаётся, пока не исчерпаны попытки.
+    Координатор забирает результаты выполненных задач через collect().
+    Все методы асинхронные: реализация может работать по сети.
+    """
+
+    @abc.abstractmethod
+    async def put(self, kind: str, key: str, payload: dict) -> bool:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def lease(self, worker: str, limit: int = 1, lease_seconds: float = 60.0) -> List[dict]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def renew(self, task_id: int, worker: str, lease_seconds: float = 60.0) -> bool:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def complete(self, task_id: int, worker: str, result: Any) -> bool:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def fail(self, task_id: int, worker: str, error: str) -> None:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def collect(self, limit: int = 100) -> List[dict]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def counts(self) -> Dict[str, int]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def set_meta(self, key: str, value: Any) -> None:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def get_meta(self, key: str) -> Any:
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        pass
+
+
+class SQLiteWorkQueue(WorkQueue):
+    """
+    Очередь в файле SQLite. Подходит для нескольких процессов на одной машине
+    (каждый открывает файл сам) и как хранилище QueueServer для сетевых исполнителей.
+    max_attempts — сколько раз выдаётся задача, прежде чем она считается проваленной.
+
+    Обращения к базе блокирующие (BEGIN IMMEDIATE ждёт блокировку файла до 30 с),
+    поэтому выполняются в отдельном потоке очереди, а не в event loop.
+    """
+
+    def __init__(self, path: str, max_attempts: int = 3):
+        self.path = path
+        self.max_attempts = max_attempts
+        # один поток: соединение SQLite используется только из него
+        self._thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix='workqueue')
+        self._db: Optional[sqlite3.Connection] = None
+        self._thread.submit(self._open).result()
+
+    def _open(self) -> None:
+        self._db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    async def _run(self, func: Callable[..., Any], *args: Any) -> Any:
+        return await asyncio.get_running_loop().run_in_executor(self._thread, func, *args)
+
+    def _reap(self, now: float) -> None:
+        """Задачи с истёкшей арендой: попытки кончились — провалены, иначе снова ждут исполнителя."""
+        self._db.execute(
+            "UPDATE tasks SET status = ?, error = 'lease expired' "
+            "WHERE status = ? AND lease_until < ? AND attempts >= ?",
+            (TASK_FAILED, TASK_LEASED, now, self.max_attempts)
+        )
+        self._db.execute(
+            "UPDATE tasks SET status = ?, worker = NULL, lease_until = NULL WHERE status = ? AND lease_until < ?",
+            (TASK_PENDING, TASK_LEASED, now)
+        )
+
+    def _put(self, kind: str, key: str, payload: dict) -> bool:
+        cur = self._db.execute(
+            "INSERT OR IGNORE INTO tasks (key, kind, payload) VALUES (?, ?, ?)",
+            (key, kind, json.dumps(payload, ensure_ascii=False))
+        )
+        return cur.rowcount > 0
+
+    def _lease(self, worker: str, limit: int, lease_seconds: float) -> List[dict]:
+        now = time.time()
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            self._reap(now)
+            rows = self._db.execute(
+                "SELECT id, kind, payload, attempts FROM tasks WHERE status = ? ORDER BY id LIMIT ?",
+                (TASK_PENDING, limit)
+            ).fetchall()
+            self._db.executemany(
+                "UPDATE tasks SET status = ?, worker = ?, lease_until = ?, attempts = attempts + 1 WHERE id = ?",
+                [(TASK_LEASED, worker, now + lease_seconds, row[0]) for row in rows]
+            )
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        return [
+            {'id': task_id, 'kind': kind, 'payload': json.loads(payload), 'attempt': attempts + 1}
+            for task_id, kind, payload, attempts in rows
+        ]
+
+    def _renew(self, task_id: int, worker: str, lease_seconds: float) -> bool:
+        cur = self._db.execute(
+            "UPDATE tasks SET lease_until = ? WHERE id = ? AND worker = ? AND status = ?",
+            (time.time() + lease_seconds, task_id, worker, TASK_LEASED)
+        )
+        return cur.rowcount > 0
+
+    def _complete(self, task_id: int, worker: str, result: Any) -> bool:
+        # принимается первый результат: опоздавший исполнитель (аренда уже передана
+        # другому, а тот успел закончить) ничего не перезаписывает
+        cur = self._db.execute(
+            "UPDATE tasks SET status = ?, result = ?, worker = ? WHERE id = ? AND status IN (?, ?)",
+            (TASK_DONE, json.dumps(result, ensure_ascii=False), worker, task_id, TASK_PENDING, TASK_LEASED)
+        )
+        return cur.rowcount > 0
+
+    def _fail(self, task_id: int, worker: str, error: str) -> None:
+        self._db.execute(
+            "UPDATE tasks SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, error = ?, lease_until = NULL "
+            "WHERE id = ? AND worker = ? AND status = ?",
+            (self.max_attempts, TASK_FAILED, TASK_PENDING, error, task_id, worker, TASK_LEASED)
+        )
+
+    def _collect(self, limit: int) -> List[dict]:
+        rows = self._db.execute(
+            "SELECT id, kind, payload, result FROM tasks WHERE collected = 0 AND status = ? ORDER BY id LIMIT ?",
+            (TASK_DONE, limit)
+        ).fetchall()
+        self._db.executemany("UPDATE tasks SET collected = 1 WHERE id = ?", [(row[0],) for row in rows])
+        return [
+            {'id': task_id, 'kind': kind, 'payload': json.loads(payload), 'result': json.loads(result)}
+            for task_id, kind, payload, result in rows
+        ]
+
+    def _counts(self) -> Dict[str, int]:
+        # аренды пропавших исполнителей истекают и здесь: иначе, если никто
+        # больше не вызывает lease(), задача навсегда осталась бы «в работе»
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            self._reap(time.time())
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+        counts = {name: 0 for name in _STATUS_NAMES.values()}
+        for status, count in self._db.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status"):
+            counts[_STATUS_NAMES[status]] = count
+        counts['uncollected'] = self._db.execute(
+            "SELECT COUNT(*) FROM tasks WHERE collected = 0 AND status = ?", (TASK_DONE,)
+        ).fetchone()[0]
+        return counts
+
+    def _set_meta(self, key: str, value: Any) -> None:
+        self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, json.dumps(value)))
+
+    def _get_meta(self, key: str) -> Any:
+        row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    async def put(self, kind: str, key: str, payload: dict) -> bool:
+        return await self._run(self._put, kind, key, payload)
+
+    async def lease(self, worker: str, limit: int = 1, lease_seconds: float = 60.0) -> List[dict]:
+        return await self._run(self._lease, worker, limit, lease_seconds)
+
+    async def renew(self, task_id: int, worker: str, lease_seconds: float = 60.0) -> bool:
+        return await self._run(self._renew, task_id, worker, lease_seconds)
+
+    async def complete(self, task_id: int, worker: str, result: Any) -> bool:
+        return await self._run(self._complete, task_id, worker, result)
+
+    async def fail(self, task_id: int, worker: str, error: str) -> None:
+        await self._run(self._fail, task_id, worker, error)
+
+    async def collect(self, limit: int = 100) -> List[dict]:
+        return await self._run(self._collect, limit)
+
+    async def counts(self) -> Dict[str, int]:
+        return await self._run(self._counts)
+
+    async def set_meta(self, key: str, value: Any) -> None:
+        await self._run(self._set_meta, key, value)
+
+    async def get_meta(self, key: str) -> Any:
+        return await self._run(self._get_meta, key)
+
+    def _close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    async def close(self) -> None:
+        if self._thread is not None:
+            await self._run(self._close)
+            self._thread.shutdown()
+            self._thread = None
+
+
+# Операции, доступные по сети
+_REMOTE_OPS = frozenset({'put', 'lease', 'renew', 'complete', 'fail', 'collect', 'counts', 'set_meta', 'get_meta'})
+
+
+def is_loopback(host: str) -> bool:
+    """Адрес доступен только с этого узла (localhost, 127.0.0.0/8, ::1)."""
+    if host == 'localhost':
+        return True
+    try:
+        return ipaddress.ip_address(host.strip('[]')).is_loopback
+    except ValueError:
+        # имя узла: неизвестно, на какие интерфейсы оно указывает
+        return False
+
+
+class QueueServer:
+    """
+    TCP-доступ к очереди для исполнителей на других узлах.
+
+    Протокол — JSON по строке на запрос и ответ:
+    {"op": "lease", "args": {...}, "token": "..."} -> {"ok": результат} или {"error": "..."}.
+    token — общий секрет (сравнивается без утечки по времени); без него сервер принимает всех,
+    поэтому по умолчанию он слушает только localhost, а на другом адресе без token
+    пишет предупреждение. Некорректный запрос получает {"error": ...}, соединение не рвётся.
+    """
+
+    def __init__(self, queue: WorkQueue, host: str = '127.0.0.1', port: int = 8898, token: Optional[str] = None):
+        self.queue = queue
+        self.host = host
+        self.port = port
+        self.token = token
+        self._server: Optional[asyncio.AbstractServer] = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while line := await reader.readline():
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError('request must be a JSON object')
+                    if self.token and not hmac.compare_digest(str(request.get('token', '')), self.token):
+                        raise PermissionError('bad token')
+                    op = request.get('op')
+                    if op not in _REMOTE_OPS:
+                        raise ValueError(f"unknown op {op!r}")
+                    args = request.get('args', {})
+                    if not isinstance(args, dict):
+                        raise ValueError('args must be a JSON object')
+                    response = {'ok': await getattr(self.queue, op)(**args)}
+                except (ValueError, TypeError, KeyError, PermissionError, sqlite3.Error) as e:
+                    response = {'error': f"{type(e).__name__}: {e}"}
+                writer.write(json.dumps(response, ensure_ascii=False).encode('utf-8') + b'\n')
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self) -> None:
+        if not self.token and not is_loopback(self.host):
+            logger.warning(f"Сервер очереди на {self.host} без token: задачи и результаты доступны любому в сети")
+        self._server = await asyncio.start_server(self._handle, self.host, self.port, limit=2 ** 24)
+        logger.info(f"Сервер очереди на {self.host}:{self.port}")
+
+    async def stop(self) -> None:
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def __aenter__(self) -> 'QueueServer':
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        await self.stop()
+
+
+class TCPWorkQueue(WorkQueue):
+    """Клиент QueueServer: та же очередь, но на другом узле."""
+
+    def __init__(self, host: str, port: int = 8898, token: Optional[str] = None):
+        self.host = host
+        self.port = port
+        self.token = token
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._lock = asyncio.Lock()
+
+    async def _call(self, op: str, **args) -> Any:
+        async with self._lock:
+            if self._writer is None:
+                self._reader, self._writer = await asyncio.open_connection(self.host, self.port, limit=2 ** 24)
+            request = {'op': op, 'args': args}
+            if self.token:
+                request['token'] = self.token
+            try:
+                self._writer.write(json.dumps(request, ensure_ascii=False).encode('utf-8') + b'\n')
+                await self._writer.drain()
+                line = await self._reader.readline()
+            except ConnectionError:
+                self._writer = None
+                raise
+            if not line:
+                self._writer = None
+                raise ConnectionError(f"Сервер очереди {self.host}:{self.port} закрыл соединение")
+        response = json.loads(line)
+        if 'error' in response:
+            raise RuntimeError(response['error'])
+        return response['ok']
+
+    async def put(self, kind: str, key: str, payload: dict) -> bool:
+        return await self._call('put', kind=kind, key=key, payload=payload)
+
+    async def lease(self, worker: str, limit: int = 1, lease_seconds: float = 60.0) -> List[dict]:
+        return await self._call('lease', worker=worker, limit=limit, lease_seconds=lease_seconds)
+
+    async def renew(self, task_id: int, worker: str, lease_seconds: float = 60.0) -> bool:
+        return await self._call('renew', task_id=task_id, worker=worker, lease_seconds=lease_seconds)
+
+    async def complete(self, task_id: int, worker: str, result: Any) -> bool:
+        return await self._call('complete', task_id=task_id, worker=worker, result=result)
+
+    async def fail(self, task_id: int, worker: str, error: str) -> None:
+        await self._call('fail', task_id=task_id, worker=worker, error=error)
+
+    async def collect(self, limit: int = 100) -> List[dict]:
+        return await self._call('collect', limit=limit)
+
+    async def counts(self) -> Dict[str, int]:
+        return await self._call('counts')
+
+    async def set_meta(self, key: str, value: Any) -> None:
+        await self._call('set_meta', key=key, value=value)
+
+    async def get_meta(self, key: str) -> Any:
+        return await self._call('get_meta', key=key)
+
+    async def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+
+def open_queue(spec: str, token: Optional[str] = None) -> WorkQueue:
+    """
+    Очередь по строке: 'tcp://host:port' — сетевая (QueueServer),
+    иначе — путь к файлу SQLite.
+    """
+    if spec.startswith('tcp://'):
+        host, _, port = spec[len('tcp://'):].rpartition(':')
+        return TCPWorkQueue(host or '127.0.0.1', int(port), token)
+    return SQLiteWorkQueue(spec)
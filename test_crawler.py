@@ -0,0 +1,107 @@
+# test_crawler.py
+import asyncio
+from contextlib import asynccontextmanager
+
+from aiohttp import web
+
+import engine.crawler
+from engine.crawler import crawl, fetch
+
+
+@asynccontextmanager
+async def serve(pages: dict):
+    """Локальный сайт: путь -> HTML; возвращает (базовый URL, список запрошенных путей с query)."""
+    requested = []
+
+    async def handler(request: web.Request) -> web.Response:
+        requested.append(str(request.rel_url))
+        return web.Response(text=pages.get(request.path, 'ok'), content_type='text/html')
+
+    app = web.Application()
+    app.router.add_get('/{tail:.*}', handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    try:
+        yield f"http://127.0.0.1:{runner.addresses[0][1]}/", requested
+    finally:
+        await runner.cleanup()
+
+
+def test_crawl_fetches_real_links():
+    # каноническая форма — только ключ повторов: слэш и параметры ссылки сохраняются
+    pages = {
+        '/': '<a href="/docs/">docs</a><a href="/a?utm_source=x&id=1">a</a>',
+        '/docs/': '<a href="page2">next</a>',
+    }
+
+    async def main():
+        async with serve(pages) as (url, requested):
+            await crawl(url, max_depth=3, concurrency=2)
+            return requested
+
+    requested = asyncio.run(main())
+    assert '/docs/' in requested
+    assert '/docs/page2' in requested
+    assert '/a?utm_source=x&id=1' in requested
+    assert '/docs' not in requested
+
+
+def test_crawl_skips_canonical_duplicates():
+    pages = {'/': '<a href="/a?id=1&utm_source=x">1</a><a href="/a?id=1">2</a><a href="/a?id=1#top">3</a>'}
+
+    async def main():
+        async with serve(pages) as (url, requested):
+            await crawl(url, max_depth=2, concurrency=2)
+            return requested
+
+    requested = asyncio.run(main())
+    assert len([path for path in requested if path.startswith('/a')]) == 1
+
+
+def test_parse_error_skips_only_that_page():
+    pages = {'/': '<a href="/bad">bad</a><a href="/good">good</a>', '/bad': 'BROKEN'}
+    parse_page = engine.crawler.parse_page
+
+    def failing_parse(html, url):
+        if html == 'BROKEN':
+            raise ValueError('cannot parse')
+        return parse_page(html, url)
+
+    async def main():
+        async with serve(pages) as (url, requested):
+            return [page_url for page_url, _ in await crawl(url, max_depth=2, concurrency=2)]
+
+    engine.crawler.parse_page = failing_parse
+    try:
+        crawled = asyncio.run(main())
+    finally:
+        engine.crawler.parse_page = parse_page
+    assert any(page_url.endswith('/good') for page_url in crawled)
+    assert not any(page_url.endswith('/bad') for page_url in crawled)
+
+
+def test_fetch_strict_raises_on_failure():
+    import aiohttp
+
+    async def main():
+        async with aiohttp.ClientSession() as session:
+            semaphore = asyncio.Semaphore(1)
+            lenient = await fetch(session, semaphore, 'http://127.0.0.1:1/')
+            try:
+                await fetch(session, semaphore, 'http://127.0.0.1:1/', strict=True)
+            except ConnectionError:
+                return lenient, True
+            return lenient, False
+
+    lenient, raised = asyncio.run(main())
+    assert lenient == ('http://127.0.0.1:1/', '')
+    assert raised
+
+
+if __name__ == '__main__':
+    for name, func in list(globals().items()):
+        if name.startswith('test_'):
+            func()
+            print(f"{name}: ok")
@@ -0,0 +1,46 @@
+# test_dom_scanner.py
+from engine.dom_scanner import analyze_script
+
+
+def sources(script: str):
+    return [(finding.source, finding.sink) for finding in analyze_script(script)]
+
+
+def test_sanitiser_only_covers_wrapped_operand():
+    assert sources('eval(location.hash + encodeURIComponent(x))') == [('location.hash', 'eval')]
+    assert sources('el.innerHTML = DOMPurify.sanitize(location.hash) + location.search') == \
+        [('location.search', 'el.innerHTML')]
+
+
+def test_sanitised_value_is_clean():
+    assert sources('eval(encodeURIComponent(location.hash))') == []
+    assert sources('var a = encodeURIComponent(location.hash); document.write(a)') == []
+    assert sources('document.write(parseInt(location.hash, 10))') == []
+
+
+def test_taint_follows_variables():
+    assert sources('var a = location.hash; document.write("x" + escape(1) + a)') == \
+        [('location.hash', 'document.write')]
+
+
+def test_braceless_control_flow_body():
+    assert sources('if (x) el.innerHTML = location.hash;') == [('location.hash', 'el.innerHTML')]
+    assert sources('if (a) b(); else var z = location.hash; document.write(z)') == \
+        [('location.hash', 'document.write')]
+    assert sources('for (var i = 0; i < n; i++) el.innerHTML = location.search;') == \
+        [('location.search', 'el.innerHTML')]
+
+
+def test_nested_calls():
+    assert sources('eval(f(g(h(location.hash))))') == [('location.hash', 'eval')]
+    assert sources('setTimeout(f(() => location.hash), 1)') == []
+    # deep nesting is analysed in one pass over the parenthesised ranges
+    depth = 5000
+    assert sources('eval(' * depth + 'location.hash' + ')' * depth) == [('location.hash', 'eval')] * depth
+
+
+if __name__ == '__main__':
+    for name, func in list(globals().items()):
+        if name.startswith('test_'):
+            func()
+            print(f"{name}: ok")
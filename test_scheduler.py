@@ -0,0 +1,75 @@
+# test_scheduler.py
+import asyncio
+
+from engine.scheduler import WorkScheduler
+
+
+def test_results_emitted_in_submission_order():
+    async def main():
+        emitted = []
+        scheduler = WorkScheduler(concurrency=4, per_host=4, on_result=emitted.append)
+
+        def unit(value, delay):
+            async def run():
+                await asyncio.sleep(delay)
+                return value
+            return run
+
+        async with scheduler:
+            # первые задачи завершаются последними
+            for value, delay in enumerate((0.04, 0.03, 0.02, 0.01, 0)):
+                await scheduler.submit('a', unit(value, delay))
+        return emitted
+
+    assert asyncio.run(main()) == [0, 1, 2, 3, 4]
+
+
+def test_per_host_cap():
+    async def main():
+        running = {'a': 0, 'b': 0}
+        peak = {'a': 0, 'b': 0}
+        scheduler = WorkScheduler(concurrency=10, per_host=2)
+
+        def unit(host):
+            async def run():
+                running[host] += 1
+                peak[host] = max(peak[host], running[host])
+                await asyncio.sleep(0.01)
+                running[host] -= 1
+                return host
+            return run
+
+        async with scheduler:
+            for i in range(12):
+                host = 'a' if i % 3 else 'b'
+                await scheduler.submit(host, unit(host))
+        return peak, await scheduler.join()
+
+    peak, results = asyncio.run(main())
+    assert peak == {'a': 2, 'b': 2}
+    assert results == ['b' if i % 3 == 0 else 'a' for i in range(12)]
+
+
+def test_failed_unit_does_not_block_order():
+    async def main():
+        scheduler = WorkScheduler(concurrency=2, per_host=2)
+
+        async def boom():
+            raise RuntimeError('boom')
+
+        async def ok():
+            return 'ok'
+
+        async with scheduler:
+            await scheduler.submit('a', boom)
+            await scheduler.submit('a', ok)
+        return await scheduler.join()
+
+    assert asyncio.run(main()) == ['ok']
+
+
+if __name__ == '__main__':
+    for name, func in list(globals().items()):
+        if name.startswith('test_'):
+            func()
+            print(f"{name}: ok")
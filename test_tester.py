@@ -0,0 +1,121 @@
+# test_tester.py
+import asyncio
+from contextlib import asynccontextmanager
+
+import aiohttp
+from aiohttp import web
+
+from engine.httpcache import ResponseCache
+from engine.metrics import get_metrics
+from engine.tester import make_marker, send_batch, send_request, test_payload as check_payload
+
+FORM = {'type': 'form', 'url': '/form', 'method': 'post', 'params': {'a': '', 'b': '', 'c': ''}}
+
+
+@asynccontextmanager
+async def serve(handler):
+    """Локальный сервер с одним обработчиком /form; возвращает (базовый URL, сессия)."""
+    app = web.Application()
+    app.router.add_route('*', '/form', handler)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, '127.0.0.1', 0)
+    await site.start()
+    try:
+        async with aiohttp.ClientSession() as session:
+            yield f"http://127.0.0.1:{runner.addresses[0][1]}/", session
+    finally:
+        await runner.cleanup()
+
+
+def test_markers_are_deterministic():
+    assert make_marker('POST http://x/form', 'a') == make_marker('POST http://x/form', 'a')
+    assert make_marker('POST http://x/form', 'a') != make_marker('POST http://x/form', 'b')
+    assert make_marker().isalnum() and make_marker() != make_marker()
+
+
+def test_batched_reflection_is_attributed_to_param():
+    async def handler(request):
+        data = await request.post()
+        return web.Response(text=f"<p>{data['b']}</p>", content_type='text/html')
+
+    async def main():
+        async with serve(handler) as (url, session):
+            return await check_payload(session, url, FORM, '<svg onload=alert(1)>', False, False)
+
+    success, response, _ = asyncio.run(main())
+    assert success and response['reflected'] == ['b']
+
+
+def test_repeated_form_test_hits_cache():
+    requests = []
+
+    async def handler(request):
+        requests.append(dict(await request.post()))
+        return web.Response(text='<p>nothing</p>', content_type='text/html')
+
+    async def main():
+        cache = ResponseCache()
+        async with serve(handler) as (url, session):
+            for _ in range(2):
+                await check_payload(session, url, FORM, '<b>x</b>', False, False, cache=cache)
+
+    asyncio.run(main())
+    assert len(requests) == 1
+
+
+def test_blocked_only_when_every_variant_blocked():
+    async def blocking(request):
+        return web.Response(status=403, text='denied')
+
+    async def partly(request):
+        # исходный payload проходит, обфусцированные варианты (в том числе последний) блокируются
+        data = await request.post()
+        blocked = not any('<script>alert(1)</script>' in value for value in data.values())
+        return web.Response(status=403 if blocked else 200, text='nothing', content_type='text/html')
+
+    async def main(handler):
+        async with serve(handler) as (url, session):
+            return await check_payload(session, url, FORM, '<script>alert(1)</script>', True, False)
+
+    success, response, _ = asyncio.run(main(blocking))
+    assert not success and response['blocked']
+    # неудача возвращает последний ответ-блокировку: по нему определяется WAF
+    assert response['status_code'] == 403 and response['text'] == 'denied'
+    success, response, _ = asyncio.run(main(partly))
+    assert not success and not response['blocked'] and response['status_code'] == 403
+
+
+def test_rejected_batch_is_split():
+    async def handler(request):
+        # остальные поля формы уходят с исходными (пустыми) значениями
+        data = {k: v for k, v in (await request.post()).items() if v}
+        if len(data) > 1:
+            return web.Response(status=413, text='too large')
+        return web.Response(text=''.join(data.values()), content_type='text/html')
+
+    async def main():
+        async with serve(handler) as (url, session):
+            return await send_batch(session, url, FORM, {'a': '1', 'b': '2', 'c': '3'})
+
+    sent = asyncio.run(main())
+    assert [values for values, _ in sent] == [{'a': '1'}, {'b': '2'}, {'c': '3'}]
+    assert all(response['status_code'] == 200 for _, response in sent)
+
+
+def test_invalid_url_is_not_requested():
+    async def main():
+        async with aiohttp.ClientSession() as session:
+            return [await send_request(session, 'GET', url) for url in ('javascript:alert(1)', 'http://[::1')]
+
+    before = get_metrics().summary()['requests']
+    assert asyncio.run(main()) == [None, None]
+    # без повторов и без учёта в статистике хоста
+    assert get_metrics().summary()['requests'] == before
+
+
+if __name__ == '__main__':
+    for name, func in list(globals().items()):
+        if name.startswith('test_'):
+            func()
+            print(f"{name}: ok")
@@ -1,5 +1,5 @@
 # test_waf.py
-from engine.wafdetector import detect_waf_flag
+from engine.wafdetector import detect_waf
 
 # Моделируем ответы
 tests = [
@@ -30,5 +30,5 @@ tests = [
 ]
 
 for test in tests:
-    wf = detect_waf_flag(test['response'])
+    wf = detect_waf(test['response'])
     print(f"{test['name']}: -> {wf}")
\ No newline at end of file
@@ -0,0 +1,74 @@
+# test_wafdetector.py
+import re
+
+from engine.wafdetector import WAF_SIGNATURES, WafSignatureEngine
+
+
+def reference_match(signatures: dict, status_code: str, headers: str, body: str):
+    """Поочерёдная проверка сигнатур, как до общего движка: эталон для сравнения."""
+    best = (0, None)
+    for name, sig in signatures.items():
+        score = 0
+        if sig.get('code') and re.search(sig['code'], status_code, re.I):
+            score += 0.5
+        patterns = sig.get('headers') or []
+        for pattern in patterns if isinstance(patterns, list) else [patterns]:
+            if re.search(pattern, headers, re.I):
+                score += 1
+        if sig.get('page') and re.search(sig['page'], body, re.I):
+            score += 1
+        if score > best[0]:
+            best = (score, name)
+    return best[1]
+
+
+def test_overlapping_signatures_all_score():
+    # тело подходит обеим сигнатурам; B вдобавок совпадает по заголовку и должна победить
+    signatures = {
+        'A': {'page': 'Access Denied'},
+        'B': {'page': 'Denied', 'headers': 'acme'},
+    }
+    engine = WafSignatureEngine(signatures)
+    assert engine.match('200', 'x-acme: 1', 'Access Denied') == 'B'
+
+
+def test_same_verdicts_as_reference():
+    engine = WafSignatureEngine(WAF_SIGNATURES)
+    bodies = ['', 'Attention Required! | Cloudflare', 'Access Denied - Sucuri Website Firewall',
+              'Request rejected', 'Powered by Incapsula incident id']
+    headers = ['', 'server: cloudflare\ncf-ray: 1', 'x-sucuri-id: 1', 'x-amzn-requestid: 1',
+               'set-cookie: incap_ses_1=a']
+    for status in ('200', '403', '406', '501'):
+        for header in headers:
+            for body in bodies:
+                expected = reference_match(WAF_SIGNATURES, status, header, body)
+                assert engine.match(status, header, body) == expected, (status, header, body)
+
+
+def test_host_verdicts_cached():
+    engine = WafSignatureEngine(WAF_SIGNATURES)
+    clean = {'status_code': 200, 'headers': {'server': 'nginx'}, 'text': '<html>hello</html>'}
+    assert engine.detect(clean, 'example.com') is None
+    # отсутствие WAF запоминается для того же кода ответа
+    assert engine.known('example.com', '200')
+    assert not engine.known('example.com', '403')
+    # блокировка с другим кодом всё равно проверяется и запоминается для хоста
+    blocked = {'status_code': 403, 'headers': {'cf-ray': '1'}, 'text': 'Attention Required! | Cloudflare'}
+    assert engine.detect(blocked, 'example.com') == 'CloudFlare'
+    assert engine.detect(clean, 'example.com') == 'CloudFlare'
+
+
+def test_patterns_that_do_not_combine():
+    # (?i) не в начале общего выражения — ошибка; движок проверяет шаблоны по одному
+    engine = WafSignatureEngine({'A': {'page': 'blocked'}, 'B': {'page': '(?i)firewall'}})
+    assert engine._page[0] is None
+    assert engine.match('200', '', 'Web FIREWALL') == 'B'
+    assert engine.match('200', '', 'request blocked') == 'A'
+    assert engine.match('200', '', 'hello') is None
+
+
+if __name__ == '__main__':
+    for name, func in list(globals().items()):
+        if name.startswith('test_'):
+            func()
+            print(f"{name}: ok")
@@ -0,0 +1,129 @@
+# test_workqueue.py
+import asyncio
+import json
+import os
+import tempfile
+
+from engine.workqueue import QueueServer, SQLiteWorkQueue, TCPWorkQueue, is_loopback
+
+
+def run_with_queue(test, **kwargs):
+    """Запускает корутину test(queue) на очереди во временном файле."""
+    async def main():
+        with tempfile.TemporaryDirectory() as tmp:
+            queue = SQLiteWorkQueue(os.path.join(tmp, 'queue.db'), **kwargs)
+            try:
+                return await test(queue)
+            finally:
+                await queue.close()
+    return asyncio.run(main())
+
+
+def test_put_is_idempotent():
+    async def test(queue):
+        assert await queue.put('page', 'a', {'url': 'a'})
+        assert not await queue.put('page', 'a', {'url': 'a'})
+        return await queue.counts()
+
+    assert run_with_queue(test)['pending'] == 1
+
+
+def test_lease_complete_collect():
+    async def test(queue):
+        await queue.put('page', 'a', {'url': 'a'})
+        [task] = await queue.lease('w1', limit=5)
+        assert task['payload'] == {'url': 'a'} and task['attempt'] == 1
+        assert await queue.lease('w2', limit=5) == []
+        assert await queue.complete(task['id'], 'w1', {'links': []})
+        # результат принимается один раз
+        assert not await queue.complete(task['id'], 'w2', {'links': ['x']})
+        collected = await queue.collect()
+        assert await queue.collect() == []
+        return collected, await queue.counts()
+
+    collected, counts = run_with_queue(test)
+    assert [task['result'] for task in collected] == [{'links': []}]
+    assert counts['done'] == 1 and counts['uncollected'] == 0
+
+
+def test_failed_task_is_retried_until_max_attempts():
+    async def test(queue):
+        await queue.put('page', 'a', {})
+        for attempt in (1, 2):
+            [task] = await queue.lease('w', lease_seconds=60)
+            assert task['attempt'] == attempt
+            await queue.fail(task['id'], 'w', 'boom')
+        return await queue.counts()
+
+    counts = run_with_queue(test, max_attempts=2)
+    assert counts['failed'] == 1 and counts['pending'] == 0
+
+
+def test_expired_lease_is_reaped_without_lease_calls():
+    # исполнитель пропал: counts() сам возвращает задачу в очередь, а после последней попытки — проваливает
+    async def test(queue):
+        await queue.put('page', 'a', {})
+        await queue.lease('w1', lease_seconds=0.05)
+        await asyncio.sleep(0.1)
+        first = await queue.counts()
+        await queue.lease('w2', lease_seconds=0.05)
+        await asyncio.sleep(0.1)
+        return first, await queue.counts()
+
+    first, second = run_with_queue(test, max_attempts=2)
+    assert first['pending'] == 1 and first['leased'] == 0
+    assert second['failed'] == 1 and second['leased'] == 0
+
+
+def test_tcp_queue_with_token():
+    async def test(queue):
+        async with QueueServer(queue, '127.0.0.1', 0, token='secret') as server:
+            port = server._server.sockets[0].getsockname()[1]
+            remote = TCPWorkQueue('127.0.0.1', port, token='secret')
+            await remote.put('page', 'a', {'url': 'a'})
+            [task] = await remote.lease('remote')
+            await remote.complete(task['id'], 'remote', {'ok': 1})
+            await remote.close()
+            intruder = TCPWorkQueue('127.0.0.1', port, token='wrong')
+            try:
+                await intruder.counts()
+                rejected = False
+            except RuntimeError:
+                rejected = True
+            await intruder.close()
+        return rejected, await queue.collect()
+
+    rejected, collected = run_with_queue(test)
+    assert rejected
+    assert [task['result'] for task in collected] == [{'ok': 1}]
+
+
+def test_server_rejects_malformed_requests():
+    async def test(queue):
+        async with QueueServer(queue, '127.0.0.1', 0) as server:
+            port = server._server.sockets[0].getsockname()[1]
+            reader, writer = await asyncio.open_connection('127.0.0.1', port)
+            replies = []
+            for line in (b'[1, 2]', b'{"args": {}}', b'{"op": "put", "args": []}', b'{"op": "counts"}'):
+                writer.write(line + b'\n')
+                await writer.drain()
+                replies.append(json.loads(await reader.readline()))
+            writer.close()
+        return replies
+
+    *errors, counts = run_with_queue(test)
+    # ошибка в ответе, а соединение остаётся рабочим
+    assert all('error' in reply for reply in errors)
+    assert counts['ok']['pending'] == 0
+
+
+def test_is_loopback():
+    assert is_loopback('127.0.0.1') and is_loopback('::1') and is_loopback('localhost')
+    assert not is_loopback('0.0.0.0') and not is_loopback('10.0.0.5') and not is_loopback('scanner.local')
+
+
+if __name__ == '__main__':
+    for name, func in list(globals().items()):
+        if name.startswith('test_'):
+            func()
+            print(f"{name}: ok")
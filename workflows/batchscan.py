@@ -0,0 +1,132 @@
+import asyncio
+import hashlib
+import os
+import time
+from typing import Iterable, Iterator
+
+import click
+
+from engine.blind_scanner import InjectionIndex
+from engine.logsetup import get_logger
+from engine.ratecontrol import request_limit
+from engine.session import scan_session
+from engine.sinks import ResultSink
+from engine.state import ScanState
+from workflows.fullscan import full_scan
+from workflows.singlescan import single_scan
+
+logger = get_logger(__name__)
+
+
+def iter_targets(lines: Iterable[str]) -> Iterator[str]:
+    """
+    Цели из файла/stdin: по одной на строку, пустые строки и комментарии (#) пропускаются,
+    повторы отбрасываются. Строки читаются лениво — список целей целиком в память не загружается.
+    """
+    seen = set()
+    for line in lines:
+        target = line.strip()
+        if not target or target.startswith('#') or target in seen:
+            continue
+        seen.add(target)
+        yield target
+
+
+def state_path(state_dir: str, target: str) -> str:
+    """Файл состояния цели в state_dir (имя — короткий хэш URL)."""
+    digest = hashlib.blake2b(target.encode('utf-8'), digest_size=8).hexdigest()
+    return os.path.join(state_dir, f"{digest}.db")
+
+
+async def batch_scan(
+    targets: Iterable[str],
+    crawl: bool = False,
+    max_targets: int = 10,
+    global_limit: int = 100,
+    max_depth: int = 2,
+    concurrency: int = 5,
+    per_host: int = 8,
+    sample_limit: int = 3,
+    basic: bool = False,
+    obfuscate: bool = False,
+    encode: bool = False,
+    detect_waf: bool = False,
+    blind_payload_url: str = None,
+    blind_index: InjectionIndex = None,
+    probe: bool = True,
+    batch: bool = True,
+    cache_size: int = 2048,
+    max_hits: int = None,
+    adaptive: bool = True,
+    sink: ResultSink = None,
+    state_dir: str = None,
+    cookie_file: str = None
+) -> dict:
+    """
+    Сканирует много целей в одном event loop.
+
+    Одновременно сканируется не больше max_targets целей; все они делят одну
+    сессию, и global_limit ограничивает общее число запросов в полёте по всем
+    целям (и соединений сессии). Внутри цели действуют обычные ограничения
+    сканирования (concurrency, per_host). Цели читаются из targets в отдельном
+    потоке: ожидание ввода (stdin) не останавливает идущие сканирования.
+    Записи всех целей пишутся в общий sink. С state_dir у каждой цели
+    свой файл состояния, и повторный запуск продолжает прерванные цели.
+    Ошибка одной цели не останавливает остальные.
+
+    Возвращает сводку {'targets', 'failed', 'seconds'}.
+    """
+    options = dict(
+        basic=basic, obfuscate=obfuscate, encode=encode, detect_waf=detect_waf,
+        detect_blind=bool(blind_payload_url), blind_payload_url=blind_payload_url, blind_index=blind_index,
+        probe=probe, batch=batch, cache_size=cache_size, sink=sink, max_hits=max_hits, adaptive=adaptive,
+    )
+    if state_dir:
+        os.makedirs(state_dir, exist_ok=True)
+    summary = {'targets': 0, 'failed': 0}
+    started = time.monotonic()
+    queue = iter(targets)
+    queue_lock = asyncio.Lock()
+
+    async def next_target():
+        # генератор нельзя продвигать из двух потоков сразу
+        async with queue_lock:
+            return await asyncio.to_thread(next, queue, None)
+
+    async def scan_target(session, target: str):
+        state = ScanState(state_path(state_dir, target), target) if crawl and state_dir else None
+        try:
+            if crawl:
+                await full_scan(
+                    start_url=target, max_depth=max_depth, concurrency=concurrency, per_host=per_host,
+                    sample_limit=sample_limit, state=state, session=session, **options
+                )
+            else:
+                await single_scan(target_url=target, session=session, **options)
+        finally:
+            if state is not None:
+                state.close()
+
+    async def worker(session):
+        # общий итератор: каждая цель достаётся ровно одному обработчику
+        while (target := await next_target()) is not None:
+            summary['targets'] += 1
+            try:
+                await scan_target(session, target)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # цель с ошибкой (битый URL, несовместимое состояние и т.п.) не должна прерывать пакет
+                summary['failed'] += 1
+                logger.error(f"Target {target} failed: {e!r}")
+                click.secho(f"[!] {target}: {e}", fg="red")
+            if sink is not None:
+                sink.flush()
+
+    with request_limit(global_limit):
+        async with scan_session(per_host, cookie_file, limit=global_limit) as session:
+            await asyncio.gather(*(worker(session) for _ in range(max(1, max_targets))))
+
+    summary['seconds'] = round(time.monotonic() - started, 2)
+    logger.info(f"Batch finished: {summary}")
+    return summary
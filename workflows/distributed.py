@@ -0,0 +1,313 @@
+import asyncio
+import os
+import socket
+import time
+from typing import List, Optional
+from urllib.parse import parse_qs, urldefrag, urljoin, urlparse
+
+import click
+
+from engine import wafdetector
+from engine.crawler import load_page
+from engine.dom_scanner import ScriptAnalysisCache, report_dom_findings
+from engine.httpcache import ResponseCache
+from engine.logsetup import get_logger
+from engine.parser import EndpointIndex, endpoint_fingerprint, extract_endpoints
+from engine.payloads import BASIC_PAYLOADS, generate_payloads
+from engine.probe import probe_endpoint
+from engine.ratecontrol import HostRateController, rate_control
+from engine.results import ResultStore
+from engine.session import scan_session
+from engine.sinks import ResultSink
+from engine.state import unit_key
+from engine.strategy import ConfirmationPolicy, PayloadRanker
+from engine.tester import endpoint_params, test_payload
+from engine.urlnorm import PatternSampler, canonicalize_url
+from engine.workqueue import WorkQueue
+
+logger = get_logger(__name__)
+
+# Виды задач в очереди
+TASK_PAGE = 'page'
+TASK_ENDPOINT = 'endpoint'
+
+
+def _page_endpoints(url: str, page) -> List[dict]:
+    endpoints = extract_endpoints(page)
+    # fallback: query-параметры самой страницы
+    if not endpoints and url.startswith("http") and '?' in url:
+        parsed = urlparse(url)
+        base = f"{parsed.scheme}://{parsed.netloc}{parsed.path}"
+        endpoints = [{
+            'type': 'url', 'url': base,
+            'param': k, 'params': {k: v[0]}
+        } for k, v in parse_qs(parsed.query).items()]
+    return endpoints
+
+
+def _fingerprint_from_json(fp: list) -> tuple:
+    # JSON превращает кортежи в списки; отпечаток эндпоинта — кортеж с кортежем имён
+    method, action, names, param = fp
+    return method, action, tuple(names), param
+
+
+async def coordinate(
+    queue: WorkQueue,
+    start_url: str,
+    max_depth: int = 2,
+    sample_limit: int = 3,
+    basic: bool = False,
+    obfuscate: bool = False,
+    encode: bool = False,
+    detect_waf: bool = False,
+    probe: bool = True,
+    batch: bool = True,
+    max_hits: int = None,
+    adaptive: bool = True,
+    sink: ResultSink = None,
+    poll_interval: float = 0.5,
+    idle_timeout: float = 300.0
+) -> ResultStore:
+    """
+    Координатор распределённого сканирования.
+
+    Ставит в очередь страницы фронтира (задачи 'page') и найденные на них
+    эндпоинты (задачи 'endpoint'), а исполнители (run_worker) их выполняют.
+    Координатор решает, что сканировать: область и глубина обхода, выборка
+    по шаблонам URL и проверка каждого эндпоинта один раз (см. engine.parser.EndpointIndex)
+    делаются здесь, в одном месте. Результаты исполнителей сливаются без повторов:
+    задача, выполненная дважды (исполнитель пропал, но успел отчитаться), не
+    даёт лишних записей. Параметры проверки передаются исполнителям через очередь.
+    Как и в full_scan, эндпоинт, общий для нескольких страниц, проверяется один раз
+    и привязывается ко всем этим страницам (ResultStore.pages). adaptive — порядок
+    payloads по хосту (PayloadRanker); каждый исполнитель учится на своих задачах.
+
+    Завершается, когда в очереди не осталось невыполненных задач. Если задачи
+    ждут, а ни один исполнитель не брал их idle_timeout секунд (все исполнители
+    пропали), сканирование прерывается с RuntimeError.
+    """
+    # сначала снимаем отметку о завершении прошлого сканирования в этой очереди,
+    # иначе исполнитель, увидевший параметры, может сразу выйти
+    await queue.set_meta('finished', False)
+    await queue.set_meta('options', dict(
+        basic=basic, obfuscate=obfuscate, encode=encode, detect_waf=detect_waf,
+        probe=probe, batch=batch, max_hits=max_hits, adaptive=adaptive,
+    ))
+    logger.info(f"Start coordinator: {start_url}, depth={max_depth}, sample_limit={sample_limit}")
+
+    store = ResultStore()
+    parsed = urlparse(canonicalize_url(start_url))
+    base_domain = f"{parsed.scheme}://{parsed.netloc}"
+    seen = {start_url, canonicalize_url(start_url)}
+    sampler = PatternSampler(sample_limit)
+    sampler.admit(start_url)
+    endpoint_index = EndpointIndex()
+    # отпечаток эндпоинта -> (страница, эндпоинт) его задачи
+    endpoint_tasks: dict = {}
+    hit_fps = set()
+    merged = set()
+    duplicates = 0
+    await queue.put(TASK_PAGE, canonicalize_url(start_url), {'url': start_url, 'depth': 0})
+    last_activity = time.monotonic()
+
+    while True:
+        collected = await queue.collect()
+        for task in collected:
+            payload, result = task['payload'], task['result']
+            if task['kind'] == TASK_PAGE:
+                url, depth = payload['url'], payload['depth']
+                if depth < max_depth - 1:
+                    for link in result['links']:
+                        # каноническая форма — только ключ повторов и шаблонов, загружается сама ссылка
+                        key = canonicalize_url(link)
+                        if key.startswith(base_domain) and key not in seen:
+                            seen.add(key)
+                            if sampler.admit(key):
+                                await queue.put(TASK_PAGE, key, {'url': link, 'depth': depth + 1})
+                for endpoint, fp in result['endpoints']:
+                    fp = _fingerprint_from_json(fp)
+                    if endpoint_index.add(fp, url):
+                        endpoint_tasks[fp] = (url, endpoint)
+                        await queue.put(TASK_ENDPOINT, unit_key(*fp).hex(),
+                                        {'url': url, 'endpoint': endpoint, 'fp': fp})
+            else:
+                for record in result['records']:
+                    key = unit_key(record['url'], record['endpoint_url'], record['endpoint_method'],
+                                   record['endpoint_params'], record['payload'])
+                    if key in merged:
+                        duplicates += 1
+                        continue
+                    merged.add(key)
+                    if sink is not None:
+                        sink.write(record)
+                    else:
+                        store.write(record)
+                    if record['success']:
+                        hit_fps.add(_fingerprint_from_json(payload['fp']))
+                        click.secho(f"[+] {record['vuln_type'].title()} XSS: {record['endpoint_url']} => "
+                                    f"{record['payload']}", fg="green")
+        if collected:
+            last_activity = time.monotonic()
+            continue
+        # counts() заодно возвращает в очередь задачи с истёкшей арендой
+        counts = await queue.counts()
+        if not counts['pending'] and not counts['leased'] and not counts['uncollected']:
+            break
+        if counts['leased']:
+            last_activity = time.monotonic()
+        elif time.monotonic() - last_activity > idle_timeout:
+            await queue.set_meta('finished', True)
+            raise RuntimeError(f"No worker took a task for {idle_timeout:g}s, {counts['pending']} tasks left")
+        await asyncio.sleep(poll_interval)
+
+    await queue.set_meta('finished', True)
+    # находка на общем эндпоинте относится ко всем страницам, где он встречается
+    for fp, (url, endpoint) in endpoint_tasks.items():
+        linked_pages = endpoint_index.pages(fp)
+        store.link_pages(store.endpoint_id(url, endpoint), linked_pages)
+        if fp in hit_fps and len(linked_pages) > 1:
+            click.secho(f"[+] {fp[0]} {fp[1]} ({fp[3] or ','.join(fp[2])}) is present on {len(linked_pages)} pages",
+                        fg="green")
+            logger.info(f"Уязвимый эндпоинт {fp[1]} на страницах: {linked_pages}")
+    counts = await queue.counts()
+    logger.info(f"Queue: {counts}")
+    logger.info(f"Endpoint index: {endpoint_index.stats()}")
+    if duplicates:
+        logger.info(f"Duplicate records dropped: {duplicates}")
+    if counts['failed']:
+        click.secho(f"[!] Failed tasks: {counts['failed']}", fg="red")
+    if sink is not None:
+        sink.flush()
+    logger.info(f"Results: {store.stats()}")
+    return store
+
+
+async def _scan_page(session, semaphore: asyncio.Semaphore, dom_cache: ScriptAnalysisCache, url: str) -> dict:
+    # ошибка загрузки должна провалить задачу (и вернуть её в очередь), а не дать пустую страницу
+    url, page = await load_page(session, semaphore, url, strict=True)
+    await dom_cache.warm(page)
+    report_dom_findings(page, dom_cache)
+    links = [urldefrag(urljoin(url, href))[0] for href in page.links]
+    endpoints = _page_endpoints(url, page)
+    return {
+        'links': list(dict.fromkeys(links)),
+        'endpoints': [[endpoint, list(endpoint_fingerprint(url, endpoint))] for endpoint in endpoints],
+    }
+
+
+async def _scan_endpoint(session, options: dict, ranker: PayloadRanker, cache: ResponseCache,
+                         dom_cache: ScriptAnalysisCache, url: str, endpoint: dict) -> dict:
+    store = ResultStore()
+    host = urlparse(urljoin(url, endpoint.get('url') or '')).netloc
+    reflected = None
+    contexts = None
+    if options['probe']:
+        reflected = await probe_endpoint(session, url, endpoint, cache)
+        if not reflected:
+            return {'records': []}
+        contexts = set().union(*reflected.values())
+    plist = BASIC_PAYLOADS if options['basic'] else generate_payloads(endpoint, contexts=contexts)
+    endpoint_id = store.endpoint_id(url, endpoint)
+    params = endpoint_params(endpoint)
+    policy = ConfirmationPolicy(options['max_hits'])
+    policy.expect(endpoint_id, list(reflected or params))
+    records = []
+    # порядок учитывает, что уже сработало или блокировалось на этом хосте
+    for p in ranker.order(host, plist):
+        if policy.skip(endpoint_id, params):
+            break
+        success, resp, used = await test_payload(
+            session, url, endpoint, p, options['obfuscate'], options['encode'],
+            batch=options['batch'], cache=cache, dom_cache=dom_cache
+        )
+        if success:
+            policy.record(endpoint_id, resp.get('reflected') or params)
+        ranker.record(host, p, success, resp.get('blocked', False))
+        waf_name = await wafdetector.detect_waf_async(resp, host) if options['detect_waf'] else None
+        records.append(store.make_record(endpoint_id, used, success, waf_name))
+    return {'records': records}
+
+
+async def run_worker(
+    queue: WorkQueue,
+    worker_id: Optional[str] = None,
+    concurrency: int = 5,
+    per_host: int = 8,
+    lease_seconds: float = 60.0,
+    poll_interval: float = 0.5,
+    cache_size: int = 2048
+) -> dict:
+    """
+    Исполнитель: берёт задачи из очереди в аренду и выполняет их обычным кодом
+    сканирования (engine.crawler, engine.parser, engine.probe, engine.tester).
+
+    Одновременно выполняется до concurrency задач; аренда каждой продлевается,
+    пока задача идёт. Ошибка задачи возвращает её в очередь (до исчерпания попыток).
+    Завершается, когда координатор отметил сканирование законченным.
+    Возвращает {'done', 'failed'}.
+    """
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}"
+    options = None
+    while options is None:
+        options = await queue.get_meta('options')
+        if options is None:
+            await asyncio.sleep(poll_interval)
+    logger.info(f"Start worker {worker_id}: {options}")
+
+    stats = {'done': 0, 'failed': 0}
+    cache = ResponseCache(max_entries=cache_size)
+    dom_cache = ScriptAnalysisCache()
+    ranker = PayloadRanker(options.get('adaptive', True))
+    controller = HostRateController(max_limit=per_host)
+    semaphore = asyncio.Semaphore(concurrency)
+    running: set = set()
+
+    async def keep_lease(task_id: int):
+        while True:
+            await asyncio.sleep(lease_seconds / 3)
+            if not await queue.renew(task_id, worker_id, lease_seconds):
+                return
+
+    async def execute(session, task: dict):
+        renewer = asyncio.create_task(keep_lease(task['id']))
+        payload = task['payload']
+        try:
+            if task['kind'] == TASK_PAGE:
+                click.secho(f"[{worker_id}] Page: {payload['url']}", fg="white")
+                result = await _scan_page(session, semaphore, dom_cache, payload['url'])
+            else:
+                result = await _scan_endpoint(session, options, ranker, cache, dom_cache,
+                                              payload['url'], payload['endpoint'])
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # задача вернётся в очередь и, возможно, достанется другому исполнителю
+            stats['failed'] += 1
+            logger.error(f"Task {task['id']} ({task['kind']}) failed: {e!r}")
+            await queue.fail(task['id'], worker_id, repr(e))
+        else:
+            stats['done'] += 1
+            await queue.complete(task['id'], worker_id, result)
+        finally:
+            renewer.cancel()
+
+    async with scan_session(per_host) as session, rate_control(controller):
+        try:
+            while True:
+                free = concurrency - len(running)
+                tasks = await queue.lease(worker_id, free, lease_seconds) if free else []
+                for task in tasks:
+                    job = asyncio.create_task(execute(session, task))
+                    running.add(job)
+                    job.add_done_callback(running.discard)
+                if tasks:
+                    continue
+                if not running and await queue.get_meta('finished'):
+                    break
+                await asyncio.sleep(poll_interval)
+        finally:
+            for job in running:
+                job.cancel()
+            await asyncio.gather(*running, return_exceptions=True)
+    logger.info(f"Worker {worker_id}: {stats}, rate control: {controller.stats()}")
+    return stats
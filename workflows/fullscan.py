@@ -1,114 +1,340 @@
 import asyncio
-import json
 import click
+from collections import deque
+from urllib.parse import urljoin, urlparse
 from aiohttp import ClientSession
 
-from engine.crawler import crawl
-from engine.parser import extract_endpoints
+from engine.crawler import iter_crawl
+from engine.page import PageModel
+from engine.parser import EndpointIndex, endpoint_fingerprint, extract_endpoints
 from engine.payloads import generate_payloads, BASIC_PAYLOADS
 from engine.logsetup import get_logger
-from engine.tester import test_payload
-from engine.wafdetector import detect_waf
-from engine.dom_scanner import report_dom_findings
-from engine.blind_scanner import BlindXSSScanner
+from engine.tester import endpoint_params, send_request, test_payload
+from engine.probe import probe_endpoint
+from engine.httpcache import ResponseCache
+from engine.scheduler import WorkScheduler
+from engine import wafdetector
+from engine.dom_scanner import ScriptAnalysisCache, report_dom_findings, scan_external_scripts
+from engine.blind_scanner import BlindXSSScanner, InjectionIndex
+from engine.sinks import ResultSink
+from engine.results import ResultStore
+from engine.strategy import ConfirmationPolicy, PayloadRanker
+from engine.ratecontrol import HostRateController, rate_control
+from engine.session import borrow_session
+from engine.state import ScanState, unit_key
 
 logger = get_logger(__name__)
 
+# Маркер в потоке результатов: все единицы работы страницы завершены
+_PAGE_DONE = object()
+
 async def full_scan(
     start_url: str,
     max_depth: int = 2,
     concurrency: int = 5,
+    per_host: int = 8,
     basic: bool = False,
     obfuscate: bool = False,
     encode: bool = False,
     detect_waf: bool = False,
     detect_blind: bool = False,
-    blind_payload_url: str = None
-) -> list[dict]:
+    blind_payload_url: str = None,
+    blind_index: InjectionIndex = None,
+    page_queue_size: int = None,
+    probe: bool = True,
+    batch: bool = True,
+    cache_size: int = 2048,
+    sink: ResultSink = None,
+    state: ScanState = None,
+    max_hits: int = None,
+    adaptive: bool = True,
+    sample_limit: int = 3,
+    session: ClientSession = None
+) -> ResultStore:
+    """
+    Записи результатов передаются в sink по мере получения.
+    Без sink они собираются в компактном ResultStore (последовательность
+    словарей прежнего формата); с sink в памяти не копятся и ResultStore пуст.
+
+    С state фронтир краулера, просканированные страницы и выполненные
+    единицы работы сохраняются на диск; повторный запуск с тем же state
+    пропускает уже сделанное.
+
+    max_hits — прекратить проверку параметра после стольких успешных payloads
+    (None — проверять весь список). adaptive — payloads, сработавшие на хосте,
+    проверяются первыми на следующих эндпоинтах, заблокированные — последними.
+    sample_limit — сколько страниц одного шаблона URL обходит краулер (None — все).
+
+    per_host — верхняя граница параллельных запросов к одному хосту: фактический
+    лимит подбирается по ответам хоста (см. engine.ratecontrol.HostRateController).
+
+    session — общая сессия (см. engine.session.scan_session); без неё сканирование
+    открывает собственную. Краулер, пробы, payloads и blind-инъекции идут через неё.
+    """
     logger.info(
-        f"Start full_scan: {start_url}, depth={max_depth}, conc={concurrency}, "
-        f"basic={basic}, obf={obfuscate}, enc={encode}, waf={detect_waf}, blind={detect_blind}"
+        f"Start full_scan: {start_url}, depth={max_depth}, conc={concurrency}, per_host={per_host}, "
+        f"basic={basic}, obf={obfuscate}, enc={encode}, waf={detect_waf}, blind={detect_blind}, probe={probe}, batch={batch}, "
+        f"max_hits={max_hits}, adaptive={adaptive}"
     )
 
-    # краулим страницы
-    pages = await crawl(start_url=start_url, max_depth=max_depth, concurrency=concurrency)
-    logger.info(f"Found pages: {len(pages)}")
-
-    results: list[dict] = []
-    blind_scanner = BlindXSSScanner(payload_url=blind_payload_url) if detect_blind and blind_payload_url else None
+    # таблица эндпоинтов общая: параметры эндпоинта сериализуются один раз, а не на каждый payload
+    store = ResultStore()
+    # общий на всё сканирование: одна и та же ссылка встречается на многих страницах
+    cache = ResponseCache(max_entries=cache_size)
+    dom_cache = ScriptAnalysisCache()
+    scope_host = urlparse(start_url).netloc
     seen_blind = set()
-    sem = asyncio.Semaphore(concurrency)
-
-    async with ClientSession() as session:
-        async def scan_page(idx: int, url: str, html: str):
-            async with sem:
-                click.secho(f"({idx}/{len(pages)}) Scanning: {url}", fg="white")
-
-                # статический DOM-XSS анализ
-                report_dom_findings(html)
-
-                # динамический анализ XSS
-                endpoints = extract_endpoints(html)
-                if not endpoints and url.startswith("http") and '?' in url:
-                    from urllib.parse import urlparse, parse_qs
-                    parsed = urlparse(url)
-                    qs = parse_qs(parsed.query)
-                    base = f"{parsed.scheme}://{parsed.netloc}{parsed.path}"
-                    endpoints = [{
-                        'type': 'url', 'url': base,
-                        'param': k, 'params': {k: v[0]}
-                    } for k, v in qs.items()]
-                if not endpoints:
-                    return []
-
-                page_results = []
-                for endpoint in endpoints:
-                    param_id = endpoint.get('param') if endpoint.get('type') == 'link' else ','.join(endpoint.get('params', {}))
-                    plist = BASIC_PAYLOADS if basic else generate_payloads(endpoint)
-
-                    for p in plist:
-                        success, resp, used = await test_payload(session, url, endpoint, p, obfuscate, encode)
-                        waf_name = detect_waf(resp) if detect_waf else None
-                        et = endpoint.get('type')
-                        vtype = 'stored' if et == 'form' else 'reflected'
-
-                        page_results.append({
-                            'url': url,
-                            'endpoint_type': et,
-                            'endpoint_url': endpoint.get('url'),
-                            'endpoint_method': endpoint.get('method', 'GET'),
-                            'endpoint_params': json.dumps(endpoint.get('params') or {endpoint.get('param'): endpoint.get('value')}),
-                            'payload': used,
-                            'success': success,
-                            'waf': waf_name,
-                            'vuln_type': vtype
-                        })
-
-                        if success:
-                            click.secho(f"[+] {vtype.title()} XSS: {param_id} => {used}", fg="green")
-                        elif waf_name:
-                            click.secho(f"[!] WAF ({waf_name}) on {param_id}", fg="yellow")
-                        else:
-                            click.secho(f"[-] No XSS: {param_id}", fg="blue")
-
-                    # blind XSS injection один раз на параметр
+    policy = ConfirmationPolicy(max_hits)
+    # одна и та же форма (поиск, подписка) на всех страницах проверяется один раз
+    endpoint_index = EndpointIndex()
+    endpoint_fps: dict = {}
+    hit_endpoints = set()
+    ranker = PayloadRanker(adaptive)
+    controller = HostRateController(max_limit=per_host)
+
+    skipped = 0
+    if state is not None:
+        # без файла результатов находки живут только в памяти: отмеченные выполненными
+        # единицы после перезапуска пропустятся, а их записи пропадут
+        if sink is None:
+            raise ValueError("Resumable scan (state) requires a result sink")
+        # единицы фиксируются только после сброса их записей на диск
+        state.before_commit = sink.flush
+
+    def emit(item: tuple):
+        # вызывается планировщиком строго в порядке постановки задач
+        if item[0] is _PAGE_DONE:
+            # все единицы работы страницы уже выданы — страницу можно не повторять
+            state.mark_page_done(item[1])
+            return
+        endpoint_id, used, success, waf_name, param_id, key = item
+        if sink is not None:
+            sink.write(store.make_record(endpoint_id, used, success, waf_name))
+        else:
+            store.add(endpoint_id, used, success, waf_name)
+        if state is not None:
+            state.mark_unit_done(key)
+        if success:
+            hit_endpoints.add(endpoint_id)
+            click.secho(f"[+] {store.vuln_type(endpoint_id).title()} XSS: {param_id} => {used}", fg="green")
+        elif waf_name:
+            click.secho(f"[!] WAF ({waf_name}) on {param_id}", fg="yellow")
+        else:
+            click.secho(f"[-] No XSS: {param_id}", fg="blue")
+
+    async with borrow_session(session, per_host) as session, rate_control(controller):
+        # blind-инъекции идут через ту же сессию и планировщик, что и обычные проверки
+        blind_scanner = BlindXSSScanner(
+            payload_url=blind_payload_url, session=session, index=blind_index
+        ) if detect_blind and blind_payload_url else None
+
+        async def blind_unit(url: str, endpoint: dict, param: str, key: bytes = None):
+            payload = await blind_scanner.inject(url, endpoint, param)
+            if payload and key is not None:
+                state.mark_unit_done(key)
+            if payload:
+                click.secho(f"[+] Blind XSS: {param} on {url} => {payload}", fg="magenta")
+            else:
+                click.secho(f"[-] Blind XSS error: {param} on {url}", fg="red")
+            # в результаты не попадает: срабатывание придёт позже через callback
+
+        async def test_unit(url: str, endpoint: dict, endpoint_id: int, param_id: str, p: str, host: str,
+                            key: bytes = None):
+            params = endpoint_params(endpoint)
+            # параметр уже подтверждён нужное число раз — остальные payloads не отправляем
+            if policy.skip(endpoint_id, params):
+                if key is not None:
+                    state.mark_unit_done(key)
+                return None
+            success, resp, used = await test_payload(
+                session, url, endpoint, p, obfuscate, encode, batch=batch, cache=cache, dom_cache=dom_cache
+            )
+            if success:
+                policy.record(endpoint_id, resp.get('reflected') or params)
+            ranker.record(host, p, success, resp.get('blocked', False))
+            if resp.get('reflected'):
+                # в пакетном режиме известно, какие именно поля отразили payload
+                param_id = ','.join(resp['reflected'])
+            # WAF определяется один раз на хост, дальше берётся сохранённый вердикт
+            waf_name = await wafdetector.detect_waf_async(resp, host) if detect_waf else None
+            return endpoint_id, used, success, waf_name, param_id, key
+
+        async def page_done(url: str):
+            return _PAGE_DONE, url
+
+        async def prepare_page(scheduler: WorkScheduler, idx: int, url: str, page: PageModel) -> list:
+            """Анализ страницы и пробы эндпоинтов; возвращает список (endpoint, param_id, plist, host, targets, fp)."""
+            click.secho(f"({idx}) Scanning: {url}", fg="white")
+
+            # статический DOM-XSS анализ: одинаковые скрипты анализируются один раз за сканирование
+            await dom_cache.warm(page)
+            report_dom_findings(page, dom_cache)
+
+            async def fetch_script(script_url: str):
+                async with scheduler.limit(urlparse(script_url).netloc):
+                    response = await send_request(session, 'GET', script_url, cache=cache)
+                return response['text'] if response and response['status_code'] < 400 else None
+
+            # внешние скрипты своего хоста: загрузка и анализ один раз на URL
+            await scan_external_scripts(
+                page, url, lambda u: urlparse(u).netloc == scope_host, fetch_script, dom_cache
+            )
+
+            # динамический анализ XSS
+            endpoints = extract_endpoints(page)
+            if not endpoints and url.startswith("http") and '?' in url:
+                from urllib.parse import parse_qs
+                parsed = urlparse(url)
+                qs = parse_qs(parsed.query)
+                base = f"{parsed.scheme}://{parsed.netloc}{parsed.path}"
+                endpoints = [{
+                    'type': 'url', 'url': base,
+                    'param': k, 'params': {k: v[0]}
+                } for k, v in qs.items()]
+            fresh = []
+            for endpoint in endpoints:
+                fp = endpoint_fingerprint(url, endpoint)
+                if endpoint_index.add(fp, url):
+                    fresh.append((endpoint, fp))
+            if len(fresh) < len(endpoints):
+                click.secho(f"[=] Already tested on other pages: {len(endpoints) - len(fresh)} endpoint(s)", fg="white")
+            if not fresh:
+                return []
+            endpoints, fps = [e for e, _ in fresh], [fp for _, fp in fresh]
+
+            hosts = [urlparse(urljoin(url, endpoint.get('url') or '')).netloc for endpoint in endpoints]
+
+            # проба маркерами: полный список payloads только для отражённых параметров
+            async def run_probe(endpoint: dict, host: str):
+                async with scheduler.limit(host):
+                    return await probe_endpoint(session, url, endpoint, cache)
+
+            if probe:
+                reflections = await asyncio.gather(*(
+                    run_probe(endpoint, host) for endpoint, host in zip(endpoints, hosts)
+                ))
+            else:
+                reflections = [None] * len(endpoints)
+
+            units = []
+            for endpoint, fp, host, reflected in zip(endpoints, fps, hosts, reflections):
+                param_id = endpoint.get('param') if endpoint.get('type') == 'link' else ','.join(endpoint.get('params', {}))
+                if reflected is not None and not reflected:
+                    click.secho(f"[-] Not reflected: {param_id}", fg="blue")
                     if blind_scanner:
-                        for param in endpoint.get('params', {}) or {endpoint.get('param'): endpoint.get('value')}:
-                            key = (url, param)
-                            if key in seen_blind:
-                                continue
-                            payload = blind_scanner.generate_payload()
-                            try:
-                                blind_scanner.send(url, param)
-                                click.secho(f"[+] Blind XSS: {param} on {url} => {payload}", fg="magenta")
-                            except Exception:
-                                click.secho(f"[-] Blind XSS error: {param} on {url}", fg="red")
-                            seen_blind.add(key)
-                return page_results
-
-        # последовательный сканинг страниц, сохраняя лимит одновременных запросов
-        for idx, (url, html) in enumerate(pages, 1):
-            page_res = await scan_page(idx, url, html)
-            results.extend(page_res)
-
-    return results
\ No newline at end of file
+                        # неотражённые параметры — основная цель blind XSS
+                        units.append((endpoint, param_id, (), host, (), fp))
+                    continue
+                contexts = set().union(*reflected.values()) if reflected else None
+                plist = BASIC_PAYLOADS if basic else generate_payloads(endpoint, contexts=contexts)
+                # подтверждать нужно только параметры, отразившиеся в пробе
+                units.append((endpoint, param_id, plist, host, tuple(reflected or endpoint_params(endpoint)), fp))
+            return units
+
+        async def submit_page(scheduler: WorkScheduler, url: str, units: list):
+            nonlocal skipped
+            for endpoint, param_id, plist, host, targets, fp in units:
+                endpoint_id = store.endpoint_id(url, endpoint)
+                endpoint_fps[endpoint_id] = fp
+                policy.expect(endpoint_id, targets)
+                # каждая пара эндпоинт × payload — отдельная единица работы;
+                # порядок учитывает, что уже сработало или блокировалось на этом хосте
+                for p in ranker.order(host, plist):
+                    key = None
+                    if state is not None:
+                        # выполнена в прошлом запуске — её запись была сброшена в sink до фиксации состояния
+                        key = unit_key(fp, p)
+                        if state.unit_done(key):
+                            skipped += 1
+                            continue
+                    await scheduler.submit(
+                        host,
+                        lambda endpoint=endpoint, endpoint_id=endpoint_id, param_id=param_id, p=p, host=host, key=key:
+                            test_unit(url, endpoint, endpoint_id, param_id, p, host, key)
+                    )
+
+                # blind XSS injection один раз на пару (обработчик, параметр)
+                if blind_scanner:
+                    action = urljoin(url, endpoint.get('url') or '').split('?', 1)[0]
+                    for param in endpoint.get('params', {}) or {endpoint.get('param'): endpoint.get('value')}:
+                        key = (action, param)
+                        if key in seen_blind:
+                            continue
+                        seen_blind.add(key)
+                        done_key = unit_key('blind', action, param) if state is not None else None
+                        if done_key is not None and state.unit_done(done_key):
+                            continue
+                        await scheduler.submit(
+                            host,
+                            lambda endpoint=endpoint, param=param, done_key=done_key:
+                                blind_unit(url, endpoint, param, done_key)
+                        )
+
+            if state is not None:
+                # отметка страницы выдаётся после всех её единиц работы
+                await scheduler.submit(scope_host, lambda: page_done(url))
+
+        # страницы, эндпоинты и payloads выполняются параллельно под общим и per-host лимитами;
+        # результаты собираются в порядке постановки
+        # краулер и сканирование работают одновременно: страницы идут через ограниченную очередь,
+        # поэтому краулер не убегает вперёд, а разобранная страница живёт только до извлечения эндпоинтов
+        pages: asyncio.Queue = asyncio.Queue(maxsize=page_queue_size or concurrency * 2)
+
+        async def produce():
+            try:
+                async for page in iter_crawl(
+                    start_url, max_depth=max_depth, concurrency=concurrency, session=session, state=state,
+                    sample_limit=sample_limit
+                ):
+                    await pages.put(page)
+            finally:
+                await pages.put(None)
+
+        producer = asyncio.create_task(produce())
+        idx = 0
+        # подготовка (пробы) идёт параллельно для нескольких страниц,
+        # а постановка в планировщик — строго в порядке поступления страниц
+        window: deque = deque()
+        try:
+            async with WorkScheduler(concurrency=concurrency, per_host=per_host, on_result=emit) as scheduler:
+                while (item := await pages.get()) is not None:
+                    idx += 1
+                    url, page = item
+                    window.append((url, asyncio.create_task(prepare_page(scheduler, idx, url, page))))
+                    del item, page
+                    if len(window) >= concurrency:
+                        url, task = window.popleft()
+                        await submit_page(scheduler, url, await task)
+                while window:
+                    url, task = window.popleft()
+                    await submit_page(scheduler, url, await task)
+        finally:
+            for _, task in window:
+                task.cancel()
+            producer.cancel()
+            await asyncio.gather(producer, *(task for _, task in window), return_exceptions=True)
+        logger.info(f"Found pages: {idx}")
+        if skipped:
+            logger.info(f"Skipped units done in a previous run: {skipped}")
+        logger.info(f"Endpoint index: {endpoint_index.stats()}")
+        if policy.saved:
+            logger.info(f"Skipped payloads after confirmation: {policy.saved}")
+    logger.info(f"Rate control: {controller.stats()}")
+    logger.info(f"Response cache: {cache.stats()}")
+    logger.info(f"Script cache: {dom_cache.stats()}")
+    # находка на общем эндпоинте относится ко всем страницам, где он встречается
+    for endpoint_id, fp in endpoint_fps.items():
+        linked_pages = endpoint_index.pages(fp)
+        store.link_pages(endpoint_id, linked_pages)
+        if endpoint_id in hit_endpoints and len(linked_pages) > 1:
+            click.secho(f"[+] {fp[0]} {fp[1]} ({fp[3] or ','.join(fp[2])}) is present on {len(linked_pages)} pages",
+                        fg="green")
+            logger.info(f"Уязвимый эндпоинт {fp[1]} на страницах: {linked_pages}")
+
+    if sink is not None:
+        sink.flush()
+    if state is not None:
+        state.commit()
+    logger.info(f"Results: {store.stats()}")
+
+    return store
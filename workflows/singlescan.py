@@ -1,15 +1,25 @@
 import os
-import json
 import click
 from aiohttp import ClientSession
-from urllib.parse import urlparse, parse_qs
+from urllib.parse import urljoin, urlparse, parse_qs
 
-from engine.parser import extract_endpoints
+from engine.executor import run_cpu
+from engine.metrics import get_metrics
+from engine.page import parse_page
+from engine.parser import EndpointIndex, endpoint_fingerprint, extract_endpoints
 from engine.payloads import generate_payloads, BASIC_PAYLOADS
 from engine.logsetup import get_logger
-from engine.tester import test_payload
-from engine.wafdetector import detect_waf
-from engine.dom_scanner import report_dom_findings  # новый импорт
+from engine.tester import endpoint_params, send_request, test_payload
+from engine.probe import probe_endpoint
+from engine.httpcache import ResponseCache
+from engine import wafdetector
+from engine.dom_scanner import ScriptAnalysisCache, report_dom_findings, scan_external_scripts
+from engine.blind_scanner import BlindXSSScanner, InjectionIndex
+from engine.sinks import ResultSink
+from engine.results import ResultStore
+from engine.strategy import ConfirmationPolicy, PayloadRanker
+from engine.ratecontrol import HostRateController, rate_control
+from engine.session import borrow_session
 
 logger = get_logger(__name__)
 
@@ -18,75 +28,148 @@ async def single_scan(
     basic: bool = False,
     obfuscate: bool = False,
     encode: bool = False,
-    detect_waf: bool = False
-) -> list[dict]:
-    results: list[dict] = []
+    detect_waf: bool = False,
+    detect_blind: bool = False,
+    blind_payload_url: str = None,
+    blind_index: InjectionIndex = None,
+    probe: bool = True,
+    batch: bool = True,
+    cache_size: int = 2048,
+    sink: ResultSink = None,
+    max_hits: int = None,
+    adaptive: bool = True,
+    session: ClientSession = None
+) -> ResultStore:
+    """
+    Записи результатов передаются в sink по мере получения.
+    Без sink они собираются в компактном ResultStore (последовательность
+    словарей прежнего формата); с sink в памяти не копятся и ResultStore пуст.
+
+    max_hits — прекратить проверку параметра после стольких успешных payloads
+    (None — проверять весь список). adaptive — сработавшие на хосте payloads
+    проверяются первыми, заблокированные — последними.
+    session — общая сессия (см. engine.session.scan_session); без неё открывается собственная.
+    """
+    results = ResultStore()
     logger.info(
         f"Start single_scan: {target_url} "
-        f"(basic={basic}, obf={obfuscate}, enc={encode}, waf={detect_waf})"
+        f"(basic={basic}, obf={obfuscate}, enc={encode}, waf={detect_waf}, blind={detect_blind}, probe={probe}, batch={batch})"
     )
 
-    # Получаем HTML
-    if target_url.startswith("file://"):
-        path = target_url[len("file://"):].lstrip('/\\')
-        if not os.path.isfile(path):
-            logger.error(f"File not found: {path}")
-            return results
-        with open(path, 'r', encoding='utf-8', errors='ignore') as f:
-            html = f.read()
-    else:
-        async with ClientSession() as session:
-            try:
-                async with session.get(target_url) as resp:
-                    html = await resp.text(errors='ignore')
-            except Exception as e:
-                logger.error(f"Cannot fetch page {target_url}: {e}")
+    cache = ResponseCache(max_entries=cache_size)
+    policy = ConfirmationPolicy(max_hits)
+    ranker = PayloadRanker(adaptive)
+    controller = HostRateController()
+    dom_cache = ScriptAnalysisCache()
+    async with borrow_session(session) as session, rate_control(controller):
+        blind_scanner = BlindXSSScanner(
+            payload_url=blind_payload_url, session=session, index=blind_index
+        ) if detect_blind and blind_payload_url else None
+
+        # Получаем HTML
+        if target_url.startswith("file://"):
+            path = target_url[len("file://"):].lstrip('/\\')
+            if not os.path.isfile(path):
+                logger.error(f"File not found: {path}")
                 return results
+            with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+                html = f.read()
+        else:
+            response = await send_request(session, 'GET', target_url)
+            if response is None:
+                logger.error(f"Cannot fetch page {target_url}")
+                return results
+            html = response['text']
+
+        # HTML разбирается один раз и дальше используется только модель страницы
+        with get_metrics().stage('parse'):
+            page = await run_cpu(parse_page, html, target_url, size=len(html))
+
+        # Статический анализ DOM-XSS
+        await dom_cache.warm(page)
+        report_dom_findings(page, dom_cache)
 
-    # Статический анализ DOM-XSS
-    report_dom_findings(html)
+        async def fetch_script(script_url: str):
+            response = await send_request(session, 'GET', script_url, cache=cache)
+            return response['text'] if response and response['status_code'] < 400 else None
 
-    # Динамический анализ эндпоинтов
-    endpoints = extract_endpoints(html)
-    # fallback: query-параметры
-    if not endpoints and '?' in target_url:
-        parsed = urlparse(target_url)
-        qs = parse_qs(parsed.query)
-        base = f"{parsed.scheme}://{parsed.netloc}{parsed.path}"
-        endpoints = [{'type': 'url', 'url': base, 'param': k, 'params': {k: v[0]}} for k, v in qs.items()]
-    logger.info(f"Found endpoints: {len(endpoints)}")
-    if not endpoints:
-        return results
+        # внешние скрипты своего хоста
+        scope_host = urlparse(target_url).netloc
+        await scan_external_scripts(
+            page, target_url, lambda u: u.startswith('http') and urlparse(u).netloc == scope_host,
+            fetch_script, dom_cache
+        )
+
+        # Динамический анализ эндпоинтов
+        endpoints = extract_endpoints(page)
+        # fallback: query-параметры
+        if not endpoints and '?' in target_url:
+            parsed = urlparse(target_url)
+            qs = parse_qs(parsed.query)
+            base = f"{parsed.scheme}://{parsed.netloc}{parsed.path}"
+            endpoints = [{'type': 'url', 'url': base, 'param': k, 'params': {k: v[0]}} for k, v in qs.items()]
+        # одинаковые формы/ссылки на странице проверяются один раз
+        endpoint_index = EndpointIndex()
+        endpoints = [e for e in endpoints if endpoint_index.add(endpoint_fingerprint(target_url, e), target_url)]
+        logger.info(f"Found endpoints: {len(endpoints)}")
+        if not endpoints:
+            return results
 
-    async with ClientSession() as session:
         for endpoint in endpoints:
             param_id = endpoint.get('param') if endpoint.get('type') == 'link' else ','.join(endpoint.get('params', {}))
-            plist = BASIC_PAYLOADS if basic else generate_payloads(endpoint)
-            for p in plist:
+            host = urlparse(urljoin(target_url, endpoint.get('url') or '')).netloc
+            # blind XSS injection один раз на параметр (в том числе неотражённый);
+            # срабатывание придёт позже через callback
+            if blind_scanner:
+                for param in endpoint.get('params', {}) or {endpoint.get('param'): endpoint.get('value')}:
+                    payload = await blind_scanner.inject(target_url, endpoint, param)
+                    if payload:
+                        click.secho(f"[+] Blind XSS: {param} on {target_url} => {payload}", fg="magenta")
+                    else:
+                        click.secho(f"[-] Blind XSS error: {param} on {target_url}", fg="red")
+            # проба маркерами: полный список payloads только для отражённых параметров
+            contexts = None
+            reflected = None
+            if probe:
+                reflected = await probe_endpoint(session, target_url, endpoint, cache)
+                if not reflected:
+                    click.secho(f"[-] Not reflected: {param_id}", fg="blue")
+                    continue
+                contexts = set().union(*reflected.values())
+            plist = BASIC_PAYLOADS if basic else generate_payloads(endpoint, contexts=contexts)
+            endpoint_id = results.endpoint_id(target_url, endpoint)
+            params = endpoint_params(endpoint)
+            # подтверждать нужно только параметры, отразившиеся в пробе
+            policy.expect(endpoint_id, list(reflected or params))
+            for p in ranker.order(host, plist):
+                # параметры подтверждены нужное число раз — остальные payloads не нужны
+                if policy.skip(endpoint_id, params):
+                    break
                 success, resp, used = await test_payload(
-                    session, target_url, endpoint, p, obfuscate, encode
+                    session, target_url, endpoint, p, obfuscate, encode, batch=batch, cache=cache,
+                    dom_cache=dom_cache
                 )
-                waf_name = detect_waf(resp) if detect_waf else None
-                et = endpoint.get('type')
-                vtype = 'stored' if et == 'form' else 'reflected'
-
-                record = {
-                    'url': target_url,
-                    'endpoint_type': et,
-                    'endpoint_url': endpoint.get('url'),
-                    'endpoint_method': endpoint.get('method', 'GET'),
-                    'endpoint_params': json.dumps(endpoint.get('params') or {endpoint.get('param'): endpoint.get('value')}),
-                    'payload': used,
-                    'success': success,
-                    'waf': waf_name,
-                    'vuln_type': vtype
-                }
-                results.append(record)
+                if success:
+                    policy.record(endpoint_id, resp.get('reflected') or params)
+                ranker.record(host, p, success, resp.get('blocked', False))
+                # в пакетном режиме известно, какие именно поля отразили payload
+                shown = ','.join(resp['reflected']) if resp.get('reflected') else param_id
+                # WAF определяется один раз на хост, дальше берётся сохранённый вердикт
+                waf_name = await wafdetector.detect_waf_async(resp, host) if detect_waf else None
+                if sink is not None:
+                    sink.write(results.make_record(endpoint_id, used, success, waf_name))
+                else:
+                    results.add(endpoint_id, used, success, waf_name)
 
                 if success:
-                    click.secho(f"[+] {vtype.title()} XSS: {param_id} => {used}", fg="green")
+                    click.secho(f"[+] {results.vuln_type(endpoint_id).title()} XSS: {shown} => {used}", fg="green")
                 elif waf_name:
-                    click.secho(f"[!] WAF ({waf_name}) on {param_id}", fg="yellow")
+                    click.secho(f"[!] WAF ({waf_name}) on {shown}", fg="yellow")
                 else:
-                    click.secho(f"[-] No XSS: {param_id}", fg="blue")
+                    click.secho(f"[-] No XSS: {shown}", fg="blue")
+    logger.info(f"Rate control: {controller.stats()}")
+    logger.info(f"Response cache: {cache.stats()}")
+    logger.info(f"Script cache: {dom_cache.stats()}")
+    if sink is not None:
+        sink.flush()
     return results
\ No newline at end of file
@@ -1,11 +1,21 @@
-import json
-import csv
 import asyncio
+import logging
+import sqlite3
+import sys
+from contextlib import nullcontext
 import click
 from engine.logsetup import setup_logging, get_logger
 from workflows.singlescan import single_scan
 from workflows.fullscan import full_scan
-from engine.blind_scanner import BlindXSSScanner
+from workflows.batchscan import batch_scan, iter_targets
+from workflows.distributed import coordinate, run_worker
+from engine.workqueue import QueueServer, SQLiteWorkQueue, is_loopback, open_queue
+from engine.blind_scanner import BlindCallbackListener, InjectionIndex
+from engine.sinks import open_sink
+from engine.state import ScanState
+from engine.executor import create_executor, get_executor, set_executor
+from engine.metrics import MetricsServer, get_metrics
+from engine.session import scan_session
 
 
 def prompt_menu():
@@ -34,14 +44,23 @@ def prompt_yes_no(message: str) -> bool:
     return ans == 'y'
 
 
+def prompt_int(message: str, default: int) -> int:
+    ans = input(f"{message} [{default}]: ").strip()
+    while ans and not ans.isdigit():
+        ans = input("Введите число: ").strip()
+    return int(ans) if ans else default
+
+
 def prompt_save():
     if not prompt_yes_no("Сохранить результаты"):  # y/n
-        return None, None
+        return None, None, False
     fmt = None
-    while fmt not in ('json', 'csv'):
-        fmt = input("Формат сохранения [json/csv]: ").strip().lower()
+    while fmt not in ('jsonl', 'csv'):
+        fmt = input("Формат сохранения [jsonl/csv]: ").strip().lower()
+        fmt = 'jsonl' if fmt == 'json' else fmt
     path = input("Имя файла для сохранения: ").strip()
-    return fmt, path
+    only_success = prompt_yes_no("Сохранять только успешные находки")
+    return fmt, path, only_success
 
 
 async def run():
@@ -58,75 +77,336 @@ async def run():
 
     encode = prompt_yes_no("Включить кодирование payloads")
     detect_waf = prompt_yes_no("Включить обнаружение WAF")
+    max_hits = 1 if prompt_yes_no("Останавливаться после первой находки в параметре") else None
     detect_blind = prompt_yes_no("Включить поиск Blind XSS (fire-and-forget)")
 
     blind_url = None
+    blind_index = InjectionIndex()
+    listener = None
     if detect_blind:
-        blind_url = input("OOB-сервер для проверки: ").strip()
-        scanner = BlindXSSScanner(payload_url=blind_url)
+        if prompt_yes_no("Запустить локальный callback-listener"):
+            port = input("Порт listener [8899]: ").strip()
+            listener = BlindCallbackListener(blind_index, port=int(port) if port.isdigit() else 8899)
+            await listener.start()
+            # внешний адрес, по которому жертва достучится до listener (по умолчанию локальный)
+            blind_url = input(f"OOB URL [{listener.url}]: ").strip() or listener.url
+        else:
+            blind_url = input("OOB-сервер для проверки: ").strip()
         click.secho(f"[BLIND] OOB URL: {blind_url}", fg="magenta")
 
-    out_format, out_file = prompt_save()
+    out_format, out_file, only_success = prompt_save()
+
+    # состояние на диске: прерванный краулинг продолжается с того же места
+    state = None
+    max_depth, concurrency = 2, 5
+    if is_crawl:
+        max_depth = prompt_int("Глубина краулинга", max_depth)
+        concurrency = prompt_int("Параллельных запросов", concurrency)
+        while state is None:
+            state_file = input("Файл состояния для возобновления (Enter — без него): ").strip()
+            if not state_file:
+                break
+            # без файла результатов находки пройденных единиц не пережили бы перезапуск
+            if not out_file:
+                click.secho("[!] Resumable scan requires saving results to a file", fg="red")
+                break
+            try:
+                state = ScanState(state_file, target)
+            except (ValueError, sqlite3.Error) as e:
+                # файл другого сканирования или вообще не база состояния
+                click.secho(f"[!] {e}", fg="red")
+
+    # cookies (например, сессия авторизации) переживают перезапуск сканера
+    cookie_file = input("Файл cookies (Enter — без него): ").strip() or None
 
     logger.info(
         f"Запуск: target={target}, crawl={is_crawl}, basic={basic}, obf={obfuscate}, "
         f"enc={encode}, waf={detect_waf}, blind={detect_blind}"
     )
 
-    if is_crawl:
-        results = await full_scan(
-            start_url=target,
-            max_depth=2,
-            concurrency=5,
-            basic=basic,
-            obfuscate=obfuscate,
-            encode=encode,
-            detect_waf=detect_waf
+    # результаты пишутся в файл по мере получения, а не одним дампом в конце
+    sink = None
+    if out_file:
+        logger.info(f"Сохраняем в {out_file} формат={out_format}")
+        sink = open_sink(out_format, out_file, only_success=only_success, append=bool(state and state.resumed))
+
+    try:
+        # одна сессия (пул соединений, DNS, cookies) на всё сканирование
+        async with scan_session(cookie_file=cookie_file) as session:
+            if is_crawl:
+                await full_scan(
+                    start_url=target,
+                    max_depth=max_depth,
+                    concurrency=concurrency,
+                    basic=basic,
+                    obfuscate=obfuscate,
+                    encode=encode,
+                    detect_waf=detect_waf,
+                    detect_blind=detect_blind,
+                    blind_payload_url=blind_url,
+                    blind_index=blind_index,
+                    sink=sink,
+                    state=state,
+                    max_hits=max_hits,
+                    session=session
+                )
+            else:
+                await single_scan(
+                    target_url=target,
+                    basic=basic,
+                    obfuscate=obfuscate,
+                    encode=encode,
+                    detect_waf=detect_waf,
+                    detect_blind=detect_blind,
+                    blind_payload_url=blind_url,
+                    blind_index=blind_index,
+                    sink=sink,
+                    max_hits=max_hits,
+                    session=session
+                )
+    finally:
+        # при падении на диске остаётся всё, что успели найти
+        if sink:
+            sink.close()
+        if state:
+            state.close()
+
+    logger.info("Сканирование завершено")
+    logger.info(f"Метрики: {get_metrics().summary()}")
+
+    if listener:
+        # blind XSS может сработать намного позже — listener продолжает принимать callback'и
+        click.secho(
+            f"[BLIND] Listener on port {listener.port}, {len(blind_index)} injections. Press Ctrl+C to stop.",
+            fg="magenta"
         )
-    else:
-        results = await single_scan(
-            target_url=target,
-            basic=basic,
-            obfuscate=obfuscate,
-            encode=encode,
-            detect_waf=detect_waf
+        try:
+            await listener.serve_forever()
+        finally:
+            logger.info(f"Blind callbacks: {len(listener.hits)}")
+
+
+@click.group(invoke_without_command=True)
+@click.pass_context
+def cli(ctx):
+    """XSS scanner. Without a command, runs the interactive mode."""
+    if ctx.invoked_subcommand is None:
+        try:
+            asyncio.run(run())
+        finally:
+            # пул процессов разбора создаётся по требованию (get_executor) и должен быть остановлен
+            get_executor().close()
+
+
+def metrics_options(func):
+    """--metrics-port и --metrics-json для неинтерактивных команд."""
+    func = click.option('--metrics-json', type=click.Path(dir_okay=False), default=None,
+                        help='Write a JSON metrics summary here at the end of the run.')(func)
+    return click.option('--metrics-port', type=click.IntRange(1, 65535), default=None,
+                        help='Serve Prometheus metrics on 127.0.0.1:PORT/metrics during the run.')(func)
+
+
+def metrics_endpoint(port):
+    """Сервер /metrics на время запуска (или пустой контекст без порта)."""
+    return MetricsServer(port=port) if port else nullcontext()
+
+
+def finish_metrics(path) -> None:
+    summary = get_metrics().summary()
+    get_logger(__name__).info(f"Metrics: {summary}")
+    if path:
+        get_metrics().write_summary(path)
+
+
+@cli.command()
+@click.argument('targets', type=click.File('r'), default='-')
+@click.option('--crawl/--single', default=False, show_default=True, help='Crawl each target or scan only its page.')
+@click.option('--depth', 'max_depth', type=click.IntRange(1), default=2, show_default=True, help='Crawl depth.')
+@click.option('--concurrency', type=click.IntRange(1), default=5, show_default=True,
+              help='Concurrent requests within one target.')
+@click.option('--per-host', type=click.IntRange(1), default=8, show_default=True,
+              help='Upper bound of the adaptive per-host request limit.')
+@click.option('--sample-limit', type=click.IntRange(0), default=3, show_default=True,
+              help='Pages crawled per URL pattern (0 = all).')
+@click.option('--max-targets', type=click.IntRange(1), default=10, show_default=True,
+              help='Targets scanned at the same time.')
+@click.option('--global-limit', type=click.IntRange(1), default=100, show_default=True,
+              help='Requests in flight (and open connections) across all targets.')
+@click.option('--basic', is_flag=True, help='Only basic payloads (default: all payloads).')
+@click.option('--obfuscate/--no-obfuscate', default=None, help='Obfuscated variants (default: on unless --basic).')
+@click.option('--encode', is_flag=True, help='Encoded payload variants.')
+@click.option('--waf', 'detect_waf', is_flag=True, help='Detect WAF on failed payloads.')
+@click.option('--max-hits', type=click.IntRange(1), default=None, help='Stop testing a parameter after N hits.')
+@click.option('--adaptive/--no-adaptive', default=True, show_default=True, help='Reorder payloads per host.')
+@click.option('--probe/--no-probe', default=True, show_default=True, help='Probe reflection contexts first.')
+@click.option('--batch-params/--no-batch-params', 'batch', default=True, show_default=True,
+              help='Send one payload to all form fields in a single request.')
+@click.option('--cache-size', type=click.IntRange(0), default=2048, show_default=True, help='Response cache entries.')
+@click.option('--blind-url', default=None, help='OOB URL for blind XSS payloads.')
+@click.option('--listen', 'listen_port', type=int, default=None,
+              help='Run the blind callback listener on this port (kept running after the scan).')
+@click.option('--output', '-o', type=click.Path(dir_okay=False), default=None, help='Results file.')
+@click.option('--format', 'out_format', type=click.Choice(['jsonl', 'csv']), default='jsonl', show_default=True)
+@click.option('--only-success', is_flag=True, help='Save only successful findings.')
+@click.option('--state-dir', type=click.Path(file_okay=False), default=None,
+              help='Per-target crawl state; a rerun resumes interrupted targets.')
+@click.option('--cookie-file', type=click.Path(dir_okay=False), default=None, help='Persistent cookie jar.')
+@click.option('--cpu-workers', type=click.IntRange(0), default=0, show_default=True,
+              help='Processes for HTML parsing and analysis (0 = one per core, 1 = no pool).')
+@click.option('--log-level', type=click.Choice(['DEBUG', 'INFO', 'WARNING', 'ERROR']), default='INFO', show_default=True)
+@click.option('--log-file', type=click.Path(dir_okay=False), default=None)
+@metrics_options
+def batch(targets, obfuscate, listen_port, output, out_format, only_success, cpu_workers, log_level, log_file,
+          metrics_port, metrics_json, **options):
+    """Scan TARGETS (file with one URL per line, '-' for stdin) without prompts."""
+    if options['state_dir'] and not output:
+        raise click.UsageError("--state-dir requires --output: resumed targets skip work already saved there.")
+    setup_logging(getattr(logging, log_level), log_file)
+    set_executor(create_executor(cpu_workers))
+    if obfuscate is None:
+        obfuscate = not options['basic']
+    # повторный запуск со state_dir продолжает файл результатов, а не перезаписывает его
+    sink = open_sink(out_format, output, only_success=only_success,
+                     append=bool(options['state_dir'])) if output else None
+    try:
+        summary = asyncio.run(_batch(iter_targets(targets), obfuscate, listen_port, sink, options, metrics_port))
+    finally:
+        if sink:
+            sink.close()
+        get_executor().close()
+        finish_metrics(metrics_json)
+    click.echo(f"Targets: {summary['targets']}, failed: {summary['failed']}, {summary['seconds']}s")
+    sys.exit(1 if summary['failed'] else 0)
+
+
+async def _batch(targets, obfuscate: bool, listen_port, sink, options: dict, metrics_port=None) -> dict:
+    blind_index = InjectionIndex()
+    listener = None
+    if listen_port:
+        listener = BlindCallbackListener(blind_index, port=listen_port)
+        await listener.start()
+        options['blind_url'] = options['blind_url'] or listener.url
+    blind_url = options.pop('blind_url')
+    async with metrics_endpoint(metrics_port):
+        summary = await batch_scan(
+            targets, obfuscate=obfuscate, blind_payload_url=blind_url, blind_index=blind_index, sink=sink, **options
+        )
+    if listener:
+        if sink:
+            sink.flush()
+        click.secho(
+            f"[BLIND] Listener on port {listener.port}, {len(blind_index)} injections. Press Ctrl+C to stop.",
+            fg="magenta"
         )
+        try:
+            await listener.serve_forever()
+        except asyncio.CancelledError:
+            pass
+    return summary
 
-    if detect_blind and blind_url and results:
-        seen = set()
-        for rec in results:
-            url = rec['url']
-            params = json.loads(rec['endpoint_params'])
-            for param in params.keys():
-                key = (url, param)
-                if key in seen:
-                    continue
-                payload = scanner.generate_payload()
-                try:
-                    scanner.send(url, param)
-                    click.secho(f"[+] Blind XSS: {param} on {url} => {payload}", fg="magenta")
-                except Exception:
-                    click.secho(f"[-] Blind XSS error: {param} on {url}", fg="red")
-                seen.add(key)
-
-    if out_file and results is not None:
-        logger.info(f"Сохраняем в {out_file} формат={out_format}")
+
+@cli.command()
+@click.argument('start_url')
+@click.option('--queue', 'queue_path', type=click.Path(dir_okay=False), required=True,
+              help='SQLite queue file shared with local workers.')
+@click.option('--serve', default=None, metavar='HOST:PORT',
+              help='Expose the queue to remote workers over TCP (a non-loopback HOST requires --token).')
+@click.option('--token', envvar='XSSAD_QUEUE_TOKEN', default=None, help='Shared secret for remote workers.')
+@click.option('--depth', 'max_depth', type=click.IntRange(1), default=2, show_default=True, help='Crawl depth.')
+@click.option('--sample-limit', type=click.IntRange(0), default=3, show_default=True,
+              help='Pages crawled per URL pattern (0 = all).')
+@click.option('--basic', is_flag=True, help='Only basic payloads (default: all payloads).')
+@click.option('--obfuscate/--no-obfuscate', default=None, help='Obfuscated variants (default: on unless --basic).')
+@click.option('--encode', is_flag=True, help='Encoded payload variants.')
+@click.option('--waf', 'detect_waf', is_flag=True, help='Detect WAF on failed payloads.')
+@click.option('--max-hits', type=click.IntRange(1), default=None, help='Stop testing a parameter after N hits.')
+@click.option('--adaptive/--no-adaptive', default=True, show_default=True,
+              help='Reorder payloads per host (each worker learns from its own tasks).')
+@click.option('--probe/--no-probe', default=True, show_default=True, help='Probe reflection contexts first.')
+@click.option('--batch-params/--no-batch-params', 'batch', default=True, show_default=True,
+              help='Send one payload to all form fields in a single request.')
+@click.option('--output', '-o', type=click.Path(dir_okay=False), default=None, help='Results file.')
+@click.option('--format', 'out_format', type=click.Choice(['jsonl', 'csv']), default='jsonl', show_default=True)
+@click.option('--only-success', is_flag=True, help='Save only successful findings.')
+@click.option('--idle-timeout', type=click.FloatRange(1), default=300, show_default=True,
+              help='Give up when no worker takes a task for this many seconds.')
+@click.option('--log-level', type=click.Choice(['DEBUG', 'INFO', 'WARNING', 'ERROR']), default='INFO', show_default=True)
+@metrics_options
+def coordinator(start_url, queue_path, serve, token, obfuscate, output, out_format, only_success, log_level,
+                metrics_port, metrics_json, **options):
+    """Shard a crawl of START_URL across workers and merge their results."""
+    serve_host, _, serve_port = (serve or '').rpartition(':')
+    serve_host = serve_host or '127.0.0.1'
+    if serve and not token and not is_loopback(serve_host):
+        raise click.UsageError(f"--serve on {serve_host} requires --token: anyone reaching the port could "
+                               "take tasks and submit results.")
+    setup_logging(getattr(logging, log_level))
+    if obfuscate is None:
+        obfuscate = not options['basic']
+    sink = open_sink(out_format, output, only_success=only_success) if output else None
+
+    async def main():
+        queue = SQLiteWorkQueue(queue_path)
+        server = None
+        if serve:
+            server = QueueServer(queue, serve_host, int(serve_port), token)
+            await server.start()
         try:
-            if out_format == 'json':
-                with open(out_file, 'w', encoding='utf-8') as f:
-                    json.dump(results, f, ensure_ascii=False, indent=2)
-            else:
-                if results:
-                    fieldnames = list(results[0].keys())
-                    with open(out_file, 'w', newline='', encoding='utf-8') as f:
-                        writer = csv.DictWriter(f, fieldnames=fieldnames)
-                        writer.writeheader()
-                        writer.writerows(results)
-            logger.info("Результаты сохранены")
-        except Exception as e:
-            logger.error(f"Ошибка при сохранении: {e}")
+            async with metrics_endpoint(metrics_port):
+                await coordinate(queue, start_url, obfuscate=obfuscate, sink=sink, **options)
+        finally:
+            if server:
+                # дать исполнителям увидеть отметку о завершении
+                await asyncio.sleep(1)
+                await server.stop()
+            await queue.close()
+
+    try:
+        asyncio.run(main())
+    except RuntimeError as e:
+        raise click.ClickException(str(e))
+    finally:
+        if sink:
+            sink.close()
+        finish_metrics(metrics_json)
+
+
+@cli.command()
+@click.option('--queue', 'queue_spec', required=True,
+              help='SQLite queue file or tcp://HOST:PORT of a coordinator started with --serve.')
+@click.option('--token', envvar='XSSAD_QUEUE_TOKEN', default=None, help='Shared secret of the coordinator.')
+@click.option('--concurrency', type=click.IntRange(1), default=5, show_default=True, help='Tasks run at the same time.')
+@click.option('--per-host', type=click.IntRange(1), default=8, show_default=True,
+              help='Upper bound of the adaptive per-host request limit.')
+@click.option('--lease', 'lease_seconds', type=click.FloatRange(1), default=60, show_default=True,
+              help='Task lease; a task of a lost worker is handed out again after it expires.')
+@click.option('--cpu-workers', type=click.IntRange(0), default=0, show_default=True,
+              help='Processes for HTML parsing and analysis (0 = one per core, 1 = no pool).')
+@click.option('--log-level', type=click.Choice(['DEBUG', 'INFO', 'WARNING', 'ERROR']), default='INFO', show_default=True)
+@metrics_options
+def worker(queue_spec, token, cpu_workers, log_level, metrics_port, metrics_json, **options):
+    """Run scan tasks from a coordinator queue until the scan is finished."""
+    setup_logging(getattr(logging, log_level))
+    set_executor(create_executor(cpu_workers))
+
+    async def main():
+        queue = open_queue(queue_spec, token)
+        try:
+            async with metrics_endpoint(metrics_port):
+                return await run_worker(queue, **options)
+        finally:
+            await queue.close()
+
+    try:
+        stats = asyncio.run(main())
+    except (ConnectionError, OSError, RuntimeError) as e:
+        # очередь недоступна или отвергла исполнителя (например, неверный token)
+        raise click.ClickException(f"Queue {queue_spec}: {e}")
+    finally:
+        get_executor().close()
+        finish_metrics(metrics_json)
+    click.echo(f"Tasks done: {stats['done']}, failed: {stats['failed']}")
 
-    logger.info("Сканирование завершено")
 
 if __name__ == '__main__':
-    asyncio.run(run())
\ No newline at end of file
+    cli()
\ No newline at end of file